@@ -1,11 +1,11 @@
 from abc import abstractmethod
 from typing import TypeVar
 
-import tiktoken
 from openai import OpenAI
 from pydantic import BaseModel
 
 from ..clients.llm import openai_client
+from ..encoders import encoder
 
 InputModel = TypeVar("InputModel", bound=BaseModel)
 OutputModel = TypeVar("OutputModel", bound=BaseModel)
@@ -22,9 +22,8 @@ class Agent[InputModel, OutputModel]:
     def run(self, values: InputModel) -> OutputModel | None: ...
 
     def count_tokens(self, content, model="gpt-4o") -> int:
-        encoder = tiktoken.encoding_for_model(model)
-        return len(encoder.encode(content))
+        return len(encoder(model).encode(content))
 
     def truncate(self, content, max_tokens, model="gpt-4o") -> str:
-        encoder = tiktoken.encoding_for_model(model)
-        return encoder.decode(encoder.encode(content)[0 : max_tokens - 1])
+        enc = encoder(model)
+        return enc.decode(enc.encode(content)[0 : max_tokens - 1])
@@ -1,28 +1,130 @@
+import asyncio
+import re
+import threading
+import zlib
+from collections.abc import Coroutine
 from functools import cache
+from typing import Any
 
+import httpx
 import logfire
-from openai import OpenAI
+import numpy as np
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
 from antbed.config import Config, EmbeddingProviderConfig
 from antbed.config import config as confload
+from antbed.ratelimit import RateLimiter, rate_limiter
+
+
+def dimensions_param(dimensions: int | None) -> dict[str, int]:
+    """Only sent when set: models other than text-embedding-3 reject it"""
+    return {"dimensions": dimensions} if dimensions else {}
 
 
 class EmbeddingClient:
     def __init__(self, client: OpenAI):
         self._client = client
 
-    def embed(self, texts: list[str], model: str) -> list[list[float]]:
-        response = self._client.embeddings.create(input=texts, model=model)
+    def embed(self, texts: list[str], model: str, dimensions: int | None = None) -> list[list[float]]:
+        """`dimensions` shortens the vectors of the models trained for it (text-embedding-3)"""
+        response = self._client.embeddings.create(input=texts, model=model, **dimensions_param(dimensions))
         return [d.embedding for d in response.data]
 
+    def embed_many(
+        self, batches: list[list[str]], model: str, dimensions: int | None = None
+    ) -> list[list[list[float]]]:
+        return [self.embed(texts, model, dimensions) for texts in batches]
+
+
+class HashingEmbeddingClient:
+    """Local, deterministic embeddings: signed feature hashing of word n-grams, L2-normalized.
+
+    Texts sharing words get close vectors, which is enough to exercise the ingest and search
+    pipeline without network access; the model name is ignored.
+    """
+
+    token_re = re.compile(r"\w+")
+
+    def __init__(self, dimensions: int = 3072, ngrams: int = 2):
+        self.dimensions = dimensions
+        self.ngrams = ngrams
+
+    def features(self, text: str) -> list[str]:
+        tokens = self.token_re.findall(text.lower())
+        features = list(tokens)
+        for n in range(2, self.ngrams + 1):
+            features.extend(" ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1))
+        return features
+
+    def vectorize(self, text: str, dimensions: int | None = None) -> np.ndarray:
+        dimensions = dimensions or self.dimensions
+        vector = np.zeros(dimensions, dtype=np.float32)
+        features = self.features(text)
+        if not features:
+            return vector
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+        # the high bit gives the sign, so collisions cancel out instead of piling up
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes & 0x7FFFFFFF) % dimensions, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: list[str], model: str, dimensions: int | None = None) -> list[list[float]]:
+        _ = model
+        return [self.vectorize(text, dimensions).tolist() for text in texts]
+
+    def embed_many(
+        self, batches: list[list[str]], model: str, dimensions: int | None = None
+    ) -> list[list[list[float]]]:
+        return [self.embed(texts, model, dimensions) for texts in batches]
+
 
 @cache
-def embedding_client(provider: str | None = None, use_litellm: bool = False) -> EmbeddingClient:
-    """Create an embedding client instance."""
-    config: Config = confload()
-    # This ignores use_litellm for now
-    provider_conf: EmbeddingProviderConfig = config.embeddings.get_provider(provider)
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop of the async clients, run by a daemon thread and shared by every worker thread"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="antbed-async-clients", daemon=True).start()
+    return loop
+
+
+def run_sync[T](coro: Coroutine[Any, Any, T]) -> T:
+    """Run `coro` on the background loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, background_loop()).result()
+
+
+class AsyncEmbeddingClient:
+    """Embeddings over one pooled httpx client, with at most `max_concurrency` requests in flight.
+
+    The connection pool is bound to the background loop: synchronous callers go through
+    `embed`/`embed_many`, which block the calling thread only.
+    """
+
+    def __init__(self, client: AsyncOpenAI, max_concurrency: int = 8):
+        self._client = client
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _embed(self, texts: list[str], model: str, dimensions: int | None = None) -> list[list[float]]:
+        async with self._semaphore:
+            response = await self._client.embeddings.create(input=texts, model=model, **dimensions_param(dimensions))
+        return [d.embedding for d in response.data]
+
+    async def _embed_many(
+        self, batches: list[list[str]], model: str, dimensions: int | None = None
+    ) -> list[list[list[float]]]:
+        return list(await asyncio.gather(*[self._embed(texts, model, dimensions) for texts in batches]))
+
+    def embed(self, texts: list[str], model: str, dimensions: int | None = None) -> list[list[float]]:
+        return run_sync(self._embed(texts, model, dimensions))
 
+    def embed_many(
+        self, batches: list[list[str]], model: str, dimensions: int | None = None
+    ) -> list[list[list[float]]]:
+        """Send every batch concurrently, vectors are returned in the order of `batches`"""
+        return run_sync(self._embed_many(batches, model, dimensions))
+
+
+def provider_api_key(provider_conf: EmbeddingProviderConfig, config: Config) -> str | None:
     api_key = provider_conf.api_key
     if not api_key and provider_conf.api_key_ref == "llms.openai":
         # This part is tricky. 'llms.openai' in `antgent` is probably a key in `llms.providers`.
@@ -30,17 +132,61 @@ def embedding_client(provider: str | None = None, use_litellm: bool = False) ->
         # And the default value for `api_key_ref` is `llms.openai`.
         # I will assume it refers to `config().openai` for now.
         api_key = config.openai.projects[0].api_key
+    return api_key
+
+
+@cache
+def embedding_client(
+    provider: str | None = None, use_litellm: bool = False, use_async: bool = False
+) -> EmbeddingClient | AsyncEmbeddingClient | HashingEmbeddingClient:
+    """Create an embedding client instance."""
+    config: Config = confload()
+    # This ignores use_litellm for now
+    provider_conf: EmbeddingProviderConfig = config.embeddings.get_provider(provider)
+    if provider_conf.name == "hashing":
+        return HashingEmbeddingClient(dimensions=provider_conf.dimensions or 3072)
+    api_key = provider_api_key(provider_conf, config)
 
     # For now, only handle openai provider.
     if provider_conf.name != "openai":
         raise NotImplementedError(f"Embedding provider '{provider_conf.name}' not supported yet.")
 
+    if use_async:
+        return async_embedding_client(provider_conf, api_key)
+
     client = OpenAI(
         api_key=api_key,
         organization=provider_conf.organization_id,
         project=provider_conf.project_id,
         base_url=provider_conf.base_url,
+        http_client=DefaultHttpxClient(event_hooks=embedding_rate_limiter(provider_conf).http_hooks()),
     )
     logfire.instrument_openai(client)
 
     return EmbeddingClient(client)
+
+
+def embedding_rate_limiter(provider_conf: EmbeddingProviderConfig) -> RateLimiter:
+    """Shared by the sync and async clients of the provider"""
+    return rate_limiter(f"embeddings.{provider_conf.name}", rpm=provider_conf.rpm, tpm=provider_conf.tpm)
+
+
+def async_embedding_client(provider_conf: EmbeddingProviderConfig, api_key: str | None) -> AsyncEmbeddingClient:
+    http_client = DefaultAsyncHttpxClient(
+        http2=provider_conf.http2,
+        limits=httpx.Limits(
+            max_connections=provider_conf.max_connections,
+            max_keepalive_connections=provider_conf.max_keepalive_connections,
+            keepalive_expiry=provider_conf.keepalive_expiry,
+        ),
+        event_hooks=embedding_rate_limiter(provider_conf).async_http_hooks(),
+    )
+    client = AsyncOpenAI(
+        api_key=api_key,
+        organization=provider_conf.organization_id,
+        project=provider_conf.project_id,
+        base_url=provider_conf.base_url,
+        http_client=http_client,
+    )
+    logfire.instrument_openai(client)
+    return AsyncEmbeddingClient(client, max_concurrency=provider_conf.max_concurrency)
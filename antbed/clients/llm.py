@@ -2,9 +2,10 @@ from functools import cache
 
 import logfire
 import qdrant_client as qc
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
 
 from antbed.config import config
+from antbed.ratelimit import rate_limiter
 
 
 @cache
@@ -37,11 +38,14 @@ def openai_client(project_name: str = "") -> OpenAI:
     api_key = project.api_key
     organization = openaiconf.organization_id
     base_url = project.url
+    # agents of every thread share the project's limits
+    limiter = rate_limiter(f"openai.{project.name}", rpm=project.rpm, tpm=project.tpm)
     client = OpenAI(
         api_key=api_key,
         organization=organization,
         project=project.project_id,
         base_url=base_url,
+        http_client=DefaultHttpxClient(event_hooks=limiter.http_hooks()),
     )
     logfire.instrument_openai(client)
     return client
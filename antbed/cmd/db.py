@@ -0,0 +1,20 @@
+from typing import Annotated
+
+import typer
+
+from antbed.store import antbeddb
+
+app = typer.Typer(name="db", no_args_is_help=True, help="Manage the database.")
+
+
+@app.command(name="index")
+def index(
+    keys: Annotated[
+        list[str] | None,
+        typer.Option("--key", "-k", help="vfile.info key to index, defaults to antbed.info_index_keys."),
+    ] = None,
+) -> None:
+    """Creates the expression indexes of the metadata keys filtered on often."""
+    names = antbeddb().ensure_info_indexes(keys or None)
+    for name in names:
+        typer.echo(f"Index {name} ready")
@@ -0,0 +1,21 @@
+from typing import Annotated
+
+import typer
+
+from antbed.store import antbeddb
+from antbed.vector_codec import VectorEncodingEnum
+
+app = typer.Typer(name="embeddings", no_args_is_help=True, help="Manage stored embeddings.")
+
+
+@app.command(name="recode")
+def recode(
+    encoding: Annotated[
+        VectorEncodingEnum,
+        typer.Option("--encoding", "-e", help="Target storage encoding."),
+    ] = VectorEncodingEnum.FLOAT32,
+    batch_size: Annotated[int, typer.Option("--batch-size", help="Rows rewritten per transaction.")] = 1000,
+) -> None:
+    """Converts stored vectors to another encoding (float8 restores the array column)."""
+    total = antbeddb().recode_embeddings(encoding, batch_size=batch_size)
+    typer.echo(f"Recoded {total} embeddings to {encoding.value}")
@@ -6,6 +6,8 @@ from ant31box.cmd.typer.version import app as version_app
 from antbed.config import config
 from antbed.version import VERSION
 
+from .db import app as db_app
+from .embeddings import app as embeddings_app
 from .server import app as server_app
 from .tiktoken import tikcount
 from .worker import app as looper_app
@@ -36,6 +38,8 @@ app.add_typer(looper_app)
 app.add_typer(server_app)
 app.add_typer(version_app)
 app.add_typer(default_config_app)
+app.add_typer(embeddings_app)
+app.add_typer(db_app)
 app.command(name="tikcount")(tikcount)
 
 
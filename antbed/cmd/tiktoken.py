@@ -1,10 +1,11 @@
 import json
 from typing import Annotated
 
-import tiktoken
 import typer
 from ant31box.cmd.typer.models import OutputEnum
 
+from antbed.encoders import encoder
+
 
 def tikcount(
     output: Annotated[
@@ -15,8 +16,7 @@ def tikcount(
     """Counts tokens from stdin."""
     stdin_text = typer.get_text_stream("stdin")
     model = "gpt-4o"
-    encoder = tiktoken.encoding_for_model(model)
-    res = {"tokens": len(encoder.encode(stdin_text.read())), "model": model}
+    res = {"tokens": len(encoder(model).encode(stdin_text.read())), "model": model}
     if output == "json":
         typer.echo(json.dumps(res, indent=2))
     else:
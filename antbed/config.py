@@ -17,6 +17,8 @@ from temporalloop.config import TemporalSettings as TemporalConfigSchema
 from temporalloop.config import WorkerSettings as WorkerConfigSchema
 from temporalloop.schedule import Schedule as TemporalScheduleSchema
 
+from antbed.vector_codec import VectorEncodingEnum
+
 LOGGING_CONFIG: dict[str, Any] = ant31box.config.LOGGING_CONFIG
 LOGGING_CONFIG["loggers"].update({"antbed": {"handlers": ["default"], "level": "INFO", "propagate": True}})
 
@@ -62,11 +64,22 @@ class QdrantConfigSchema(BaseConfig):
     https: bool = Field(default=False)
 
 
+class PgvectorConfigSchema(BaseConfig):
+    index: str = Field(default="hnsw", description="ANN index built per model and dimension: hnsw or ivfflat")
+    hnsw_m: int = Field(default=16)
+    hnsw_ef_construction: int = Field(default=64)
+    hnsw_ef_search: int = Field(default=40, description="Candidates kept per query, raise it for better recall")
+    ivfflat_lists: int = Field(default=100)
+    ivfflat_probes: int = Field(default=10)
+
+
 class OpenAIProjectKeySchema(BaseConfig):
     api_key: str = Field(default="antbed-openaiKEY")
     project_id: str = Field(default="proj-1xZoR")
     name: str = Field(default="default")
     url: str | None = Field(default=None)
+    rpm: int | None = Field(default=None, description="Requests per minute, per worker process")
+    tpm: int | None = Field(default=None, description="Tokens per minute, per worker process")
 
 
 class OpenAIConfigSchema(BaseConfig):
@@ -98,7 +111,7 @@ class OpenAIConfigSchema(BaseConfig):
 class EmbeddingProviderConfig(BaseConfig):
     """Configuration for a single embedding provider"""
 
-    name: str = Field(..., description="Provider name (e.g., 'openai', 'cohere', 'voyage')")
+    name: str = Field(..., description="Provider name (e.g., 'openai', or 'hashing' for local vectors)")
     api_key: str | None = Field(default=None, description="API key for this provider")
     api_key_ref: str | None = Field(default=None, description="Reference to llm provider key (e.g., 'llms.openai')")
     base_url: str | None = Field(default=None, description="Custom API base URL")
@@ -109,6 +122,23 @@ class EmbeddingProviderConfig(BaseConfig):
         default_factory=dict,
         description="Model aliases (e.g., 'large': 'text-embedding-3-large')",
     )
+    max_batch_size: int = Field(default=512, description="Maximum number of inputs sent in one embeddings request")
+    max_batch_tokens: int = Field(
+        default=100_000, description="Maximum number of tokens sent in one embeddings request"
+    )
+    dimensions: int | None = Field(
+        default=None, description="Vector size of the local 'hashing' provider (default 3072)"
+    )
+    async_requests: bool = Field(
+        default=True, description="Send the batches of a document concurrently through the async client"
+    )
+    max_concurrency: int = Field(default=8, description="Embeddings requests in flight at once, per process")
+    max_connections: int = Field(default=16, description="Size of the async client connection pool")
+    max_keepalive_connections: int = Field(default=8, description="Idle connections kept open in the pool")
+    keepalive_expiry: float = Field(default=30.0, description="Seconds an idle connection is kept open")
+    http2: bool = Field(default=True, description="Multiplex the requests over HTTP/2 connections")
+    rpm: int | None = Field(default=None, description="Requests per minute, per worker process")
+    tpm: int | None = Field(default=None, description="Tokens per minute, per worker process")
 
     @field_validator("api_key_ref", "api_key")
     @classmethod
@@ -121,6 +151,27 @@ class EmbeddingProviderConfig(BaseConfig):
         return v
 
 
+class EmbeddingCacheConfigSchema(BaseConfig):
+    """Content-addressed cache of embedding vectors"""
+
+    enabled: bool = Field(default=True, description="Look up vectors by (model, dimensions, sha256(content))")
+    lru_size: int = Field(default=2048, description="Number of vectors kept in the in-process LRU")
+    persist: bool = Field(
+        default=False,
+        description="Also share vectors through the embedding_cache table, a second float8[] copy of each vector",
+    )
+
+
+class DedupConfigSchema(BaseConfig):
+    """Near-duplicate chunks, found with MinHash/LSH, linked to one embedded chunk instead of embedded"""
+
+    enabled: bool = Field(default=False, description="Link near-duplicate chunks of a document and of a vector")
+    threshold: float = Field(default=0.9, description="Estimated Jaccard similarity of two near-duplicate chunks")
+    num_perm: int = Field(default=128, description="Hash functions of a MinHash signature")
+    bands: int = Field(default=16, description="LSH bands a signature is cut into, must divide num_perm")
+    shingle_size: int = Field(default=5, description="Words per shingle")
+
+
 class EmbeddingsConfigSchema(BaseConfig):
     """Configuration for embedding providers"""
 
@@ -135,6 +186,16 @@ class EmbeddingsConfigSchema(BaseConfig):
         }
     )
     default_provider: str = Field(default="openai", description="Default provider to use for embeddings")
+    cache: EmbeddingCacheConfigSchema = Field(default_factory=EmbeddingCacheConfigSchema)
+    vector_encoding: VectorEncodingEnum = Field(
+        default=VectorEncodingEnum.ARRAY,
+        description="Storage of new embedding vectors: float8 array, or float32/float16/int8 bytea",
+    )
+    stream_threshold: int = Field(
+        default=5_000_000,
+        description="Documents of more characters are split, embedded and upserted batch by batch",
+    )
+    dedup: DedupConfigSchema = Field(default_factory=DedupConfigSchema)
 
     def get_provider(self, name: str | None = None) -> EmbeddingProviderConfig:
         """Get provider config by name, falls back to default"""
@@ -146,6 +207,14 @@ class EmbeddingsConfigSchema(BaseConfig):
 
 class AntbedConfigSchema(BaseConfig):
     postgresql: PostgreSQLConfigSchema = Field(default_factory=PostgreSQLConfigSchema)
+    replicas: list[PostgreSQLConfigSchema] = Field(
+        default_factory=list,
+        description="Read replicas of postgresql, serving scroll, content and search reads; empty reads the primary",
+    )
+    info_index_keys: list[str] = Field(
+        default_factory=list,
+        description="vfile.info keys filtered on often, each gets an `info ->> key` index (antbed db index)",
+    )
 
 
 class TemporalCustomConfigSchema(TemporalConfigSchema):
@@ -161,6 +230,7 @@ class TemporalCustomConfigSchema(TemporalConfigSchema):
                     "antbed.temporal.activities:get_or_create_file",
                     "antbed.temporal.activities:get_or_create_split",
                     "antbed.temporal.activities:embedding",
+                    "antbed.temporal.activities:embedding_batch",
                     "antbed.temporal.activities:vfile_has_summaries",
                     "antbed.temporal.activities:add_vfile_to_collection",
                     "antbed.temporal.activities:add_vfile_to_vector",
@@ -195,6 +265,7 @@ class ConfigSchema(AntgentConfigSchema):
     name: str = Field(default="antbed")
     openai: OpenAIConfigSchema = Field(default_factory=OpenAIConfigSchema, exclude=True)
     qdrant: QdrantConfigSchema = Field(default_factory=QdrantConfigSchema)
+    pgvector: PgvectorConfigSchema = Field(default_factory=PgvectorConfigSchema)
     logging: LoggingConfigSchema = Field(default_factory=LoggingCustomConfigSchema)
     server: FastAPIConfigSchema = Field(default_factory=FastAPIConfigCustomSchema)
     temporalio: TemporalCustomConfigSchema = Field(default_factory=TemporalCustomConfigSchema)
@@ -225,6 +296,10 @@ class Config(AntgentConfig[ConfigSchema], Ant31BoxConfig[ConfigSchema]):
     def qdrant(self) -> QdrantConfigSchema:
         return self.conf.qdrant
 
+    @property
+    def pgvector(self) -> PgvectorConfigSchema:
+        return self.conf.pgvector
+
     @property
     def llms(self) -> LLMsConfigSchema:
         return self.conf.llms
@@ -2,41 +2,140 @@
 # pylint: disable=unsubscriptable-object
 # pylint: disable=too-many-ancestors
 # ruff: noqa: E711
+import hashlib
 import logging
 import uuid
 from abc import abstractmethod
+from collections.abc import Iterable, Sequence
 from datetime import datetime
+from functools import cache
 from typing import Annotated, Any, AnyStr, ClassVar, Optional, TypeVar
 
-import tiktoken
+import numpy as np
 from activealchemy.activerecord import ActiveRecord, PKMixin, UpdateMixin
 from pydantic import BaseModel, ConfigDict, create_model
 from pydantic.fields import FieldInfo
-from sqlalchemy import Float, ForeignKey, String
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Float,
+    ForeignKey,
+    LargeBinary,
+    Select,
+    String,
+    inspect,
+    select,
+    update,
+)
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.ext.associationproxy import AssociationProxy, association_proxy
-from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column, relationship
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    MappedAsDataclass,
+    QueryableAttribute,
+    mapped_column,
+    object_session,
+    relationship,
+    undefer,
+)
+
+from antbed.encoders import count_tokens, count_tokens_batch
+from antbed.lru import LRUCache
+from antbed.vector_codec import VectorEncodingEnum, decode_vector, encode_vector
 
 logger = logging.getLogger(__name__)
 
+# token counts memoized per process
+TOKEN_COUNTS_SIZE = 4096
+
 # Base = automap_base()
 
 
+def content_hash(content: str) -> str:
+    """sha256 hex digest of a text, used to address content independently of its row"""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def load_deferred(rows: Sequence[Any], *attrs: QueryableAttribute) -> None:
+    """Load deferred columns of persistent rows in one query, instead of one lazy load per row"""
+    pending = [row for row in rows if any(attr.key in inspect(row).unloaded for attr in attrs)]
+    session = object_session(pending[0]) if pending else None
+    if session is None:
+        return
+    cls = type(pending[0])
+    q = select(cls).where(cls.id.in_([row.id for row in pending])).options(*(undefer(attr) for attr in attrs))
+    if (key := getattr(cls, "partition_key", None)) is not None:
+        q = q.where(getattr(cls, key).in_({getattr(row, key) for row in pending}))
+    session.execute(q).scalars().all()
+
+
 class ExternalMixin(MappedAsDataclass):
     external_id: Mapped[str | None] = mapped_column(default=None, kw_only=True)
     external_provider: Mapped[str | None] = mapped_column(default=None, kw_only=True)
 
 
+@cache
+def token_counts() -> LRUCache[tuple[str, str], int]:
+    """Token counts by (model, content hash), shared by the rows of a process"""
+    return LRUCache(maxsize=TOKEN_COUNTS_SIZE)
+
+
 class TokensMixin(MappedAsDataclass):
     tokens: Mapped[int | None] = mapped_column(default=None)
+    # content hash `tokens` was counted from, the count is reused while it matches
+    tokens_hash: Mapped[str | None] = mapped_column(default=None, init=False, repr=False)
+    # columns `_content` is made of
+    content_attrs: ClassVar[tuple[str, ...]] = ()
+    tokens_model: ClassVar[str] = "gpt-4o"
 
     def count_tokens(self) -> int:
-        encoder = tiktoken.encoding_for_model("gpt-4o")
-        return len(encoder.encode(self._content()))
+        return count_tokens(self._content(), self.tokens_model)
+
+    def tokens_stale(self) -> bool:
+        """False when a persistent row's content is untouched, without loading deferred content"""
+        state = inspect(self)
+        if self.tokens is None or not state.persistent:
+            return True
+        return any(state.attrs[attr].history.has_changes() for attr in self.content_attrs)
 
     def update_tokens(self) -> None:
-        if self.tokens != self.count_tokens():
-            self.tokens = self.count_tokens()
+        if not self.tokens_stale():
+            return
+        key = self.tokens_key()
+        if self.tokens is not None and self.tokens_hash == key:
+            return
+        tokens = token_counts().get((self.tokens_model, key))
+        if tokens is None:
+            tokens = self.count_tokens()
+            token_counts().set((self.tokens_model, key), tokens)
+        self.tokens, self.tokens_hash = tokens, key
+
+    @classmethod
+    def update_tokens_many(cls, rows: Sequence["TokensMixin"]) -> None:
+        """`update_tokens` of many rows, the texts missing from the memo are encoded in one batch"""
+        memo = token_counts()
+        pending: dict[str, list[TokensMixin]] = {}
+        for row in rows:
+            if not row.tokens_stale():
+                continue
+            key = row.tokens_key()
+            if row.tokens is not None and row.tokens_hash == key:
+                continue
+            tokens = memo.get((cls.tokens_model, key))
+            if tokens is None:
+                pending.setdefault(key, []).append(row)
+            else:
+                row.tokens, row.tokens_hash = tokens, key
+        keys = list(pending)
+        counts = count_tokens_batch([pending[key][0]._content() for key in keys], cls.tokens_model)
+        for key, tokens in zip(keys, counts, strict=True):
+            memo.set((cls.tokens_model, key), tokens)
+            for row in pending[key]:
+                row.tokens, row.tokens_hash = tokens, key
+
+    def tokens_key(self) -> str:
+        return content_hash(self._content())
 
     def save(self, commit=False, session=None):
         """Add this instance to the database."""
@@ -153,6 +252,7 @@ class Summary(Base, PKMixin, UpdateMixin, TokensMixin):
     prompt_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("prompt.id"), default=None)
     prompt: Mapped["Prompt"] = relationship(init=False, repr=False)
     variant_name: Mapped[str] = mapped_column(default="default", nullable=False)
+    content_attrs: ClassVar[tuple[str, ...]] = ("summary",)
 
     def to_pydantic(self) -> SummarySchema:
         return SummarySchema(**self.to_dict())
@@ -235,7 +335,8 @@ class VFile(Base, PKMixin, UpdateMixin, SubjectMixin, TokensMixin):
     source_created_at: Mapped[datetime | None] = mapped_column(default=None)
     source: Mapped[str] = mapped_column(default="")
     source_filename: Mapped[str] = mapped_column(default="")
-    pages: Mapped[list[str]] = mapped_column(ARRAY(String), default_factory=list, repr=False)
+    # deferred: loaded on access, or with undefer(VFile.pages) when a query needs the text
+    pages: Mapped[list[str]] = mapped_column(ARRAY(String), default_factory=list, repr=False, deferred=True)
     vector_vfile: Mapped[list[VectorVFile]] = relationship(
         back_populates="vfile", cascade="all, delete-orphan", default_factory=list, repr=False
     )
@@ -260,6 +361,9 @@ class VFile(Base, PKMixin, UpdateMixin, SubjectMixin, TokensMixin):
         back_populates="vfile", cascade="all, delete-orphan", default_factory=list, repr=False
     )
     info: Mapped[dict[str, Any]] = mapped_column(JSONB, default_factory=dict)
+    # content_hash of the pages, to tell a changed document from a re-upload
+    content_hash: Mapped[str | None] = mapped_column(default=None)
+    content_attrs: ClassVar[tuple[str, ...]] = ("pages",)
 
     uploads: Mapped[list["VFileUpload"]] = relationship(
         back_populates="vfile", cascade="all, delete-orphan", default_factory=list, repr=False
@@ -274,12 +378,16 @@ class VFile(Base, PKMixin, UpdateMixin, SubjectMixin, TokensMixin):
     )
 
     def summary(self, variant: str = "default") -> Optional["Summary"]:
-        for s_item in self.summaries:
+        return self.pick_summary(self.summaries, variant)
+
+    @staticmethod
+    def pick_summary(summaries: list["Summary"], variant: str = "default") -> Optional["Summary"]:
+        for s_item in summaries:
             if s_item.variant_name == variant:
                 return s_item
             # Fallback: if default variant not found, and requested variant was default, return first available
-        if variant == "default" and self.summaries:
-            return self.summaries[0]
+        if variant == "default" and summaries:
+            return summaries[0]
         return None
 
     def content(self, summary: bool = False, summary_variant: str = "default") -> str:
@@ -289,13 +397,32 @@ class VFile(Base, PKMixin, UpdateMixin, SubjectMixin, TokensMixin):
 
         return "\n".join(self.pages)
 
+    @staticmethod
+    def pages_hash(pages: Sequence[str]) -> str:
+        """content_hash of the joined pages, without joining them"""
+        digest = hashlib.sha256()
+        for i, page in enumerate(pages):
+            if i:
+                digest.update(b"\n")
+            digest.update(page.encode())
+        return digest.hexdigest()
+
     def to_pydantic(self) -> VFileSchema:
         return VFileSchema(**self.to_dict())
 
+    def tokens_key(self) -> str:
+        return self.pages_hash(self.pages)
+
     def _content(self) -> str:
         return self.content(False)
 
 
+# chunks of a split, joined on the partition key of embedding too
+SPLIT_EMBEDDINGS = (
+    "and_(VFileSplit.id == foreign(Embedding.vfile_split_id), VFileSplit.vfile_id == foreign(Embedding.vfile_id))"
+)
+
+
 class VFileSplit(Base, PKMixin, UpdateMixin):
     __tablename__ = "vfile_split"
     __allow_unmapped__ = True
@@ -309,6 +436,8 @@ class VFileSplit(Base, PKMixin, UpdateMixin):
         cascade="all, delete-orphan",
         default_factory=list,
         order_by="Embedding.part_number.asc()",
+        primaryjoin=SPLIT_EMBEDDINGS,
+        overlaps="vfile",
     )
     parts: Mapped[int] = mapped_column(default=0)
     chunk_size: Mapped[int] = mapped_column(default=1000)
@@ -316,7 +445,11 @@ class VFileSplit(Base, PKMixin, UpdateMixin):
     mode: Mapped[str] = mapped_column(default="recursive")
     name: Mapped[str] = mapped_column(default="default")
     model: Mapped[str] = mapped_column(default="")
+    # VFile.content_hash the chunks were cut from
+    content_hash: Mapped[str | None] = mapped_column(default=None)
     vfile: Mapped[VFile] = relationship("VFile", back_populates="splits", init=False, repr=False)
+    # other splits whose duplicates of chunks dropped by the last re-split were reset, in memory only
+    released_splits = frozenset()
     vectors: AssociationProxy[list[VectorVFile]] = association_proxy(
         "vector_vfile",
         "vector",
@@ -351,11 +484,19 @@ class Vector(Base, PKMixin, UpdateMixin, ExternalMixin, SubjectMixin):
 
 
 class Embedding(Base, PKMixin, UpdateMixin):
+    """A chunk of a split; the table is hash-partitioned on vfile_id (migration 00014)"""
+
     __tablename__ = "embedding"
+    # filter on it with the id, so the query only scans the partition of the document
+    partition_key: ClassVar[str] = "vfile_id"
 
-    vfile_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("vfile.id"), default=None)
+    # part of the primary key like in the table, so ORM UPDATEs and DELETEs are pruned to the partition
+    vfile_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("vfile.id"), primary_key=True, default=None)
     vfile_split_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("vfile_split.id"), default=None)
-    embedding_vector: Mapped[list[float]] = mapped_column(ARRAY(Float), default_factory=list, repr=False)
+    # content and vectors are deferred, see load_deferred() to fetch them for many rows at once
+    embedding_vector: Mapped[list[float]] = mapped_column(
+        ARRAY(Float), default_factory=list, repr=False, deferred=True, deferred_group="vector"
+    )
     model: Mapped[str | None] = mapped_column(default="")
     info: Mapped[dict[str, Any] | None] = mapped_column(JSONB, default=None)
     char_start: Mapped[int | None] = mapped_column(default=0)
@@ -363,13 +504,76 @@ class Embedding(Base, PKMixin, UpdateMixin):
     char_end: Mapped[int] = mapped_column(default=-1)
     status: Mapped[str] = mapped_column(default="created")
     vfile: Mapped["VFile"] = relationship("VFile", init=False, repr=False)
-    split: Mapped["VFileSplit"] = relationship("VFileSplit", init=False, repr=False)
-    content: Mapped[str] = mapped_column(default="")
+    split: Mapped["VFileSplit"] = relationship(
+        "VFileSplit",
+        init=False,
+        repr=False,
+        primaryjoin=SPLIT_EMBEDDINGS,
+        back_populates="embeddings",
+        overlaps="vfile",
+    )
+    content: Mapped[str] = mapped_column(default="", deferred=True)
+    embedding_blob: Mapped[bytes | None] = mapped_column(
+        LargeBinary, default=None, repr=False, deferred=True, deferred_group="vector"
+    )
+    vector_encoding: Mapped[str] = mapped_column(default=VectorEncodingEnum.ARRAY.value)
+    vector_scale: Mapped[float | None] = mapped_column(default=None)
+    # near-duplicate chunk whose vector stands for this one, which isn't embedded (antbed.dedup)
+    duplicate_of: Mapped[uuid.UUID | None] = mapped_column(default=None)
+    # LSH band keys of the chunk's MinHash signature, to find its near-duplicates in other documents
+    minhash_bands: Mapped[list[int] | None] = mapped_column(ARRAY(BigInteger), default=None, repr=False, deferred=True)
+
+    @property
+    def vector(self) -> np.ndarray:
+        """The embedding as a float32 array, decoded from whichever column holds it"""
+        if self.embedding_blob is not None and self.vector_encoding != VectorEncodingEnum.ARRAY:
+            return decode_vector(self.embedding_blob, VectorEncodingEnum(self.vector_encoding), self.vector_scale)
+        return np.asarray(self.embedding_vector, dtype=np.float32)
+
+    def set_vector(
+        self, vector: list[float] | np.ndarray, encoding: VectorEncodingEnum = VectorEncodingEnum.ARRAY
+    ) -> None:
+        encoding = VectorEncodingEnum(encoding)
+        if encoding == VectorEncodingEnum.ARRAY:
+            self.embedding_vector = np.asarray(vector, dtype=np.float64).tolist()
+            self.embedding_blob, self.vector_scale = None, None
+        else:
+            self.embedding_blob, self.vector_scale = encode_vector(vector, encoding)
+            self.embedding_vector = []
+        self.vector_encoding = encoding.value
+
+    @classmethod
+    def release_duplicates(
+        cls, ids: Iterable[uuid.UUID] | Select, session, *criteria: ColumnElement[bool]
+    ) -> set[uuid.UUID]:
+        """Make the chunks standing in for the chunks `ids`, which are going away, pending again.
+
+        They have no vector of their own; returns the ids of their splits, to embed and upsert again.
+        """
+        ids = ids if isinstance(ids, Select) else list(ids)
+        stmt = (
+            update(cls)
+            .where(cls.duplicate_of.in_(ids), *criteria)
+            .values(status="new", duplicate_of=None)
+            .returning(cls.vfile_split_id)
+            .execution_options(synchronize_session=False)
+        )
+        return set(session.execute(stmt).scalars())
 
     def to_pydantic(self) -> EmbeddingSchema:
         return EmbeddingSchema(**self.to_dict())
 
 
+class CachedEmbedding(Base, PKMixin, UpdateMixin):
+    __tablename__ = "embedding_cache"
+
+    provider: Mapped[str] = mapped_column(default="")
+    model: Mapped[str] = mapped_column(default="")
+    dimensions: Mapped[int] = mapped_column(default=0)
+    content_hash: Mapped[str] = mapped_column(default="")
+    embedding_vector: Mapped[list[float]] = mapped_column(ARRAY(Float), default_factory=list, repr=False)
+
+
 class VFileUpload(Base, PKMixin, UpdateMixin, ExternalMixin):
     __tablename__ = "vfile_upload"
     vfile_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("vfile.id"), default=None)
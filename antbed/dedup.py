@@ -0,0 +1,85 @@
+"""Near-duplicate chunks with MinHash signatures and locality-sensitive hashing.
+
+A chunk's signature holds, for each of `num_perm` random hash functions, the smallest hash
+of its word shingles; two signatures agree on a position with the probability of the
+Jaccard similarity of the shingle sets. Signatures are cut into `bands`, each hashed to a
+64-bit key: chunks sharing a key are candidates, and are near-duplicates if their
+signatures agree on at least `threshold` of the positions.
+"""
+
+import hashlib
+import uuid
+import zlib
+
+import numpy as np
+
+# hashes are taken modulo this prime, a * x + b stays below 2**64 for 32-bit shingle hashes
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class MinHashLSH:
+    def __init__(
+        self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, threshold: float = 0.9, seed: int = 1
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)[:, None]
+
+    def shingles(self, text: str) -> np.ndarray:
+        """crc32 of the lowercased word n-grams, the whole text if it has fewer words"""
+        words = text.lower().split()
+        n = self.shingle_size
+        grams = {" ".join(words[i : i + n]) for i in range(max(len(words) - n + 1, 1))}
+        return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        return ((self.a * self.shingles(text)[None, :] + self.b) % MERSENNE_PRIME).min(axis=1)
+
+    def band_keys(self, signature: np.ndarray) -> list[int]:
+        """One signed 64-bit key per band, stored in `embedding.minhash_bands`"""
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows : (band + 1) * self.rows]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size=8, person=band.to_bytes(16, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the shingles behind two signatures"""
+        return float(np.mean(a == b))
+
+
+class LSHIndex:
+    """Signatures by id, looked up by band key"""
+
+    def __init__(self, lsh: MinHashLSH) -> None:
+        self.lsh = lsh
+        self.signatures: dict[uuid.UUID, np.ndarray] = {}
+        self.buckets: dict[int, list[uuid.UUID]] = {}
+
+    def add(self, key: uuid.UUID, signature: np.ndarray, bands: list[int] | None = None) -> None:
+        self.signatures[key] = signature
+        for band in bands if bands is not None else self.lsh.band_keys(signature):
+            self.buckets.setdefault(band, []).append(key)
+
+    def query(self, signature: np.ndarray, bands: list[int] | None = None) -> uuid.UUID | None:
+        """The most similar indexed id, if at or above the threshold"""
+        best, best_score = None, 0.0
+        seen: set[uuid.UUID] = set()
+        for band in bands if bands is not None else self.lsh.band_keys(signature):
+            for key in self.buckets.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = self.lsh.similarity(signature, self.signatures[key])
+                if score >= self.lsh.threshold and score > best_score:
+                    best, best_score = key, score
+        return best
@@ -1,15 +1,55 @@
 import logging
 import uuid
+from collections.abc import Callable, Iterator
+from itertools import islice
+from typing import Any
 
+from sqlalchemy import and_, func, insert, select
 from sqlalchemy.exc import SQLAlchemyError
 
-from antbed.clients.embeddings import embedding_client
+from antbed.clients.embeddings import AsyncEmbeddingClient, embedding_client
 from antbed.config import config
-from antbed.db.models import Embedding, VFile, VFileSplit
+from antbed.db.models import Embedding, VectorVFile, VFile, VFileSplit, content_hash, load_deferred
+from antbed.dedup import LSHIndex, MinHashLSH
+from antbed.embedding_cache import EmbeddingCache, embedding_cache
+from antbed.encoders import count_tokens_batch
+from antbed.models import MODEL_DIMENSIONS, SplitDocument
 from antbed.splitdoc import Splitter
 
 logger = logging.getLogger(__name__)
 
+PENDING_STATUS = ("new", "skip", "error")
+# chunks linked to a near-duplicate through duplicate_of, neither embedded nor pointed
+DUPLICATE_STATUS = "duplicate"
+# Embedding columns written by insert_embeddings, the timestamps are left to the database
+INSERT_COLUMNS = (
+    "id",
+    "vfile_id",
+    "vfile_split_id",
+    "status",
+    "char_start",
+    "char_end",
+    "content",
+    "info",
+    "part_number",
+    "model",
+    "embedding_vector",
+    "embedding_blob",
+    "vector_encoding",
+    "vector_scale",
+    "duplicate_of",
+    "minhash_bands",
+)
+
+
+def streaming_hash(content_hash: str | None) -> str:
+    """content_hash of a split while `embedding_stream` is still writing its chunks.
+
+    It never matches the document's hash, so `prepare` re-splits an interrupted stream instead of
+    taking it as complete, and `embedding_stream` can resume it.
+    """
+    return f"streaming:{content_hash}"
+
 
 class VFileEmbedding:
     def __init__(
@@ -22,37 +62,86 @@ class VFileEmbedding:
             splitter = Splitter()
         self.splitter = splitter
 
-        # Use new embedding client factory
-        self.embedding_client = embedding_client(provider, use_litellm)
+        # Get default model and batch limits from config
+        self.provider_conf = config().embeddings.get_provider(provider)
 
-        # Get default model from config
-        self.default_model = config().embeddings.get_provider(provider).default_model
+        # Use new embedding client factory
+        self.embedding_client = embedding_client(provider, use_litellm, use_async=self.provider_conf.async_requests)
+        self.default_model = self.provider_conf.default_model
+        self.vector_encoding = config().embeddings.vector_encoding
+        self.cache: EmbeddingCache | None = embedding_cache() if config().embeddings.cache.enabled else None
+        dedup = config().embeddings.dedup
+        self.dedup: MinHashLSH | None = None
+        if dedup.enabled:
+            self.dedup = MinHashLSH(dedup.num_perm, dedup.bands, dedup.shingle_size, dedup.threshold)
 
-    def get_embedding(self, text: str, model: str | None = None) -> list[float]:
+    def get_embedding(self, text: str, model: str | None = None, dimensions: int | None = None) -> list[float]:
         """Get embedding for a single text"""
-        model = model or self.default_model
-        embeddings = self.embedding_client.embed([text], model)
-        return embeddings[0]
+        return self.get_embeddings_batch([text], model, dimensions)[0]
 
-    def get_embeddings_batch(self, texts: list[str], model: str | None = None) -> list[list[float]]:
+    def get_embeddings_batch(
+        self, texts: list[str], model: str | None = None, dimensions: int | None = None
+    ) -> list[list[float]]:
         """Get embeddings for multiple texts (more efficient)"""
         model = model or self.default_model
-        return self.embedding_client.embed(texts, model)
+        client = self.embedding_client
+        if self.cache is None:
+            return client.embed(texts, model, dimensions=dimensions)
+        return self.cache.embed(
+            texts,
+            model,
+            lambda misses: client.embed(misses, model, dimensions=dimensions),
+            dimensions,
+            provider=self.provider_conf.name,
+        )
+
+    def get_embeddings_many(
+        self, batches: list[list[str]], model: str | None = None, dimensions: int | None = None
+    ) -> list[list[list[float]]]:
+        """Get embeddings for several batches, all in flight at once with the async client"""
+        model = model or self.default_model
+        if not isinstance(self.embedding_client, AsyncEmbeddingClient):
+            return [self.get_embeddings_batch(texts, model, dimensions) for texts in batches]
+        client = self.embedding_client
+        if self.cache is None:
+            return client.embed_many(batches, model, dimensions=dimensions)
+        return self.cache.embed_many(
+            batches,
+            model,
+            lambda groups: client.embed_many(groups, model, dimensions=dimensions),
+            dimensions,
+            provider=self.provider_conf.name,
+        )
+
+    @staticmethod
+    def split_dimensions(vsplit: VFileSplit | None) -> int | None:
+        """`dimensions` the split is embedded with, None for the model's native size"""
+        if vsplit is None:
+            return None
+        return (vsplit.info or {}).get("splitter", {}).get("dimensions")
+
+    def vector_size(self) -> int:
+        """Size of the vectors produced with the splitter's settings"""
+        conf = self.splitter.config
+        return conf.dimensions or MODEL_DIMENSIONS.get(conf.model) or self.provider_conf.dimensions or 3072
 
-    def embedding_vfile(self, vfile: VFile, skip: bool = False, session=None) -> VFileSplit:
+    def embedding_vfile(
+        self, vfile: VFile, skip: bool = False, session=None, vector_id: uuid.UUID | None = None
+    ) -> VFileSplit:
         """Skip the embedding process"""
         vsplit = self.prepare(vfile, skip=skip, session=session)
         if skip:
             return vsplit
-        return self.gen_vector(vsplit, session=session)
+        return self.gen_vector(vsplit, session=session, vector_id=vector_id)
 
     def embedding(self, emb: Embedding, session=None):
-        if emb.status in ["new", "skip", "error"]:
+        if emb.status in PENDING_STATUS:
             # Use the split's model if available, otherwise use default
             model = emb.split.model if emb.split.model else self.default_model
-            emb.embedding_vector = self.get_embedding(emb.content, model)
+            vector = self.get_embedding(emb.content, model, self.split_dimensions(emb.split))
+            emb.set_vector(vector, self.vector_encoding)
             emb.status = "complete"
-            logger.info(f"Embedding {emb.id} vect size: {len(emb.embedding_vector)} complete")
+            logger.info(f"Embedding {emb.id} vect size: {len(emb.vector)} complete")
             try:
                 Embedding.add(emb, commit=True, session=session)
             except SQLAlchemyError as e:
@@ -60,16 +149,268 @@ class VFileEmbedding:
                 raise e
         return emb
 
-    def gen_vector(self, vsplit: VFileSplit, session=None) -> VFileSplit:
+    @staticmethod
+    def count_tokens(texts: list[str], model: str) -> list[int]:
+        return count_tokens_batch(texts, model)
+
+    def iter_batches(self, embs: list[Embedding], model: str | None = None) -> Iterator[list[Embedding]]:
+        """Pack embeddings into batches capped by the provider's item and token limits"""
+        model = model or self.default_model
+        max_items = self.provider_conf.max_batch_size
+        max_tokens = self.provider_conf.max_batch_tokens
+        batch: list[Embedding] = []
+        batch_tokens = 0
+        for emb, tokens in zip(embs, self.count_tokens([emb.content for emb in embs], model), strict=True):
+            if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(emb)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def embedding_batch(
+        self,
+        embs: list[Embedding],
+        model: str | None = None,
+        session=None,
+        commit: bool = True,
+        *,
+        vectors: list[list[float]] | None = None,
+    ) -> list[Embedding]:
+        """Embed a batch of chunks with a single request, unless `vectors` are given, and commit them together"""
+        pending = [emb for emb in embs if emb.status in PENDING_STATUS]
+        if not pending:
+            return embs
+        model = model or self.default_model
+        if vectors is None:
+            vectors = self.get_embeddings_batch(
+                [emb.content for emb in pending], model, self.split_dimensions(pending[0].split)
+            )
+        if len(vectors) != len(pending):
+            raise ValueError(f"Expected {len(pending)} embeddings, got {len(vectors)}")
+        by_part = {emb.part_number: vector for emb, vector in zip(pending, vectors, strict=True)}
+        session = Embedding.new_session(session)
+        try:
+            for emb in pending:
+                emb.set_vector(by_part[emb.part_number], self.vector_encoding)
+                emb.status = "complete"
+                Embedding.add(emb, commit=False, session=session)
+            if commit:
+                session.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Error adding embeddings: {e}")
+            session.rollback()
+            raise e
+        logger.info(f"Embedded parts {pending[0].part_number}-{pending[-1].part_number} ({len(pending)} chunks)")
+        return embs
+
+    def embedding_many(self, embs: list[Embedding], model: str | None = None, session=None) -> list[Embedding]:
+        """Embed chunks in as few requests as the provider limits allow, within one transaction"""
+        session = Embedding.new_session(session)
+        try:
+            batches = list(self.iter_batches([emb for emb in embs if emb.status in PENDING_STATUS], model))
+            dimensions = self.split_dimensions(batches[0][0].split) if batches else None
+            texts = [[emb.content for emb in batch] for batch in batches]
+            vectors = self.get_embeddings_many(texts, model, dimensions)
+            for batch, batch_vectors in zip(batches, vectors, strict=True):
+                self.embedding_batch(batch, model, session=session, commit=False, vectors=batch_vectors)
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            raise e
+        return embs
+
+    def mark_duplicates(self, embs: list[Embedding], index: LSHIndex | None = None) -> int:
+        """Link the near-duplicate chunks of a document to the first chunk of their group.
+
+        Chunks that already have a vector stay representatives, and links to other documents
+        are kept; the others, in order, become duplicates of the most similar representative,
+        or one themselves. `index` carries the representatives over from earlier batches.
+        Returns the number of duplicates.
+        """
+        if self.dedup is None:
+            return 0
+        index = index if index is not None else LSHIndex(self.dedup)
+        ids = {emb.id for emb in embs}
+        signatures = [self.dedup.signature(emb.content) for emb in embs]
+        for emb, signature in zip(embs, signatures, strict=True):
+            emb.minhash_bands = self.dedup.band_keys(signature)
+            if emb.status == "complete":
+                index.add(emb.id, signature, emb.minhash_bands)
+        duplicates = 0
+        for emb, signature in zip(embs, signatures, strict=True):
+            linked_out = emb.status == DUPLICATE_STATUS and emb.duplicate_of not in ids
+            if emb.status == "complete" or (linked_out and emb.duplicate_of not in index.signatures):
+                duplicates += linked_out
+                continue
+            rep = index.query(signature, emb.minhash_bands)
+            if rep is None:
+                if emb.status == DUPLICATE_STATUS:
+                    emb.status, emb.duplicate_of = "new", None
+                index.add(emb.id, signature, emb.minhash_bands)
+            else:
+                emb.status, emb.duplicate_of = DUPLICATE_STATUS, rep
+                duplicates += 1
+        return duplicates
+
+    def find_vector_duplicates(
+        self, vsplit: VFileSplit, embs: list[Embedding], vector_id: uuid.UUID, session
+    ) -> list[Embedding]:
+        """Link chunks to near-duplicates already embedded by other documents of the vector.
+
+        Candidates share an LSH band key with a chunk, through the minhash_bands GIN index.
+        Duplicates within the split that pointed to a linked chunk follow it. Returns the
+        chunks left to embed; the linked ones are only changed in memory.
+        """
+        if self.dedup is None or not embs:
+            return embs
+        signatures = [self.dedup.signature(emb.content) for emb in embs]
+        bands = [self.dedup.band_keys(signature) for signature in signatures]
+        stmt = (
+            select(Embedding.id, Embedding.content, Embedding.minhash_bands)
+            .join(
+                VectorVFile,
+                and_(VectorVFile.vsplit_id == Embedding.vfile_split_id, VectorVFile.vfile_id == Embedding.vfile_id),
+            )
+            .where(
+                VectorVFile.vector_id == vector_id,
+                Embedding.vfile_split_id != vsplit.id,
+                Embedding.status == "complete",
+                Embedding.minhash_bands.overlap(sorted({key for keys in bands for key in keys})),
+            )
+        )
+        index = LSHIndex(self.dedup)
+        for row in session.execute(stmt):
+            index.add(row.id, self.dedup.signature(row.content), row.minhash_bands)
+        left: list[Embedding] = []
+        linked: dict[uuid.UUID, uuid.UUID] = {}
+        for emb, signature, keys in zip(embs, signatures, bands, strict=True):
+            rep = index.query(signature, keys)
+            if rep is None:
+                left.append(emb)
+                continue
+            emb.status, emb.duplicate_of = DUPLICATE_STATUS, rep
+            linked[emb.id] = rep
         for emb in vsplit.embeddings:
-            self.embedding(emb, session)
+            if emb.duplicate_of in linked:
+                emb.duplicate_of = linked[emb.duplicate_of]
+        if linked:
+            logger.info(f"Linked {len(linked)} chunks of {vsplit.id} to near-duplicates in vector {vector_id}")
+        return left
+
+    def gen_vector(self, vsplit: VFileSplit, session=None, vector_id: uuid.UUID | None = None) -> VFileSplit:
+        """Embed the pending chunks of a split.
+
+        With `vector_id` and dedup enabled, chunks with a near-duplicate already embedded in
+        the vector are linked to it instead.
+        """
+        pending = [emb for emb in vsplit.embeddings if emb.status in PENDING_STATUS]
+        load_deferred(pending, Embedding.content)
+        if vector_id is not None and self.dedup is not None and pending:
+            session = Embedding.new_session(session)
+            left = self.find_vector_duplicates(vsplit, pending, vector_id, session)
+            if len(left) < len(pending):
+                try:
+                    for emb in vsplit.embeddings:
+                        if emb.status == DUPLICATE_STATUS:
+                            Embedding.add(emb, commit=False, session=session)
+                    session.commit()
+                except SQLAlchemyError as e:
+                    session.rollback()
+                    raise e
+            pending = left
+        model = vsplit.model if vsplit.model else self.default_model
+        batches = list(self.iter_batches(pending, model))
+        texts = [[emb.content for emb in batch] for batch in batches]
+        vectors = self.get_embeddings_many(texts, model, self.split_dimensions(vsplit))
+        for batch, batch_vectors in zip(batches, vectors, strict=True):
+            self.embedding_batch(batch, model, session=session, vectors=batch_vectors)
+        if self.cache is not None and pending:
+            stats = self.cache.stats
+            logger.info(f"Embedding cache: {stats.hits} hits, {stats.misses} misses ({stats.hit_rate:.1%})")
         return vsplit
 
-    def prepare(self, vfile: VFile, skip: bool = False, session=None) -> VFileSplit:
-        text = vfile.content()
-        docs = self.splitter.split(text)
-        embeddings = []
-        vs = (
+    @staticmethod
+    def new_embedding(split: VFileSplit, vfile: VFile, doc: SplitDocument, part: int, status: str) -> Embedding:
+        return Embedding(
+            id=uuid.uuid4(),
+            vfile_id=vfile.id,
+            status=status,
+            char_start=doc.start,
+            char_end=doc.stop,
+            content=doc.content,
+            vfile_split_id=split.id,
+            info={},
+            part_number=part,
+            model=split.model,
+        )
+
+    @staticmethod
+    def insert_embeddings(embs: list[Embedding], session) -> list[uuid.UUID]:
+        """Write new chunk rows with a multi-row INSERT ... RETURNING instead of flushing one ORM object each.
+
+        The objects stay transient, returns the ids of the rows in the order of `embs`.
+        """
+        if not embs:
+            return []
+        rows = [{key: getattr(emb, key) for key in INSERT_COLUMNS} for emb in embs]
+        # the split and vfile rows must exist before their chunks reference them
+        session.flush()
+        stmt = insert(Embedding).returning(Embedding.id, sort_by_parameter_order=True)
+        return list(session.execute(stmt, rows).scalars())
+
+    def resplit(self, vs: VFileSplit, vfile: VFile, docs: list[SplitDocument], status: str, session) -> VFileSplit:
+        """Re-cut a split in place after its document changed.
+
+        Chunks whose text is unchanged keep their row, id and vector and only move to their new
+        position; new chunks are added pending, and chunks that disappeared are deleted. Their
+        duplicates in other splits are reset, the ids of those splits end up in `released_splits`.
+        """
+        old = list(vs.embeddings)
+        load_deferred(old, Embedding.content)
+        reusable: dict[str, list[Embedding]] = {}
+        for emb in old:
+            reusable.setdefault(content_hash(emb.content), []).append(emb)
+        kept: set[uuid.UUID] = set()
+        with session.begin_nested():
+            try:
+                for i, doc in enumerate(docs):
+                    candidates = reusable.get(content_hash(doc.content))
+                    if candidates:
+                        emb = candidates.pop(0)
+                        emb.part_number, emb.char_start, emb.char_end = i, doc.start, doc.stop
+                        kept.add(emb.id)
+                    else:
+                        vs.embeddings.append(self.new_embedding(vs, vfile, doc, i, status))
+                removed = {emb.id for emb in old if emb.id not in kept}
+                for emb in old:
+                    if emb.id not in kept:
+                        vs.embeddings.remove(emb)
+                    elif emb.duplicate_of in removed:
+                        emb.status, emb.duplicate_of = "new", None
+                if removed:
+                    # duplicates in other splits of a deleted chunk, see VectorManager.refresh_splits
+                    vs.released_splits = frozenset(
+                        Embedding.release_duplicates(removed, session, Embedding.vfile_split_id != vs.id)
+                    )
+                if status != "skip":
+                    self.mark_duplicates(sorted(vs.embeddings, key=lambda emb: emb.part_number))
+                vs.parts = len(docs)
+                vs.content_hash = vfile.content_hash
+                VFileSplit.add(vs, commit=False, session=session)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                raise e
+        logger.info(
+            f"Re-split {vfile.id}: {len(kept)} chunks reused, {len(docs) - len(kept)} added, "
+            f"{len(old) - len(kept)} removed"
+        )
+        return vs
+
+    def find_split(self, vfile: VFile, session) -> VFileSplit | None:
+        return (
             VFileSplit.where(
                 VFileSplit.vfile_id == vfile.id,
                 VFileSplit.config_hash == self.splitter.config.config_hash(),
@@ -78,48 +419,131 @@ class VFileEmbedding:
             .scalars()
             .first()
         )
-        if vs:
+
+    def new_split(self, vfile: VFile, parts: int) -> VFileSplit:
+        return VFileSplit(
+            id=uuid.uuid4(),
+            vfile_id=vfile.id,
+            mode=self.splitter.config.splitter_type.name.lower(),
+            name=self.splitter.config.name().lower(),
+            chunk_size=self.splitter.config.chunk_size,
+            chunk_overlap=self.splitter.config.overlap(),
+            model=self.splitter.config.model.lower(),
+            info={"splitter": self.splitter.config.model_dump()},
+            config_hash=self.splitter.config.config_hash(),
+            content_hash=vfile.content_hash,
+            parts=parts,
+        )
+
+    def prepare(self, vfile: VFile, skip: bool = False, session=None) -> VFileSplit:
+        if vfile.content_hash is None:
+            vfile.content_hash = VFile.pages_hash(vfile.pages)
+        session = VFile.new_session(session)
+        vs = self.find_split(vfile, session)
+        if vs and vs.content_hash in (None, vfile.content_hash):
             return vs
         status = "new"
         if skip:
             status = "skip"
-        session = VFile.new_session(session)
+        docs = list(self.splitter.split_iter(vfile.pages))
+        if vs:
+            return self.resplit(vs, vfile, docs, status, session)
         with session.begin_nested():
             try:
-                split = VFileSplit(
-                    id=uuid.uuid4(),
-                    vfile_id=vfile.id,
-                    mode=self.splitter.config.splitter_type.name.lower(),
-                    name=self.splitter.config.name().lower(),
-                    chunk_size=self.splitter.config.chunk_size,
-                    chunk_overlap=self.splitter.config.overlap(),
-                    model=self.splitter.config.model.lower(),
-                    info={"splitter": self.splitter.config.model_dump()},
-                    config_hash=self.splitter.config.config_hash(),
-                    parts=len(docs),
-                )
+                split = self.new_split(vfile, parts=len(docs))
                 VFileSplit.add(split, commit=False, session=session)
-                for i, doc in enumerate(docs):
-                    uid = uuid.uuid4()
-                    emb = Embedding(
-                        id=uid,
-                        vfile_id=vfile.id,
-                        status=status,
-                        char_start=doc.start,
-                        char_end=doc.stop,
-                        content=doc.content,
-                        vfile_split_id=split.id,
-                        info={},
-                        part_number=i,
-                        model=split.model,
-                    )
-                    Embedding.add(emb, commit=False, session=session)
-                    embeddings.append(emb)
-                # split.embeddings = embeddings
-
                 VFile.add(vfile, commit=False, session=session)
+                embs = [self.new_embedding(split, vfile, doc, i, status) for i, doc in enumerate(docs)]
+                if not skip:
+                    self.mark_duplicates(embs)
+                self.insert_embeddings(embs, session)
+                # the rows bypassed the unit of work, reload the relationship on next access
+                session.expire(split, ["embeddings"])
                 session.commit()
             except SQLAlchemyError as e:
                 session.rollback()
                 raise e
             return split
+
+    def should_stream(self, vfile: VFile) -> bool:
+        return sum(len(page) for page in vfile.pages) > config().embeddings.stream_threshold
+
+    def iter_embedded(self, split: VFileSplit, vfile: VFile, session, start: int = 0) -> Iterator[list[Embedding]]:
+        """Split the pages of `vfile` lazily and embed, persist and yield the chunks batch by batch.
+
+        Only one group of `max_batch_size` chunks is held at a time; each is cut into provider
+        batches, embedded with `get_embeddings_many`, and written with its vectors in one INSERT.
+        The chunks before part `start` are already stored and skipped.
+        """
+        model = split.model or self.default_model
+        dimensions = self.split_dimensions(split)
+        part = start
+        chunks = islice(self.splitter.split_iter(vfile.pages), start, None)
+        index = LSHIndex(self.dedup) if self.dedup is not None else None
+        while docs := list(islice(chunks, self.provider_conf.max_batch_size)):
+            embs = [self.new_embedding(split, vfile, doc, part + i, "new") for i, doc in enumerate(docs)]
+            part += len(embs)
+            self.mark_duplicates(embs, index)
+            batches = list(self.iter_batches([emb for emb in embs if emb.status != DUPLICATE_STATUS], model))
+            vectors = self.get_embeddings_many([[emb.content for emb in batch] for batch in batches], model, dimensions)
+            for batch, batch_vectors in zip(batches, vectors, strict=True):
+                for emb, vector in zip(batch, batch_vectors, strict=True):
+                    emb.set_vector(vector, self.vector_encoding)
+                    emb.status = "complete"
+            try:
+                self.insert_embeddings(embs, session)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                raise e
+            logger.info(f"Streamed parts {embs[0].part_number}-{embs[-1].part_number} of {vfile.id}")
+            yield embs
+
+    def embedding_stream(
+        self,
+        vfile: VFile,
+        on_batch: Callable[[VFileSplit, list[Embedding]], Any] | None = None,
+        session=None,
+        vector_id: uuid.UUID | None = None,
+    ) -> VFileSplit:
+        """Embed a new split of a large document while it's being split, see `iter_embedded`.
+
+        `on_batch` gets each embedded batch, to upsert it into a vector store before the next one
+        is split. The split keeps a `streaming_hash` until its last batch is stored, a stream that
+        was interrupted resumes after its last stored part. A document that already has a split
+        goes through `embedding_vfile` instead.
+        """
+        if vfile.content_hash is None:
+            vfile.content_hash = VFile.pages_hash(vfile.pages)
+        session = VFile.new_session(session)
+        split = self.find_split(vfile, session)
+        start = 0
+        if split is None:
+            split = self.new_split(vfile, parts=0)
+            split.content_hash = streaming_hash(vfile.content_hash)
+            try:
+                VFileSplit.add(split, commit=False, session=session)
+                VFile.add(vfile, commit=False, session=session)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                raise e
+        elif split.content_hash == streaming_hash(vfile.content_hash):
+            last = session.execute(
+                select(func.max(Embedding.part_number)).where(
+                    Embedding.vfile_split_id == split.id, Embedding.vfile_id == split.vfile_id
+                )
+            ).scalar()
+            start = 0 if last is None else last + 1
+            logger.info(f"Resuming the stream of {vfile.id} at part {start}")
+        else:
+            return self.embedding_vfile(vfile, session=session, vector_id=vector_id)
+        split.parts = start
+        for embs in self.iter_embedded(split, vfile, session, start=start):
+            split.parts += len(embs)
+            if on_batch is not None:
+                on_batch(split, embs)
+        split.content_hash = vfile.content_hash
+        VFileSplit.add(split, commit=True, session=session)
+        session.expire(split, ["embeddings"])
+        return split
@@ -0,0 +1,217 @@
+import logging
+import threading
+from array import array
+from collections.abc import Callable
+from functools import cache
+
+import logfire
+from pydantic import BaseModel, Field
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from antbed.config import config
+from antbed.db.models import CachedEmbedding, content_hash
+from antbed.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+type CacheKey = tuple[str, str, int, str]
+
+HITS_COUNTER = logfire.metric_counter(
+    "antbed.embedding_cache.hits", unit="1", description="Chunks served from the embedding cache"
+)
+MISSES_COUNTER = logfire.metric_counter(
+    "antbed.embedding_cache.misses", unit="1", description="Chunks sent to the embedding provider"
+)
+
+
+class CacheStats(BaseModel):
+    memory_hits: int = Field(default=0, description="Vectors found in the in-process LRU")
+    db_hits: int = Field(default=0, description="Vectors found in the embedding_cache table")
+    misses: int = Field(default=0, description="Vectors requested from the provider")
+    requests_saved: int = Field(default=0, description="Provider calls avoided because every chunk was cached")
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.db_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class EmbeddingCache:
+    """Content-addressed vectors keyed by (provider, model, dimensions, sha256(content)).
+
+    Lookups go through an in-process LRU, then the `embedding_cache` table with `persist`; only
+    the remaining chunks are sent to the provider, and their vectors are stored in both.
+    """
+
+    def __init__(self, lru_size: int = 2048, persist: bool = False) -> None:
+        self.lru: LRUCache[CacheKey, array] = LRUCache(lru_size)
+        self.persist = persist
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, model: str, dimensions: int | None = None, *, provider: str) -> CacheKey:
+        # the same model name can stand for different vectors, like with the local 'hashing' provider
+        return (provider, model, dimensions or 0, content_hash(text))
+
+    def _count(self, memory_hits: int = 0, db_hits: int = 0, misses: int = 0, requests_saved: int = 0) -> None:
+        with self._lock:
+            self.stats.memory_hits += memory_hits
+            self.stats.db_hits += db_hits
+            self.stats.misses += misses
+            self.stats.requests_saved += requests_saved
+        if memory_hits:
+            HITS_COUNTER.add(memory_hits, {"level": "memory"})
+        if db_hits:
+            HITS_COUNTER.add(db_hits, {"level": "db"})
+        if misses:
+            MISSES_COUNTER.add(misses)
+
+    def _load(self, provider: str, model: str, dimensions: int, hashes: list[str]) -> dict[str, list[float]]:
+        if not self.persist or not hashes:
+            return {}
+        try:
+            with CachedEmbedding.new_session(None) as session:
+                rows = session.execute(
+                    CachedEmbedding.select(session).where(
+                        CachedEmbedding.provider == provider,
+                        CachedEmbedding.model == model,
+                        CachedEmbedding.dimensions == dimensions,
+                        CachedEmbedding.content_hash.in_(hashes),
+                    )
+                ).scalars()
+                return {row.content_hash: row.embedding_vector for row in rows}
+        except SQLAlchemyError as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return {}
+
+    def _store(self, provider: str, model: str, dimensions: int, vectors: dict[str, list[float]]) -> None:
+        if not self.persist or not vectors:
+            return
+        rows = [
+            {
+                "provider": provider,
+                "model": model,
+                "dimensions": dimensions,
+                "content_hash": chash,
+                "embedding_vector": vector,
+            }
+            for chash, vector in vectors.items()
+        ]
+        stmt = (
+            insert(CachedEmbedding)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["provider", "model", "dimensions", "content_hash"])
+        )
+        try:
+            with CachedEmbedding.new_session(None) as session:
+                session.execute(stmt)
+                session.commit()
+        except SQLAlchemyError as e:
+            logger.warning(f"Embedding cache store failed: {e}")
+
+    def get_many(
+        self, texts: list[str], model: str, dimensions: int | None = None, *, provider: str
+    ) -> list[list[float] | None]:
+        """Return the cached vector of each text, None where it's not cached"""
+        keys = [self.key(text, model, dimensions, provider=provider) for text in texts]
+        res: list[list[float] | None] = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+        for i, key in enumerate(keys):
+            vector = self.lru.get(key)
+            if vector is not None:
+                res[i] = vector.tolist()
+            else:
+                missing.setdefault(key[3], []).append(i)
+        memory_hits = len(texts) - sum(len(idx) for idx in missing.values())
+        db_hits = 0
+        for chash, vector in self._load(provider, model, dimensions or 0, list(missing)).items():
+            self.lru.set((provider, model, dimensions or 0, chash), array("d", vector))
+            for i in missing[chash]:
+                res[i] = vector
+                db_hits += 1
+        self._count(memory_hits=memory_hits, db_hits=db_hits)
+        return res
+
+    def set_many(
+        self, texts: list[str], vectors: list[list[float]], model: str, dimensions: int | None = None, *, provider: str
+    ) -> None:
+        new: dict[str, list[float]] = {}
+        for text, vector in zip(texts, vectors, strict=True):
+            key = self.key(text, model, dimensions, provider=provider)
+            self.lru.set(key, array("d", vector))
+            new[key[3]] = vector
+        self._store(provider, model, dimensions or 0, new)
+
+    def embed(
+        self,
+        texts: list[str],
+        model: str,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+        dimensions: int | None = None,
+        *,
+        provider: str,
+    ) -> list[list[float]]:
+        """Return the vectors of `texts` from `provider`, calling `embed_fn` only for the uncached, distinct ones"""
+        vectors = self.get_many(texts, model, dimensions, provider=provider)
+        pending: dict[str, list[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                pending.setdefault(texts[i], []).append(i)
+        if not pending:
+            self._count(requests_saved=1)
+            return [v for v in vectors if v is not None]
+
+        misses = list(pending)
+        new_vectors = embed_fn(misses)
+        if len(new_vectors) != len(misses):
+            raise ValueError(f"Expected {len(misses)} embeddings, got {len(new_vectors)}")
+        self._count(misses=len(misses))
+        for text, vector in zip(misses, new_vectors, strict=True):
+            for i in pending[text]:
+                vectors[i] = vector
+        self.set_many(misses, new_vectors, model, dimensions, provider=provider)
+        return [v for v in vectors if v is not None]
+
+    def embed_many(
+        self,
+        batches: list[list[str]],
+        model: str,
+        embed_many_fn: Callable[[list[list[str]]], list[list[list[float]]]],
+        dimensions: int | None = None,
+        *,
+        provider: str,
+    ) -> list[list[list[float]]]:
+        """`embed` over several batches at once; `embed_many_fn` gets the misses, grouped by their original batch"""
+
+        def fetch(misses: list[str]) -> list[list[float]]:
+            todo = set(misses)
+            groups = []
+            for texts in batches:
+                group = [text for text in dict.fromkeys(texts) if text in todo]
+                todo.difference_update(group)
+                if group:
+                    groups.append(group)
+            vectors = [vector for group_vectors in embed_many_fn(groups) for vector in group_vectors]
+            found = dict(zip([text for group in groups for text in group], vectors, strict=True))
+            return [found[text] for text in misses]
+
+        vectors = self.embed([text for texts in batches for text in texts], model, fetch, dimensions, provider=provider)
+        res = []
+        start = 0
+        for texts in batches:
+            res.append(vectors[start : start + len(texts)])
+            start += len(texts)
+        return res
+
+
+@cache
+def embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache, shared by every worker thread"""
+    conf = config().embeddings.cache
+    return EmbeddingCache(lru_size=conf.lru_size, persist=conf.persist)
@@ -0,0 +1,25 @@
+from functools import lru_cache
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=64)
+def encoder(model: str = "gpt-4o") -> tiktoken.Encoding:
+    """tiktoken encoder of a model, resolved once per process; unknown models use cl100k_base"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    return len(encoder(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: list[str], model: str = "gpt-4o") -> list[int]:
+    """Token counts of many texts, encoded by tiktoken's thread pool"""
+    if not texts:
+        return []
+    return [len(tokens) for tokens in encoder(model).encode_ordinary_batch(texts)]
@@ -0,0 +1,27 @@
+-- +goose Up
+-- +goose StatementBegin
+
+-- embedding_cache: vectors keyed by the sha256 of the chunk content, shared across documents and splits
+CREATE TABLE embedding_cache (
+  id uuid PRIMARY KEY NOT NULL DEFAULT gen_random_uuid(),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+  model text NOT NULL,
+  dimensions int NOT NULL DEFAULT 0,
+  content_hash text NOT NULL,
+  embedding_vector float[] NOT NULL
+);
+
+CREATE UNIQUE INDEX embedding_cache_key_idx ON embedding_cache (model, dimensions, content_hash);
+
+CREATE TRIGGER set_timestamp_update
+  BEFORE UPDATE ON embedding_cache
+  FOR EACH ROW
+  EXECUTE PROCEDURE trigger_set_timestamp();
+
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP TABLE embedding_cache;
+-- +goose StatementEnd
@@ -0,0 +1,20 @@
+-- +goose Up
+-- +goose StatementBegin
+
+-- Compact vector storage: float32/float16/int8 packed in bytea, decoded with numpy.
+-- Existing rows keep vector_encoding = 'float8' and are converted with `antbed embeddings recode`.
+ALTER TABLE embedding
+  ADD COLUMN embedding_blob bytea,
+  ADD COLUMN vector_encoding text NOT NULL DEFAULT 'float8',
+  ADD COLUMN vector_scale real;
+
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+-- Run `antbed embeddings recode --encoding float8` first, blob-only vectors are lost otherwise
+ALTER TABLE embedding
+  DROP COLUMN embedding_blob,
+  DROP COLUMN vector_encoding,
+  DROP COLUMN vector_scale;
+-- +goose StatementEnd
@@ -0,0 +1,9 @@
+-- +goose Up
+-- +goose StatementBegin
+CREATE INDEX IF NOT EXISTS vfile_source_created_at_id_idx ON vfile (source_created_at, id);
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP INDEX IF EXISTS vfile_source_created_at_id_idx;
+-- +goose StatementEnd
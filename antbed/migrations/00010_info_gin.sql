@@ -0,0 +1,11 @@
+-- +goose Up
+-- +goose StatementBegin
+-- The default jsonb_ops serves both the `@>` equalities and the `?`, `?&`, `?|` key checks of
+-- exists/not_exists filters; a second jsonb_path_ops index would only speed up `@>` at twice the write cost
+CREATE INDEX IF NOT EXISTS vfile_info_keys_idx ON vfile USING gin (info);
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP INDEX IF EXISTS vfile_info_keys_idx;
+-- +goose StatementEnd
@@ -0,0 +1,15 @@
+-- +goose Up
+-- +goose StatementBegin
+ALTER TABLE vfile ADD COLUMN content_hash text;
+ALTER TABLE vfile_split ADD COLUMN content_hash text;
+
+-- Same digest as VFile.pages_hash: sha256 of the pages joined by newlines
+UPDATE vfile SET content_hash = encode(sha256(convert_to(array_to_string(pages, E'\n'), 'UTF8')), 'hex');
+UPDATE vfile_split SET content_hash = vfile.content_hash FROM vfile WHERE vfile.id = vfile_split.vfile_id;
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+ALTER TABLE vfile_split DROP COLUMN content_hash;
+ALTER TABLE vfile DROP COLUMN content_hash;
+-- +goose StatementEnd
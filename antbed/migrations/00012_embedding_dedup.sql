@@ -0,0 +1,18 @@
+-- +goose Up
+-- +goose StatementBegin
+ALTER TABLE embedding ADD COLUMN duplicate_of uuid;
+ALTER TABLE embedding ADD COLUMN minhash_bands bigint[];
+
+-- duplicates are promoted when the chunk they're linked to is deleted
+CREATE INDEX IF NOT EXISTS embedding_duplicate_of_idx ON embedding (duplicate_of) WHERE duplicate_of IS NOT NULL;
+-- near-duplicate candidates in other documents share a band key (`&&`)
+CREATE INDEX IF NOT EXISTS embedding_minhash_bands_idx ON embedding USING gin (minhash_bands);
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP INDEX IF EXISTS embedding_minhash_bands_idx;
+DROP INDEX IF EXISTS embedding_duplicate_of_idx;
+ALTER TABLE embedding DROP COLUMN minhash_bands;
+ALTER TABLE embedding DROP COLUMN duplicate_of;
+-- +goose StatementEnd
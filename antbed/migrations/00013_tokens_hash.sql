@@ -0,0 +1,15 @@
+-- +goose Up
+-- +goose StatementBegin
+ALTER TABLE vfile ADD COLUMN tokens_hash text;
+ALTER TABLE summary ADD COLUMN tokens_hash text;
+
+-- The counts were taken from the current content: vfile.content_hash is the same digest as VFile.pages_hash
+UPDATE vfile SET tokens_hash = content_hash WHERE tokens IS NOT NULL;
+UPDATE summary SET tokens_hash = encode(sha256(convert_to(summary, 'UTF8')), 'hex') WHERE tokens IS NOT NULL;
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+ALTER TABLE summary DROP COLUMN tokens_hash;
+ALTER TABLE vfile DROP COLUMN tokens_hash;
+-- +goose StatementEnd
@@ -0,0 +1,62 @@
+-- +goose Up
+-- +goose StatementBegin
+
+-- embedding, hash-partitioned on vfile_id: the chunks of a document, across all its splits,
+-- live in one partition. Queries that filter on vfile_id scan that partition only, and
+-- vacuum and index builds run per partition. The modulus can't be changed in place.
+ALTER TABLE embedding RENAME TO embedding_unpartitioned;
+
+CREATE TABLE embedding (
+  LIKE embedding_unpartitioned INCLUDING DEFAULTS
+) PARTITION BY HASH (vfile_id);
+
+DO $$
+BEGIN
+  FOR i IN 0..31 LOOP
+    EXECUTE format('CREATE TABLE embedding_p%s PARTITION OF embedding FOR VALUES WITH (MODULUS 32, REMAINDER %s)', i, i);
+  END LOOP;
+END $$;
+
+INSERT INTO embedding SELECT * FROM embedding_unpartitioned;
+DROP TABLE embedding_unpartitioned;
+
+-- unique constraints of a partitioned table include the partition key, lookups by id use its index
+ALTER TABLE embedding ADD PRIMARY KEY (id, vfile_id);
+ALTER TABLE embedding ADD FOREIGN KEY (vfile_id) REFERENCES vfile (id);
+ALTER TABLE embedding ADD FOREIGN KEY (vfile_split_id) REFERENCES vfile_split (id);
+
+CREATE INDEX embedding_vfile_split_idx ON embedding (vfile_id, vfile_split_id, part_number);
+CREATE INDEX embedding_duplicate_of_idx ON embedding (duplicate_of) WHERE duplicate_of IS NOT NULL;
+CREATE INDEX embedding_minhash_bands_idx ON embedding USING gin (minhash_bands);
+
+CREATE TRIGGER set_timestamp_update
+  BEFORE UPDATE ON embedding
+  FOR EACH ROW
+  EXECUTE PROCEDURE trigger_set_timestamp();
+
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+ALTER TABLE embedding RENAME TO embedding_partitioned;
+
+CREATE TABLE embedding (
+  LIKE embedding_partitioned INCLUDING DEFAULTS
+);
+
+INSERT INTO embedding SELECT * FROM embedding_partitioned;
+DROP TABLE embedding_partitioned;
+
+ALTER TABLE embedding ADD PRIMARY KEY (id);
+ALTER TABLE embedding ADD FOREIGN KEY (vfile_id) REFERENCES vfile (id);
+ALTER TABLE embedding ADD FOREIGN KEY (vfile_split_id) REFERENCES vfile_split (id);
+
+CREATE INDEX ON embedding (vfile_id);
+CREATE INDEX embedding_duplicate_of_idx ON embedding (duplicate_of) WHERE duplicate_of IS NOT NULL;
+CREATE INDEX embedding_minhash_bands_idx ON embedding USING gin (minhash_bands);
+
+CREATE TRIGGER set_timestamp_update
+  BEFORE UPDATE ON embedding
+  FOR EACH ROW
+  EXECUTE PROCEDURE trigger_set_timestamp();
+-- +goose StatementEnd
@@ -0,0 +1,22 @@
+-- +goose Up
+-- +goose StatementBegin
+
+-- the same model name can stand for different vectors depending on the provider (e.g. the local 'hashing' one);
+-- the cached rows don't say which provider made them, so they are dropped rather than guessed
+DELETE FROM embedding_cache;
+ALTER TABLE embedding_cache ADD COLUMN provider text NOT NULL;
+
+DROP INDEX embedding_cache_key_idx;
+CREATE UNIQUE INDEX embedding_cache_key_idx ON embedding_cache (provider, model, dimensions, content_hash);
+
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP INDEX embedding_cache_key_idx;
+DELETE FROM embedding_cache a
+  USING embedding_cache b
+  WHERE a.model = b.model AND a.dimensions = b.dimensions AND a.content_hash = b.content_hash AND a.id > b.id;
+CREATE UNIQUE INDEX embedding_cache_key_idx ON embedding_cache (model, dimensions, content_hash);
+ALTER TABLE embedding_cache DROP COLUMN provider;
+-- +goose StatementEnd
@@ -0,0 +1,37 @@
+-- +goose Up
+-- +goose StatementBegin
+-- Opt-in: only applied by `make migrate-pgvector`, on databases with the vector extension available.
+-- It runs after the main migrations, with its own version table.
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- pgvector_point: points of the vectors managed by the pgvector backend.
+-- The column has no fixed dimension; ANN indexes are partial expression indexes
+-- created per (model, dimensions) by the application, see antbed/vectordb/pgvector.py
+CREATE TABLE pgvector_point (
+  id uuid PRIMARY KEY NOT NULL DEFAULT gen_random_uuid(),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+  vector_id uuid NOT NULL REFERENCES vector(id) ON DELETE CASCADE,
+  vfile_id uuid NOT NULL,
+  vfile_split_id uuid NOT NULL,
+  embedding_id uuid NOT NULL,
+  model text NOT NULL,
+  dimensions int NOT NULL,
+  payload jsonb,
+  embedding vector NOT NULL
+);
+
+CREATE UNIQUE INDEX pgvector_point_embedding_idx ON pgvector_point (vector_id, embedding_id);
+CREATE INDEX pgvector_point_vfile_idx ON pgvector_point (vector_id, vfile_id);
+
+CREATE TRIGGER set_timestamp_update
+  BEFORE UPDATE ON pgvector_point
+  FOR EACH ROW
+  EXECUTE PROCEDURE trigger_set_timestamp();
+
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP TABLE pgvector_point;
+-- +goose StatementEnd
@@ -0,0 +1,9 @@
+-- +goose Up
+-- +goose StatementBegin
+CREATE INDEX IF NOT EXISTS pgvector_point_metadata_idx ON pgvector_point USING gin ((payload -> 'metadata') jsonb_path_ops);
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP INDEX IF EXISTS pgvector_point_metadata_idx;
+-- +goose StatementEnd
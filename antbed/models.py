@@ -1,3 +1,5 @@
+import base64
+import binascii
 import datetime
 import hashlib
 import hmac
@@ -14,6 +16,7 @@ from antbed.db.models import (
     EmbeddingSchema,
     VectorSchema,
     VectorVFileSchema,
+    VFile,
     VFileCollectionSchema,
     VFileSchema,
     VFileSplitSchema,
@@ -56,9 +59,14 @@ class EmbeddingModel(StrEnum):
 class ManagerEnum(StrEnum):
     OPENAI = "openai"
     QDRANT = "qdrant"
+    PGVECTOR = "pgvector"
     NONE = "none"
 
 
+# Native vector size of the embedding models; text-embedding-3 vectors can be shortened with `dimensions`
+MODEL_DIMENSIONS = {"text-embedding-3-large": 3072, "text-embedding-3-small": 1536, "text-embedding-ada-002": 1536}
+
+
 class SplitterConfig(BaseModel):
     chunk_size: int = Field(default=800, title="Chunk Size", description="The size of the chunk to split the text into")
     chunk_overlap_perc: int = Field(
@@ -74,18 +82,36 @@ class SplitterConfig(BaseModel):
     model: str = Field(
         default="text-embedding-3-large", title="Embedding Model", description="The model to use for embeddings"
     )
+    dimensions: int | None = Field(
+        default=None,
+        title="Dimensions",
+        description="Shorten the vectors to this size (text-embedding-3 models), None keeps the model's size",
+    )
+
+    parallel_threshold: int | None = Field(
+        default=None,
+        title="Parallel Threshold",
+        description="Texts of more characters are split in partitions across a process pool, None splits serially",
+    )
+
+    # Fields added after splits were stored: left out of the hash while unset, so existing splits still match
+    hash_optional: ClassVar[set[str]] = {"dimensions"}
+    # Fields that change how the text is split, not the chunks: never part of the hash
+    hash_exclude: ClassVar[set[str]] = {"parallel_threshold"}
 
     def overlap(self):
         return self.chunk_size * self.chunk_overlap_perc // 100
 
     def config_hash(self) -> str:
-        return hashlib.sha256(json.dumps(self.model_dump(), sort_keys=True).encode()).hexdigest()
+        exclude = {name for name in self.hash_optional if getattr(self, name) is None} | self.hash_exclude
+        return hashlib.sha256(json.dumps(self.model_dump(exclude=exclude), sort_keys=True).encode()).hexdigest()
 
     def name(self) -> str:
         model_name = self.model.replace("-", "_").replace(".", "_")
-        return (
-            f"{self.splitter_type.value}_{model_name}_c{self.chunk_size}_o{self.overlap()}_t{self.token_splitter}"
-        ).lower()
+        name = f"{self.splitter_type.value}_{model_name}_c{self.chunk_size}_o{self.overlap()}_t{self.token_splitter}"
+        if self.dimensions:
+            name += f"_d{self.dimensions}"
+        return name.lower()
 
 
 class SplitDocument(BaseModel):
@@ -151,6 +177,9 @@ class EmbeddingWorkflowInput(BaseModel):
     subject_id: str | None = Field(default=None)
     subject_type: str | None = Field(default=None)
     config: SplitterConfig = Field(default_factory=SplitterConfig)
+    batch_size: int = Field(
+        default=128, ge=0, description="Chunks embedded per activity, 0 starts one activity per chunk"
+    )
 
     @model_validator(mode="after")
     def check(self) -> Self:
@@ -161,7 +190,24 @@ class EmbeddingWorkflowInput(BaseModel):
 
 class EmbeddingRequest(BaseModel):
     embedding_id: uuid.UUID = Field(...)
+    vfile_id: uuid.UUID | None = Field(default=None, description="Document of the chunk, the embedding partition key")
     status: str = Field(default="")
+    embedding_provider: str | None = Field(default=None)
+    config: SplitterConfig | None = Field(default=None, description="Config of the split, selecting its embedder")
+
+
+class EmbeddingBatchRequest(BaseModel):
+    vfile_split_id: uuid.UUID = Field(...)
+    vfile_id: uuid.UUID | None = Field(default=None, description="Document of the split, the embedding partition key")
+    embedding_ids: list[uuid.UUID] = Field(default_factory=list, description="Embed these chunks of the split")
+    part_start: int | None = Field(default=None, description="First part number of the range to embed")
+    part_stop: int | None = Field(default=None, description="Part number (excluded) ending the range to embed")
+    embedding_provider: str | None = Field(default=None)
+
+
+class EmbeddingBatchResponse(BaseModel):
+    vfile_split_id: uuid.UUID = Field(...)
+    embeddings: list[EmbeddingRequest] = Field(default_factory=list)
 
 
 class Job(BaseModel):
@@ -244,10 +290,11 @@ class SearchRecord(BaseModel):
     id: str | None = Field(default=None)
     vfile_id: str | uuid.UUID | None = Field(default=None)
     chunk_id: str | uuid.UUID | None = Field(default=None)
+    score: float | None = Field(default=None)
     payload: dict[str, Any] = Field(default_factory=dict)
 
     @classmethod
-    def from_vfile(cls, vfile: VFileSchema):
+    def from_vfile(cls, vfile: VFileSchema | VFile):
         payload = {
             "subject_id": vfile.subject_id,
             "subject_type": vfile.subject_type,
@@ -266,6 +313,23 @@ class OrderEnum(StrEnum):
     DESC = "desc"
 
 
+class ScrollCursor(BaseModel):
+    """Position after the last returned document, in the scroll order (source_created_at, id)"""
+
+    created_at: datetime.datetime | None = Field(default=None)
+    id: uuid.UUID
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> Self:
+        try:
+            return cls.model_validate_json(base64.urlsafe_b64decode(token.encode()))
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid cursor: {token}") from e
+
+
 class DocsQuery(BaseModel):
     limit: int = Field(100, description="The limit of the search results")
     mode: WithContentMode = Field(
@@ -284,6 +348,10 @@ class DocsQuery(BaseModel):
     filters: dict[str, Any] | None = Field(default=None)
     order: OrderEnum | None = Field(default=OrderEnum.ASC, description="The order of the search results")
     summary_variant: str = Field("default", description="The summary variant to retrieve if mode is SUMMARY")  # Added
+    cursor: str | None = Field(default=None, description="Resume after this position, the next_cursor of a page")
+    stream: bool = Field(
+        default=False, description="Stream documents as they are read, NDJSON for json output (limit 0: no limit)"
+    )
 
 
 class SearchQuery(DocsQuery):
@@ -295,3 +363,4 @@ class SearchQuery(DocsQuery):
 class DocsResponse(BaseModel):
     docs: list[Content] = Field(default_factory=list)
     query: DocsQuery
+    next_cursor: str | None = Field(default=None, description="Cursor of the next page, None on the last one")
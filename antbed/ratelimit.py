@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections.abc import Mapping
+from functools import cache
+from typing import Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# rough tokens of a request body, the x-ratelimit-* headers correct the estimate
+BYTES_PER_TOKEN = 4
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Seconds of a `x-ratelimit-reset-*` value such as `20ms`, `1s` or `6m0s`"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously"""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available, requests larger than the bucket only wait for a full one"""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: float | None, remaining: float | None) -> None:
+        """Follow the provider's view: the quota is shared with other processes"""
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Requests and tokens per minute of one provider key, shared by the threads of a worker.
+
+    `reserve` takes from both buckets at once, or returns how long to wait before retrying.
+    The `x-ratelimit-*` headers of each response resize and drain the buckets, and a 429
+    pauses every caller until the provider's reset.
+    """
+
+    def __init__(self, name: str, rpm: int | None = None, tpm: int | None = None) -> None:
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = self.paused_until - now
+            for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_time(amount))
+            if wait > 0:
+                return wait
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until the request fits in the limits, returns the seconds waited"""
+        waited = 0.0
+        while (wait := self.reserve(tokens)) > 0:
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            logger.debug(f"Rate limiter {self.name} waited {waited:.2f}s")
+        return waited
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        waited = 0.0
+        while (wait := self.reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def update(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        def number(key: str) -> float | None:
+            value = headers.get(key)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self._lock:
+            now = time.monotonic()
+            for kind in ("requests", "tokens"):
+                limit = number(f"x-ratelimit-limit-{kind}")
+                if getattr(self, kind) is None and limit:
+                    # the provider enforces a limit that isn't configured, adopt it
+                    setattr(self, kind, TokenBucket(limit))
+                bucket: TokenBucket | None = getattr(self, kind)
+                if bucket is not None:
+                    bucket.refill(now)
+                    bucket.sync(limit, number(f"x-ratelimit-remaining-{kind}"))
+            if status_code == httpx.codes.TOO_MANY_REQUESTS:
+                resets = [parse_duration(headers.get(key)) for key in ("retry-after", "x-ratelimit-reset-requests")]
+                resets.append(parse_duration(headers.get("x-ratelimit-reset-tokens")))
+                pause = max([reset for reset in resets if reset is not None], default=1.0)
+                self.paused_until = max(self.paused_until, now + pause)
+                logger.warning(f"Rate limited by {self.name}, pausing requests for {pause:.2f}s")
+
+    @staticmethod
+    def estimate_tokens(request: httpx.Request) -> int:
+        return len(request.content) // BYTES_PER_TOKEN
+
+    def http_hooks(self) -> dict[str, list[Any]]:
+        """httpx event hooks running every request through the limiter"""
+
+        def on_request(request: httpx.Request) -> None:
+            self.acquire(self.estimate_tokens(request))
+
+        def on_response(response: httpx.Response) -> None:
+            self.update(response.headers, response.status_code)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def async_http_hooks(self) -> dict[str, list[Any]]:
+        async def on_request(request: httpx.Request) -> None:
+            await self.aacquire(self.estimate_tokens(request))
+
+        async def on_response(response: httpx.Response) -> None:
+            self.update(response.headers, response.status_code)
+
+        return {"request": [on_request], "response": [on_response]}
+
+
+@cache
+def rate_limiter(name: str, rpm: int | None = None, tpm: int | None = None) -> RateLimiter:
+    """Process-wide limiter of a provider key"""
+    return RateLimiter(name, rpm=rpm, tpm=tpm)
@@ -0,0 +1,65 @@
+"""Process-wide instances of splitters, embedders and vector managers.
+
+Building them resolves tiktoken encoders, langchain splitters and provider clients, which
+activities used to pay on every call. Instances are keyed by the whole `SplitterConfig`
+(its `config_hash()` leaves out fields like `parallel_threshold`) and provider, and kept in
+bounded LRUs; they hold no per-request state.
+"""
+
+from collections.abc import Callable, Hashable
+
+from antbed.embedding import VFileEmbedding
+from antbed.lru import LRUCache
+from antbed.models import ManagerEnum, SplitterConfig
+from antbed.splitdoc import Splitter
+from antbed.vectordb.manager import VectorManager
+
+REGISTRY_SIZE = 32
+
+_splitters: LRUCache[str, Splitter] = LRUCache(REGISTRY_SIZE)
+_embedders: LRUCache[tuple[str, str | None], VFileEmbedding] = LRUCache(REGISTRY_SIZE)
+_managers: LRUCache[tuple[str, str, str | None], VectorManager] = LRUCache(REGISTRY_SIZE)
+
+
+def _get_or_create[K: Hashable, V](lru: LRUCache[K, V], key: K, factory: Callable[[], V]) -> V:
+    # a race builds the instance twice and keeps the last one, which is harmless
+    value = lru.get(key)
+    if value is None:
+        value = factory()
+        lru.set(key, value)
+    return value
+
+
+def config_key(conf: SplitterConfig) -> str:
+    return conf.model_dump_json()
+
+
+def get_splitter(conf: SplitterConfig | None = None) -> Splitter:
+    conf = conf or SplitterConfig()
+    return _get_or_create(_splitters, config_key(conf), lambda: Splitter(conf))
+
+
+def get_embedder(conf: SplitterConfig | None = None, provider: str | None = None) -> VFileEmbedding:
+    conf = conf or SplitterConfig()
+    return _get_or_create(
+        _embedders, (config_key(conf), provider), lambda: VFileEmbedding(get_splitter(conf), provider=provider)
+    )
+
+
+def get_vector_manager(
+    conf: SplitterConfig | None = None, manager: ManagerEnum = ManagerEnum.NONE, provider: str | None = None
+) -> VectorManager:
+    conf = conf or SplitterConfig()
+    return _get_or_create(
+        _managers,
+        (config_key(conf), ManagerEnum(manager).value, provider),
+        lambda: VectorManager(
+            get_splitter(conf), manager=manager, embedding_provider=provider, embedder=get_embedder(conf, provider)
+        ),
+    )
+
+
+def clear_registry() -> None:
+    """Drop all instances, e.g. after the configuration changed"""
+    for lru in (_splitters, _embedders, _managers):
+        lru.clear()
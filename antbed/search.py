@@ -1,39 +1,225 @@
+import asyncio
 import json
 import logging
-from collections.abc import Sequence
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from functools import cache
 from typing import Any
 
 import sentry_sdk as sentry
 import sqlalchemy as sa
 from openai import OpenAI
 
+from antbed.clients.embeddings import embedding_client
 from antbed.clients.llm import openai_client
-from antbed.db.models import VFile
-from antbed.models import Content, DocsQuery, SearchRecord, WithContentMode
-from antbed.store import antbeddb
+from antbed.config import config
+from antbed.db.models import Vector, VFile, VFileSplit
+from antbed.embedding import VFileEmbedding
+from antbed.embedding_cache import EmbeddingCache
+from antbed.models import Content, DocsQuery, ManagerEnum, OutputFormatEnum, SearchRecord, WithContentMode
+from antbed.store import antbeddb, antbeddb_async
+from antbed.vectordb.base import VectorDB
+from antbed.vectordb.pgvector import VectorPgvector
+from antbed.vectordb.qdrant import VectorQdrant
 
 logger = logging.getLogger(__name__)
 
+# (payload key, output name) of the metadata returned with each hit
+DEFAULT_KEYS = [
+    ("subject_id", "id"),
+    ("subject_type", "type"),
+    ("created_at", "date"),
+    ("filename", "name"),
+    ("source_url", "url"),
+    ("language", "language"),
+    ("keywords", "keywords"),
+    #               ("source", "src"),
+    ("score", "score"),
+    # ("file_id", "id"),
+    # ("vfile_id", "id"),
+    #
+    ("content_type", "mime"),
+    ("metadata", "metadata"),
+    ("title", "title"),
+    ("description", "description"),
+    ("summary_variant", "summary_variant"),
+    #                ("chunk_id", "chunk_id"),
+    #                ("vector_id", "collection"),
+]
+
+
+@cache
+def query_cache() -> EmbeddingCache:
+    """Vectors of recent search queries, kept in memory only"""
+    return EmbeddingCache(lru_size=config().embeddings.cache.lru_size, persist=False)
+
 
 class SearchManager:
     def __init__(self, oclient: OpenAI | None = None) -> None:
         # Initialize the search
         self.openai_client = oclient if oclient else openai_client()
+        self.managers: dict[ManagerEnum, VectorDB] = {}
+
+    def vectordb(self, manager: ManagerEnum) -> VectorDB:
+        if manager not in self.managers:
+            if manager == ManagerEnum.QDRANT:
+                self.managers[manager] = VectorQdrant(None)
+            elif manager == ManagerEnum.PGVECTOR:
+                self.managers[manager] = VectorPgvector()
+            else:
+                raise ValueError(f"Search is not supported with manager {manager}")
+        return self.managers[manager]
+
+    def embed_query(
+        self, query: str, model: str, provider: str | None = None, dimensions: int | None = None
+    ) -> list[float]:
+        client = embedding_client(provider)
+        return query_cache().embed(
+            [query],
+            model,
+            lambda texts: client.embed(texts, model, dimensions=dimensions),
+            dimensions,
+            provider=config().embeddings.get_provider(provider).name,
+        )[0]
+
+    def search(
+        self,
+        collection_name: str,
+        query: str,
+        filters: dict[str, Any] | None = None,
+        limit: int = 40,
+        *,
+        vectordb: ManagerEnum | None = None,
+        session: sa.orm.Session | None = None,
+    ) -> list[SearchRecord]:
+        """Embed `query` like the vector's documents were, and return the nearest chunks"""
+        db = antbeddb()
+        if vectordb == ManagerEnum.NONE:
+            vectordb = None
+        vector = db.get_vector_by_name(collection_name, external_provider=vectordb, session=session)
+        if vector is None:
+            raise ValueError(f"Vector {collection_name} not found")
+        split = db.get_vector_split(vector.id, session=session)
+        manager, model, provider, dimensions = self.search_target(vector, split, vectordb)
+
+        start = time.perf_counter()
+        qvector = self.embed_query(query, model, provider, dimensions)
+        embedded = time.perf_counter()
+        records = manager.search(vector, qvector, model=model, limit=limit, filters=filters, session=session)
+        self.log_search(collection_name, manager, records, start, embedded)
+        return records
+
+    async def asearch(
+        self,
+        collection_name: str,
+        query: str,
+        filters: dict[str, Any] | None = None,
+        limit: int = 40,
+        *,
+        vectordb: ManagerEnum | None = None,
+    ) -> list[SearchRecord]:
+        """`search` on the AsyncEngine; the query is embedded in a worker thread"""
+        adb = antbeddb_async()
+        if vectordb == ManagerEnum.NONE:
+            vectordb = None
+        async with adb.new_session() as session:
+            vector = await adb.get_vector_by_name(collection_name, external_provider=vectordb, session=session)
+            if vector is None:
+                raise ValueError(f"Vector {collection_name} not found")
+            split = await adb.get_vector_split(vector.id, session=session)
+        manager, model, provider, dimensions = self.search_target(vector, split, vectordb)
+
+        start = time.perf_counter()
+        qvector = await asyncio.to_thread(self.embed_query, query, model, provider, dimensions)
+        embedded = time.perf_counter()
+        records = await manager.asearch(vector, qvector, model=model, limit=limit, filters=filters)
+        self.log_search(collection_name, manager, records, start, embedded)
+        return records
+
+    def search_target(
+        self, vector: Vector, split: VFileSplit | None, vectordb: ManagerEnum | None
+    ) -> tuple[VectorDB, str, str | None, int | None]:
+        """The store to search, and the model, provider and dimensions the vector was embedded with"""
+        manager = self.vectordb(vectordb or ManagerEnum(vector.external_provider))
+        provider = split.info.get("splitter", {}).get("embedding_provider") if split is not None else None
+        dimensions = VFileEmbedding.split_dimensions(split)
+        model = split.model if split is not None and split.model else None
+        model = model or config().embeddings.get_provider(provider).default_model
+        return manager, model, provider, dimensions
+
+    @staticmethod
+    def log_search(
+        collection_name: str, manager: VectorDB, records: list[SearchRecord], start: float, embedded: float
+    ) -> None:
+        logger.info(
+            f"Search {collection_name}: {len(records)} hits, embed {1000 * (embedded - start):.0f}ms, "
+            f"{manager.manager_name} {1000 * (time.perf_counter() - embedded):.0f}ms"
+        )
 
     def get_all(self, query: DocsQuery, session: sa.orm.Session | None = None) -> list[VFile]:
         return antbeddb().scroll(query, session=session)
         # return [SearchRecord.from_vfile(vfile.to_pydantic()) for vfile in vfiles]
 
+    async def aget_all(self, query: DocsQuery) -> list[VFile]:
+        return await antbeddb_async().scroll(query)
+
+    def stream_all(
+        self, query: DocsQuery, batch_size: int = 500, session: sa.orm.Session | None = None
+    ) -> Iterator[str]:
+        """Scroll `query` in batches: one JSON line per document, or one markdown section per batch"""
+        for batch in antbeddb().scroll_iter(query, batch_size=batch_size, session=session):
+            if query.output == OutputFormatEnum.MARKDOWN:
+                yield self.hits_to_markdown(
+                    batch, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+                )
+                continue
+            for content in self.hits_to_model(
+                batch, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+            ):
+                yield self.json_line(content)
+
+    async def astream_all(self, query: DocsQuery, batch_size: int = 500) -> AsyncIterator[str]:
+        """`stream_all` through a server-side cursor of the AsyncEngine"""
+        async for batch in antbeddb_async().scroll_iter(query, batch_size=batch_size):
+            if query.output == OutputFormatEnum.MARKDOWN:
+                yield await self.ahits_to_markdown(
+                    batch, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+                )
+                continue
+            for content in await self.ahits_to_model(
+                batch, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+            ):
+                yield self.json_line(content)
+
+    @staticmethod
+    def json_line(content: Content) -> str:
+        return json.dumps(content.model_dump(exclude_none=True, exclude={"mode"}, by_alias=True), default=str) + "\n"
+
     def hits_to_markdown(
         self,
-        records: list[VFile],
+        records: Sequence[VFile | SearchRecord],
         keys: Sequence[tuple[str, str]] | None = None,
         with_content: WithContentMode = WithContentMode.SUMMARY,
         summary_variant: str = "default",  # Added
     ) -> str:
         antbeddb().check()
-        res = []
         data = self.hits_to_model(records, keys, with_content, summary_variant=summary_variant)  # Pass summary_variant
+        return self.render_markdown(data)
+
+    async def ahits_to_markdown(
+        self,
+        records: Sequence[VFile | SearchRecord],
+        keys: Sequence[tuple[str, str]] | None = None,
+        with_content: WithContentMode = WithContentMode.SUMMARY,
+        summary_variant: str = "default",
+    ) -> str:
+        return self.render_markdown(
+            await self.ahits_to_model(records, keys, with_content, summary_variant=summary_variant)
+        )
+
+    @staticmethod
+    def render_markdown(data: list[Content]) -> str:
+        res = []
         for hit in data:
             res.append("\n\n -----\n\n")
             res.append("\n## Metadata\n\n")
@@ -53,7 +239,7 @@ class SearchManager:
 
     def hits_to_dict(
         self,
-        records: list[VFile],
+        records: Sequence[VFile | SearchRecord],
         keys: Sequence | None = None,
         with_content: WithContentMode = WithContentMode.SUMMARY,
     ) -> list[dict[str, Any]]:
@@ -62,7 +248,7 @@ class SearchManager:
 
     def hits_to_json(
         self,
-        records: list[VFile],
+        records: Sequence[VFile | SearchRecord],
         keys: Sequence | None = None,
         with_content: WithContentMode = WithContentMode.SUMMARY,
     ) -> str:
@@ -70,55 +256,65 @@ class SearchManager:
 
     def hits_to_model(
         self,
-        records: list[VFile],
+        records: Sequence[VFile | SearchRecord],
         keys: Sequence | None = None,
         with_content: WithContentMode = WithContentMode.SUMMARY,
         summary_variant: str = "default",
     ) -> list[Content]:
-        res = []
         antbeddb().check()
-        if keys is None:
-            keys = [
-                ("subject_id", "id"),
-                ("subject_type", "type"),
-                ("created_at", "date"),
-                ("filename", "name"),
-                ("source_url", "url"),
-                ("language", "language"),
-                ("keywords", "keywords"),
-                #               ("source", "src"),
-                #                 ("score", "score"),
-                # ("file_id", "id"),
-                # ("vfile_id", "id"),
-                #
-                ("content_type", "mime"),
-                ("metadata", "metadata"),
-                ("title", "title"),
-                ("description", "description"),
-                ("summary_variant", "summary_variant"),
-                #                ("chunk_id", "chunk_id"),
-                #                ("vector_id", "collection"),
-            ]
-        key_set = set([name for _, name in keys])
+        keys = keys if keys is not None else DEFAULT_KEYS
+        key_set = {name for _, name in keys}
+        payloads = self.payloads(records)
+        contents = antbeddb().get_contents(
+            records, with_content, metadata=payloads, keys=key_set, summary_variant=summary_variant
+        )
+        return self.select_metadata(records, keys, payloads, contents)
 
+    async def ahits_to_model(
+        self,
+        records: Sequence[VFile | SearchRecord],
+        keys: Sequence | None = None,
+        with_content: WithContentMode = WithContentMode.SUMMARY,
+        summary_variant: str = "default",
+    ) -> list[Content]:
+        """`hits_to_model` with the contents hydrated on the AsyncEngine"""
+        keys = keys if keys is not None else DEFAULT_KEYS
+        key_set = {name for _, name in keys}
+        payloads = self.payloads(records)
+        contents = await antbeddb_async().get_contents(
+            records, with_content, metadata=payloads, keys=key_set, summary_variant=summary_variant
+        )
+        return self.select_metadata(records, keys, payloads, contents)
+
+    @staticmethod
+    def payloads(records: Sequence[VFile | SearchRecord]) -> list[dict[str, Any]]:
+        payloads = []
         for hit in records:
-            payload = SearchRecord.from_vfile(hit.to_pydantic()).payload
-            if payload is None:
-                payload = {}
+            if isinstance(hit, SearchRecord):
+                payload = dict(hit.payload)
+                if hit.score is not None:
+                    payload["score"] = hit.score
+            else:
+                payload = SearchRecord.from_vfile(hit).payload
+            payloads.append(payload if payload is not None else {})
+        return payloads
 
-            data = payload
-            try:
-                searchhit = antbeddb().get_content(
-                    with_content,
-                    vfile=hit,
-                    metadata=data,
-                    keys=key_set,
-                    summary_variant=summary_variant,
-                )
-            except ValueError as e:
-                logger.error(f"Error: {e}")
-                sentry.capture_exception(e)
+    @staticmethod
+    def select_metadata(
+        records: Sequence[VFile | SearchRecord],
+        keys: Sequence,
+        payloads: list[dict[str, Any]],
+        contents: list[Content | None],
+    ) -> list[Content]:
+        """Drop the hits without content, and keep the metadata named by `keys`"""
+        key_set = {name for _, name in keys}
+        res = []
+        for hit, payload, searchhit in zip(records, payloads, contents, strict=True):
+            if searchhit is None:
+                logger.error(f"Error: no content for {hit.id}")
+                sentry.capture_message(f"No content for search hit {hit.id}")
                 continue
+            data = payload
             if len(keys) > 0:
                 metadata = {name: payload.get(key, "") for key, name in keys if payload.get(key)}
                 data = {key: value for key, value in metadata.items() if key in key_set}
@@ -5,11 +5,11 @@ import logging
 
 from fastapi import APIRouter
 from fastapi.exceptions import HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from antbed.models import DocsQuery, DocsResponse, OutputFormatEnum, SearchQuery
+from antbed.models import DocsQuery, DocsResponse, OutputFormatEnum, ScrollCursor, SearchQuery
 from antbed.search import SearchManager
-from antbed.store import antbeddb
+from antbed.store import DB
 
 router = APIRouter()
 
@@ -40,20 +40,32 @@ router = APIRouter(prefix="/api/v1/docs", tags=["antbed", "search", "callback"])
         },
     },
 )
-def search(query: SearchQuery):
+async def search(query: SearchQuery):
     sm = SearchManager()
-    # Assuming sm.search() doesn't need summary_variant directly, but hits_to_model/markdown does
-    records = sm.search(  # This part might need adjustment if sm.search itself needs summary_variant for some reason
-        collection_name=query.collection_name, query=query.query, filters=query.filters, limit=query.limit
-    )
+    if query.collection_name is None:
+        raise HTTPException(status_code=400, detail="collection_name is required")
+    try:
+        records = await sm.asearch(
+            collection_name=query.collection_name,
+            query=query.query,
+            filters=query.filters,
+            limit=query.limit,
+            vectordb=query.vectordb,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
     if query.output == OutputFormatEnum.MARKDOWN:
         return PlainTextResponse(
-            sm.hits_to_markdown(records, query.keys, with_content=query.mode, summary_variant=query.summary_variant)
+            await sm.ahits_to_markdown(
+                records, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+            )
         )
 
     if query.output == OutputFormatEnum.JSON:
         return DocsResponse(
-            docs=sm.hits_to_model(records, query.keys, with_content=query.mode, summary_variant=query.summary_variant),
+            docs=await sm.ahits_to_model(
+                records, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+            ),
             query=query,
         )
     raise HTTPException(status_code=400, detail="output not supported")
@@ -75,27 +87,39 @@ def search(query: SearchQuery):
             ),
             "content": {
                 "text/plain": {"description": "Return all content for a given vector as markdown."},
+                "application/x-ndjson": {"description": "With stream, one JSON document per line."},
             },
         },
     },
 )
-def scroll(query: DocsQuery):
+async def scroll(query: DocsQuery):
     sm = SearchManager()
-    antbeddb().check()
-    with antbeddb().new_session() as session:
-        print(query.model_dump())
-        records = sm.get_all(query, session=session)
-        logger.info("generating TOC: %s", query.output)
-        if query.output == OutputFormatEnum.MARKDOWN:
-            return PlainTextResponse(
-                sm.hits_to_markdown(records, query.keys, with_content=query.mode, summary_variant=query.summary_variant)
-            )
-        if query.output == OutputFormatEnum.JSON:
-            return DocsResponse(
-                docs=sm.hits_to_model(
-                    records, query.keys, with_content=query.mode, summary_variant=query.summary_variant
-                ),
-                query=query,
+    if query.cursor:
+        try:
+            ScrollCursor.decode(query.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+    if query.stream:
+        if query.output not in (OutputFormatEnum.MARKDOWN, OutputFormatEnum.JSON):
+            raise HTTPException(status_code=400, detail="output not supported")
+        media_type = "text/markdown" if query.output == OutputFormatEnum.MARKDOWN else "application/x-ndjson"
+        # the response outlives the endpoint, the generator holds its own session
+        return StreamingResponse(sm.astream_all(query), media_type=media_type)
+    records = await sm.aget_all(query)
+    logger.info("generating TOC: %s", query.output)
+    if query.output == OutputFormatEnum.MARKDOWN:
+        return PlainTextResponse(
+            await sm.ahits_to_markdown(
+                records, query.keys, with_content=query.mode, summary_variant=query.summary_variant
             )
+        )
+    if query.output == OutputFormatEnum.JSON:
+        return DocsResponse(
+            docs=await sm.ahits_to_model(
+                records, query.keys, with_content=query.mode, summary_variant=query.summary_variant
+            ),
+            query=query,
+            next_cursor=DB.next_cursor(query, records),
+        )
 
     raise HTTPException(status_code=400, detail="output not supported")
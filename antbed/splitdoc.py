@@ -1,4 +1,11 @@
-import tiktoken
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import cache
+from itertools import islice, pairwise, repeat
+
 from langchain_text_splitters import (
     CharacterTextSplitter,
     NLTKTextSplitter,
@@ -7,8 +14,261 @@ from langchain_text_splitters import (
     TextSplitter,
 )
 
+from antbed.encoders import encoder
 from antbed.models import SplitDocument, SplitterConfig, SplitterType
 
+# characters buffered by split_iter before splitting
+SPLIT_WINDOW = 1 << 20
+# smallest partition split_parallel hands to a worker
+PARTITION_MIN = 1 << 16
+# langchain's defaults of RecursiveCharacterTextSplitter and CharacterTextSplitter
+RECURSIVE_SEPARATORS = ("\n\n", "\n", " ", "")
+CHAR_SEPARATOR = "\n\n"
+PARAGRAPH_SEPARATOR = "\n\n"
+
+# (start, stop, length) of a piece of the text
+type Piece = tuple[int, int, int]
+# content of a chunk and its offset, None if it isn't a slice of the text
+type Chunk = tuple[str, int | None]
+# a run of pieces to merge, or the chunks of a piece split further; the other list is empty
+type Segment = tuple[list[Piece], list[Chunk]]
+
+
+class SpanSplitter:
+    """langchain's recursive and character splitting, done on offsets into the text.
+
+    Chunks are the same as `create_documents` gives, but pieces are (start, stop) spans
+    instead of string copies: each chunk's offset is known instead of searched for again,
+    and each piece is measured once instead of once per pass.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        length_function: Callable[[str], int] = len,
+        *,
+        recursive: bool = True,
+    ) -> None:
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+        if not 0 <= chunk_overlap <= chunk_size:
+            raise ValueError(f"chunk_overlap must be between 0 and chunk_size, got {chunk_overlap}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length = length_function
+        # the recursive splitter keeps separators at the start of the pieces, the character one drops them
+        self.recursive = recursive
+
+    def pieces(self, text: str, start: int, stop: int, separator: str) -> list[tuple[int, int]]:
+        """Non-empty spans of text[start:stop] cut at `separator`"""
+        if not separator:
+            return [(i, i + 1) for i in range(start, stop)]
+        cuts = []
+        pos = text.find(separator, start, stop)
+        while pos != -1:
+            cuts.append(pos)
+            pos = text.find(separator, pos + len(separator), stop)
+        skip = 0 if self.recursive else len(separator)
+        bounds = [start, *cuts]
+        ends = [*cuts, stop]
+        spans = [(bounds[0], ends[0])] + [(cut + skip, end) for cut, end in zip(cuts, ends[1:], strict=True)]
+        return [(a, b) for a, b in spans if b > a]
+
+    def join(self, text: str, current: deque[Piece], separator: str) -> Chunk | None:
+        """Stripped chunk of the pieces and its offset, None as offset if it isn't a slice of the text"""
+        start, stop = current[0][0], current[-1][1]
+        # merged pieces are adjacent, unless the character splitter dropped empty ones between them
+        contiguous = not separator or all(
+            prev[1] + len(separator) == nxt[0] for prev, nxt in zip(current, islice(current, 1, None), strict=False)
+        )
+        raw = text[start:stop] if contiguous else separator.join(text[a:b] for a, b, _ in current)
+        content = raw.strip()
+        if not content:
+            return None
+        return content, (start + len(raw) - len(raw.lstrip())) if contiguous else None
+
+    def merge_pieces(self, text: str, pieces: list[Piece], separator: str) -> tuple[list[Chunk], list[Piece]]:
+        """`TextSplitter._merge_splits` up to its last chunk: the chunks and the pieces of the unfinished one.
+
+        The chunks only depend on the pieces before them, and merging the unfinished pieces
+        followed by more pieces cuts the same chunks as merging all the pieces at once.
+        """
+        sep_len = self.length(separator)
+        chunks = []
+        current: deque[Piece] = deque()
+        total = 0
+        for piece in pieces:
+            size = piece[2]
+            if current and total + size + sep_len > self.chunk_size:
+                chunk = self.join(text, current, separator)
+                if chunk is not None:
+                    chunks.append(chunk)
+                while total > self.chunk_overlap or (
+                    total > 0 and total + size + (sep_len if current else 0) > self.chunk_size
+                ):
+                    total -= current.popleft()[2] + (sep_len if len(current) > 0 else 0)
+            current.append(piece)
+            total += size + (sep_len if len(current) > 1 else 0)
+        return chunks, list(current)
+
+    def merge(self, text: str, pieces: list[Piece], separator: str) -> list[Chunk]:
+        """`TextSplitter._merge_splits`: pack pieces up to chunk_size, keeping up to chunk_overlap of the tail"""
+        chunks, rest = self.merge_pieces(text, pieces, separator)
+        if rest:
+            chunk = self.join(text, deque(rest), separator)
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
+
+    @property
+    def merge_separator(self) -> str:
+        return "" if self.recursive else CHAR_SEPARATOR
+
+    @staticmethod
+    def separators(text: str, start: int, stop: int, separators: tuple[str, ...]) -> tuple[str, tuple[str, ...]]:
+        """The first separator found in text[start:stop], and the ones to try on its too long pieces"""
+        for i, sep in enumerate(separators):
+            if not sep:
+                return sep, ()
+            if text.find(sep, start, stop) != -1:
+                return sep, separators[i + 1 :]
+        return separators[-1], ()
+
+    def top_level(self, text: str) -> tuple[str, tuple[str, ...]]:
+        """Separator cutting the whole text, and the ones to try on its too long pieces"""
+        if not self.recursive:
+            return CHAR_SEPARATOR, ()
+        return self.separators(text, 0, len(text), RECURSIVE_SEPARATORS)
+
+    def segments(self, text: str, start: int, stop: int, separator: str, rest: tuple[str, ...]) -> list[Segment]:
+        """text[start:stop] cut at `separator`: runs of pieces to merge, and chunks of the pieces split further.
+
+        Runs are merged on their own and pieces too long for a chunk are split on their own, so the
+        segments of the text between two cuts are the same as within the segments of the whole text,
+        except that runs on both sides of a cut belong together.
+        """
+        if not self.recursive:
+            return [([(a, b, self.length(text[a:b])) for a, b in self.pieces(text, start, stop, separator)], [])]
+        segments: list[Segment] = []
+        good: list[Piece] = []
+        for a, b in self.pieces(text, start, stop, separator):
+            size = self.length(text[a:b])
+            if size < self.chunk_size:
+                good.append((a, b, size))
+                continue
+            if good:
+                segments.append((good, []))
+                good = []
+            chunks: list[Chunk] = []
+            if rest:
+                self.split_recursive(text, a, b, rest, chunks)
+            else:
+                chunks.append((text[a:b], a))
+            segments.append(([], chunks))
+        if good:
+            segments.append((good, []))
+        return segments
+
+    @staticmethod
+    def extend_segments(segments: list[Segment], more: list[Segment]) -> None:
+        """Append the segments of the text after a cut, joining the runs that meet at the cut"""
+        if segments and more and segments[-1][0] and more[0][0]:
+            segments[-1] = (segments[-1][0] + more[0][0], [])
+            more = more[1:]
+        segments.extend(more)
+
+    def merge_segments(self, text: str, segments: list[Segment]) -> list[Chunk]:
+        chunks: list[Chunk] = []
+        for pieces, split in segments:
+            chunks.extend(self.merge(text, pieces, self.merge_separator) if pieces else split)
+        return chunks
+
+    def split_recursive(self, text: str, start: int, stop: int, separators: tuple[str, ...], out: list[Chunk]) -> None:
+        """`RecursiveCharacterTextSplitter._split_text` on text[start:stop]"""
+        separator, rest = self.separators(text, start, stop, separators)
+        out.extend(self.merge_segments(text, self.segments(text, start, stop, separator, rest)))
+
+    @staticmethod
+    def documents(chunks: Iterable[Chunk], base: int = 0) -> list[SplitDocument]:
+        """Chunks at their offset plus `base`; chunks that aren't a slice of the text, joined across
+        pieces the character splitter dropped, start at -1"""
+        return [
+            SplitDocument(
+                start=base + offset if offset is not None else -1,
+                stop=(base + offset if offset is not None else -1) + len(content),
+                content=content,
+            )
+            for content, offset in chunks
+        ]
+
+    def split(self, text: str) -> list[SplitDocument]:
+        separator, rest = self.top_level(text)
+        return self.documents(self.merge_segments(text, self.segments(text, 0, len(text), separator, rest)))
+
+    def split_iter(self, pages: Iterable[str], window: int = SPLIT_WINDOW) -> Iterator[SplitDocument]:
+        """`split` of the pages joined by newlines, a window of about `window` characters at a time.
+
+        A window is split up to its last cut at the top-level separator. The chunks of the run of
+        pieces crossing the cut are emitted up to the unfinished one, whose pieces are merged again
+        with the next window. The recursive splitter's top-level separator is only known once the
+        text has a paragraph break; until then, and for texts without one, the pages are buffered.
+        """
+        separator: str | None = CHAR_SEPARATOR if not self.recursive else None
+        rest: tuple[str, ...] = ()
+        buffer = ""
+        pending: list[str] = []
+        pending_size = 0
+        base = 0  # offset of the buffer in the whole text
+        start = 0  # offset in the buffer of the text not cut into segments yet, a cut
+        held: list[Piece] = []  # pieces of the unfinished chunk, before `start`
+        for i, page in enumerate(pages):
+            pending.append(f"\n{page}" if i else page)
+            pending_size += len(pending[-1])
+            if len(buffer) - start + pending_size < window:
+                continue
+            buffer += "".join(pending)
+            pending, pending_size = [], 0
+            if separator is None:
+                if PARAGRAPH_SEPARATOR not in buffer:
+                    continue
+                separator, rest = self.top_level(buffer)
+            cut = self.last_cut(buffer, start, separator)
+            if cut is None:
+                continue
+            segments: list[Segment] = [(held, [])] if held else []
+            self.extend_segments(segments, self.segments(buffer, start, cut, separator, rest))
+            chunks: list[Chunk] = []
+            if segments[-1][0]:
+                chunks, held = self.merge_pieces(buffer, segments.pop()[0], self.merge_separator)
+            else:
+                held = []
+            yield from self.documents(self.merge_segments(buffer, segments) + chunks, base)
+            keep = held[0][0] if held else cut
+            buffer = buffer[keep:]
+            base += keep
+            start = cut - keep
+            held = [(a - keep, b - keep, size) for a, b, size in held]
+        buffer += "".join(pending)
+        if separator is None:
+            separator, rest = self.top_level(buffer)
+        segments = [(held, [])] if held else []
+        self.extend_segments(segments, self.segments(buffer, start, len(buffer), separator, rest))
+        yield from self.documents(self.merge_segments(buffer, segments), base)
+
+    @staticmethod
+    def last_cut(text: str, start: int, separator: str) -> int | None:
+        """Offset of the last match of `separator` found by scanning the text for it, after `start`"""
+        if not separator:
+            return None
+        cut = text.rfind(separator, start + 1)
+        if cut < 0:
+            return None
+        # the scan matches the start of a run of the separator's character
+        while len(separator) > 1 and cut > start and text[cut - 1] == separator[0]:
+            cut -= 1
+        return cut if cut > start else None
+
 
 class Splitter:
     def __init__(self, config: SplitterConfig | None = None) -> None:
@@ -16,10 +276,31 @@ class Splitter:
             config = SplitterConfig()
         self.config = config
         self.text_splitter = self.new_splitter(self.config)
+        self.span_splitter = self.new_span_splitter(self.config)
+
+    @staticmethod
+    def new_span_splitter(config: SplitterConfig) -> SpanSplitter | None:
+        """Native splitter of the recursive and character types, None for the others"""
+        if config.splitter_type not in {SplitterType.RECURSIVE, SplitterType.CHAR}:
+            return None
+        length_function: Callable[[str], int] = len
+        if config.token_splitter:
+            enc = encoder(config.model)
+
+            # the length function of langchain's from_tiktoken_encoder
+            def length_function(text: str) -> int:
+                return len(enc.encode(text, allowed_special=set(), disallowed_special="all"))
+
+        return SpanSplitter(
+            config.chunk_size,
+            config.overlap(),
+            length_function,
+            recursive=config.splitter_type == SplitterType.RECURSIVE,
+        )
 
     @staticmethod
     def new_splitter(config: SplitterConfig) -> TextSplitter:
-        enc = tiktoken.encoding_for_model(config.model)
+        enc = encoder(config.model)
         split_cls = RecursiveCharacterTextSplitter
         if config.splitter_type == SplitterType.RECURSIVE:
             split_cls = RecursiveCharacterTextSplitter
@@ -45,6 +326,14 @@ class Splitter:
         return split_cls(chunk_size=config.chunk_size, chunk_overlap=config.overlap(), add_start_index=True)
 
     def split(self, text: str) -> list[SplitDocument]:
+        threshold = self.config.parallel_threshold
+        if threshold is not None and len(text) > threshold:
+            return self.split_parallel(text)
+        return self.split_serial(text)
+
+    def split_serial(self, text: str) -> list[SplitDocument]:
+        if self.span_splitter is not None:
+            return self.span_splitter.split(text)
         docs = self.text_splitter.create_documents([text])
         res = []
         for doc in docs:
@@ -52,3 +341,103 @@ class Splitter:
             stop = len(doc.page_content) + start
             res.append(SplitDocument(start=start, stop=stop, content=doc.page_content))
         return res
+
+    def split_iter(self, pages: Iterable[str], window: int = SPLIT_WINDOW) -> Iterator[SplitDocument]:
+        """Split pages joined by newlines as they come, with offsets into the whole text.
+
+        The chunks are those of `split` on the whole text. A list of pages longer than
+        `parallel_threshold` is joined and split by `split_parallel`; splitters other than the
+        recursive and character ones split the joined pages at once.
+        """
+        threshold = self.config.parallel_threshold
+        if threshold is not None and isinstance(pages, Sequence) and text_size(pages) > threshold:
+            yield from self.split_parallel("\n".join(pages))
+            return
+        if self.span_splitter is None:
+            yield from self.split_serial("\n".join(pages))
+            return
+        yield from self.span_splitter.split_iter(pages, window)
+
+    def split_parallel(
+        self, text: str, executor: Executor | None = None, parts: int | None = None
+    ) -> list[SplitDocument]:
+        """Split partitions of the text in worker processes, and merge their segments back together.
+
+        Partitions are cut where the serial split cuts the text at its top-level separator. Each
+        worker measures the pieces of its partition and splits the ones too long for a chunk; the
+        runs of pieces meeting at a cut are joined and merged here, so the chunks are the serial
+        split's. Texts too small for two partitions, and splitters other than the recursive and
+        character ones, are split serially.
+        """
+        span = self.span_splitter
+        if span is None:
+            return self.split_serial(text)
+        if parts is None:
+            parts = min(os.cpu_count() or 1, len(text) // PARTITION_MIN)
+        separator, rest = span.top_level(text)
+        bounds = partition_bounds(text, parts, separator)
+        if len(bounds) < 3:
+            return self.split_serial(text)
+        executor = executor or split_pool()
+        results = executor.map(
+            split_partition,
+            repeat(self.config.model_dump_json()),
+            [text[a:b] for a, b in pairwise(bounds)],
+            repeat(separator),
+            repeat(rest),
+        )
+        segments: list[Segment] = []
+        for base, part in zip(bounds, results, strict=False):
+            span.extend_segments(
+                segments,
+                [
+                    (
+                        [(base + a, base + b, size) for a, b, size in pieces],
+                        [(content, base + offset if offset is not None else None) for content, offset in split],
+                    )
+                    for pieces, split in part
+                ],
+            )
+        return span.documents(span.merge_segments(text, segments))
+
+
+def text_size(pages: Sequence[str]) -> int:
+    """Length of the pages joined by newlines"""
+    return sum(len(page) for page in pages) + max(len(pages) - 1, 0)
+
+
+def partition_bounds(text: str, parts: int, separator: str = PARAGRAPH_SEPARATOR) -> list[int]:
+    """Offsets cutting the text into about `parts` partitions, at matches of `separator` found by scanning the text"""
+    bounds = [0]
+    if separator:
+        size = -(-len(text) // max(parts, 1))
+        for target in range(size, len(text), size):
+            if target <= bounds[-1]:
+                continue
+            cut = text.find(separator, target)
+            # a match is only found by the scan at the start of a run of the separator's character
+            while cut > 0 and len(separator) > 1 and text[cut - 1] == separator[0]:
+                cut = text.find(separator, cut + 1)
+            if cut < 0:
+                break
+            bounds.append(cut)
+    bounds.append(len(text))
+    return bounds
+
+
+@cache
+def split_pool() -> ProcessPoolExecutor:
+    """Workers of `Splitter.split_parallel`, spawned rather than forked from a threaded process"""
+    return ProcessPoolExecutor(os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+
+@cache
+def partition_splitter(config_json: str) -> Splitter:
+    return Splitter(SplitterConfig.model_validate_json(config_json))
+
+
+def split_partition(config_json: str, text: str, separator: str, rest: tuple[str, ...]) -> list[Segment]:
+    """Worker of `Splitter.split_parallel`: the segments of one partition, cut at the whole text's separator"""
+    span = partition_splitter(config_json).span_splitter
+    assert span is not None
+    return span.segments(text, 0, len(text), separator, rest)
@@ -1,17 +1,27 @@
+import hashlib
 import logging
+import random
+import re
 import uuid
-from collections.abc import Sequence
+from collections import defaultdict
+from collections.abc import AsyncIterator, Container, Iterable, Iterator, Sequence
+from contextlib import asynccontextmanager, contextmanager
 from functools import cache
 from typing import Any, Literal
 
 from activealchemy.activerecord import Select
+from activealchemy.config import PostgreSQLConfigSchema
 from activealchemy.engine import ActiveEngine
-from sqlalchemy import and_, not_, or_, tuple_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import URL, Connection, Engine, Text, and_, inspect, literal, not_, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, selectinload, sessionmaker, undefer, undefer_group
+from sqlalchemy.sql.ddl import ExecutableDDLElement
 
 from .config import config
 from .db.models import (
     Base,
+    CachedEmbedding,
     Collection,
     Embedding,
     Summary,
@@ -22,15 +32,49 @@ from .db.models import (
     VFileSplit,
     VFileUpload,
 )
-from .models import Content, DocsQuery, SummaryOutputProtocol, WithContentMode
+from .models import Content, DocsQuery, ScrollCursor, SearchRecord, SummaryOutputProtocol, WithContentMode
+from .vector_codec import VectorEncodingEnum
 
 logger = logging.getLogger(__name__)
 
+# Content keys filled from the selected summary
+SUMMARY_KEYS = {"title", "description", "keywords", "language", "summary_variant"}
+# Filter spec keys that are operators rather than metadata equalities
+FILTER_OPERATORS = {"and", "or", "not", "exists", "not_exists"}
+
+
+class RoutingSession(Session):
+    """Reads go to a replica until the session writes, then every statement stays on the primary.
+
+    Flushes, DML and DDL are bound to the primary; from then on the session reads its own writes
+    instead of a replica that may lag behind. Anything else, including a `connection()` without
+    a statement, stays on the replica until then.
+    """
+
+    def __init__(self, replica: Engine, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.replica = replica
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or getattr(clause, "is_dml", False) or isinstance(clause, ExecutableDDLElement):
+            self.wrote = True
+        if not self.wrote:
+            return self.replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@cache
+def routing_factory(session_factory) -> sessionmaker[RoutingSession]:
+    """activealchemy's session factory, with its settings, building RoutingSessions"""
+    return sessionmaker(class_=RoutingSession, **getattr(session_factory, "kw", {}))
+
 
 class DB:
     def __init__(self) -> None:
-        self.models = [Base, Vector, VFile, VFileSplit, VFileUpload, Embedding, VectorVFile]
+        self.models = [Base, Vector, VFile, VFileSplit, VFileUpload, Embedding, VectorVFile, CachedEmbedding]
         self.engine = ActiveEngine(config().antbed.postgresql)
+        self.replicas: list[ActiveEngine] = []
         self.set_engine(Base)
 
         self.reconnect(dispose=False)
@@ -38,15 +82,50 @@ class DB:
     def reconnect(self, dispose: bool = True) -> None:
         if dispose:
             self.engine.dispose_engines()
+            for replica in self.replicas:
+                replica.dispose_engines()
         self.engine = ActiveEngine(config().antbed.postgresql)
+        self.replicas = [ActiveEngine(conf) for conf in config().antbed.replicas]
         self.check()
 
-    def new_session(self, session=None):
+    def new_session(self, session=None, readonly: bool = False):
+        """A session on the primary, or with `readonly` a RoutingSession reading from a random replica.
+
+        A given `session` is returned as is, so reads inside a write path stay on its connection.
+        """
         if session:
             return session
-        _, session_factory = self.engine.session()
+        engine, session_factory = self.engine.session()
+        if readonly and self.replicas:
+            replica, _ = random.choice(self.replicas).session()
+            return routing_factory(session_factory)(bind=engine, replica=replica)
         return session_factory()
 
+    def autocommit_connection(self) -> Connection:
+        """A connection to the primary outside of any transaction, for DDL like CREATE INDEX CONCURRENTLY"""
+        engine, _ = self.engine.session()
+        return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    @contextmanager
+    def read_session(self, session=None) -> Iterator[Session]:
+        """A readonly `new_session`, closed on exit unless it's the given `session`"""
+        sess = self.new_session(session, readonly=True)
+        try:
+            yield sess
+        finally:
+            if sess is not session:
+                sess.close()
+
+    @contextmanager
+    def write_session(self, session=None) -> Iterator[Session]:
+        """A `new_session` on the primary, closed on exit unless it's the given `session`"""
+        sess = self.new_session(session)
+        try:
+            yield sess
+        finally:
+            if sess is not session:
+                sess.close()
+
     def check(self) -> None:
         for model in self.models:
             if not model.__active_engine__:
@@ -61,6 +140,14 @@ class DB:
     def add_vfile(self, vfile: VFile, session=None) -> VFile:
         return vfile.save(commit=True, session=session)
 
+    def add_vfiles(self, vfiles: Sequence[VFile], session=None) -> list[VFile]:
+        """Batch ingest: the token counts of all the documents are taken in one encode_batch"""
+        VFile.update_tokens_many(vfiles)
+        with self.write_session(session) as sess:
+            sess.add_all(vfiles)
+            sess.commit()
+        return list(vfiles)
+
     def add_summary_output(
         self,
         vfile_id: uuid.UUID,
@@ -93,7 +180,7 @@ class DB:
 
     def get_summary_variants(self, vfile_id: uuid.UUID, session=None) -> list[str]:
         """Get a list of existing summary variants for a VFile."""
-        with self.new_session(session) as sess:
+        with self.read_session(session) as sess:
             # Query for distinct variant names for the given vfile_id
             result = sess.query(Summary.variant_name).filter(Summary.vfile_id == vfile_id).distinct().all()
             return [row[0] for row in result]
@@ -101,8 +188,14 @@ class DB:
     def delete_vector(self, vector: Vector, session=None) -> None:
         Vector.delete(vector, session=session)
 
-    def delete_vfile(self, vfile: VFile, session=None) -> None:
-        VFile.delete(vfile, session=session)
+    def delete_vfile(self, vfile: VFile, session=None) -> set[uuid.UUID]:
+        """Delete a document; returns the splits of other documents whose duplicates of its chunks were reset"""
+        with self.write_session(session) as sess:
+            chunks = select(Embedding.id).where(Embedding.vfile_id == vfile.id)
+            released = Embedding.release_duplicates(chunks, sess, Embedding.vfile_id != vfile.id)
+            VFile.delete(vfile, session=sess)
+            sess.commit()
+        return released
 
     def add_vector_vfile(self, vvfile: VectorVFile, session=None) -> VectorVFile:
         return VectorVFile.add(vvfile, commit=True, session=session)
@@ -126,7 +219,7 @@ class DB:
         subject_id: str | None,
         subject_type: str | None = "extern",
         vector_type: str | None = "all",
-        external_provider: Literal["qdrant", "openai"] = "qdrant",
+        external_provider: Literal["qdrant", "openai", "pgvector"] = "qdrant",
         session=None,
     ) -> Vector | None:
         return (
@@ -141,6 +234,25 @@ class DB:
             .first()
         )
 
+    def get_vector_by_name(self, name: str, external_provider: str | None = None, session=None) -> Vector | None:
+        q = Vector.select(session).where(Vector.external_id == name)
+        if external_provider is not None:
+            q = q.where(Vector.external_provider == external_provider)
+        session = Vector.new_session(session)
+        return session.execute(q.order_by(Vector.created_at.desc()).limit(1)).scalars().first()
+
+    def get_vector_split(self, vector_id: uuid.UUID, session=None) -> VFileSplit | None:
+        """Latest split indexed in a vector, its model and provider are the ones to embed queries with"""
+        q = (
+            VFileSplit.select(session)
+            .join(VectorVFile, VectorVFile.vsplit_id == VFileSplit.id)
+            .where(VectorVFile.vector_id == vector_id)
+            .order_by(VectorVFile.updated_at.desc())
+            .limit(1)
+        )
+        session = VFileSplit.new_session(session)
+        return session.execute(q).scalars().first()
+
     def get_vfile(self, subject_id: str | None, subject_type: str | None = "extern", session=None) -> VFile | None:
         return (
             VFile.where(VFile.subject_id == subject_id, VFile.subject_type == subject_type, session=session)
@@ -171,8 +283,61 @@ class DB:
             vsplit = VFileSplit.where(VFileSplit.id == uuid.UUID(split_id)).scalars().first()
         return vsplit
 
-    def find_embedding(self, id: uuid.UUID, session=None) -> Embedding:
-        return Embedding.where(Embedding.id == id, session=session).scalars().one()
+    def get_embeddings(
+        self,
+        vfile_split_id: uuid.UUID,
+        *,
+        vfile_id: uuid.UUID | None = None,
+        ids: Sequence[uuid.UUID] | None = None,
+        part_start: int | None = None,
+        part_stop: int | None = None,
+        session=None,
+    ) -> Sequence[Embedding]:
+        """Chunks of a split, in the partition of `vfile_id` (looked up from the split when not given)"""
+        if vfile_id is None:
+            vfile_id = select(VFileSplit.vfile_id).where(VFileSplit.id == vfile_split_id).scalar_subquery()
+        q = (
+            Embedding.select(session)
+            .where(Embedding.vfile_id == vfile_id, Embedding.vfile_split_id == vfile_split_id)
+            .options(undefer(Embedding.content))
+        )
+        if ids:
+            q = q.where(Embedding.id.in_(ids))
+        if part_start is not None:
+            q = q.where(Embedding.part_number >= part_start)
+        if part_stop is not None:
+            q = q.where(Embedding.part_number < part_stop)
+        session = Embedding.new_session(session)
+        return session.execute(q.order_by(Embedding.part_number.asc())).scalars().all()
+
+    def recode_embeddings(self, encoding: VectorEncodingEnum, batch_size: int = 1000, session=None) -> int:
+        """Rewrite stored vectors with another encoding, one committed batch at a time"""
+        encoding = VectorEncodingEnum(encoding)
+        total = 0
+        with self.write_session(session) as sess:
+            while True:
+                q = (
+                    Embedding.select(sess)
+                    .where(Embedding.vector_encoding != encoding.value, Embedding.status == "complete")
+                    .options(undefer_group("vector"))
+                    .order_by(Embedding.id)
+                    .limit(batch_size)
+                )
+                embs = sess.execute(q).scalars().all()
+                if not embs:
+                    break
+                for emb in embs:
+                    emb.set_vector(emb.vector, encoding)
+                sess.commit()
+                sess.expunge_all()
+                total += len(embs)
+                logger.info(f"Recoded {total} embeddings to {encoding.value}")
+        return total
+
+    def find_embedding(self, id: uuid.UUID, vfile_id: uuid.UUID | None = None, session=None) -> Embedding:
+        if vfile_id is None:
+            return Embedding.where(Embedding.id == id, session=session).scalars().one()
+        return Embedding.where(Embedding.id == id, Embedding.vfile_id == vfile_id, session=session).scalars().one()
 
     def find_vfile(self, id: uuid.UUID, session=None) -> VFile:
         return VFile.where(VFile.id == id, session=session).scalars().one()
@@ -183,17 +348,21 @@ class DB:
         vfile: VFile | None,
         chunk_id: uuid.UUID | str | None,
         session: Any,
-    ) -> VFile:
+    ) -> tuple[VFile, Embedding | None]:
         if chunk_id is not None:
-            emb = self.find_embedding(uuid.UUID(str(chunk_id)), session=session)
+            if vfile_id is None and vfile is not None:
+                vfile_id = vfile.id
+            emb = self.find_embedding(
+                uuid.UUID(str(chunk_id)), uuid.UUID(str(vfile_id)) if vfile_id is not None else None, session=session
+            )
             if vfile is None:  # Check if vfile needs to be loaded
-                return self.find_vfile(uuid.UUID(str(emb.vfile_id)), session=session)
-            return vfile
+                return self.find_vfile(uuid.UUID(str(emb.vfile_id)), session=session), emb
+            return vfile, emb
         if vfile_id is not None and vfile is None:
-            return self.find_vfile(uuid.UUID(str(vfile_id)), session=session)
+            return self.find_vfile(uuid.UUID(str(vfile_id)), session=session), None
         if vfile is None:
             raise ValueError("vfile_id or vfile is required when chunk_id is not provided")
-        return vfile
+        return vfile, None
 
     def _populate_content_from_summary(
         self,
@@ -236,11 +405,13 @@ class DB:
         metadata = metadata if metadata is not None else {}
         content = Content(mode=with_content, metadata=metadata)
 
-        with self.new_session(session) as sess:
-            vfile_instance = self._get_vfile_for_content(vfile_id, vfile, chunk_id, sess)
+        with self.read_session(session) as sess:
+            vfile_instance, emb = self._get_vfile_for_content(vfile_id, vfile, chunk_id, sess)
 
             if with_content == WithContentMode.FULL:
                 content.verbatim = vfile_instance.content(summary=False)  # Ensure not fetching summary here
+            elif with_content == WithContentMode.CHUNK and emb is not None:
+                content.chunk = emb.content
 
             selected_summary: Summary | None = vfile_instance.summary(variant=summary_variant)
             self._populate_content_from_summary(
@@ -248,21 +419,231 @@ class DB:
             )
             return content
 
+    @staticmethod
+    def loaded_summaries(
+        vfiles: Sequence[VFile], summary_variant: str = "default"
+    ) -> tuple[dict[uuid.UUID, Summary | None], list[uuid.UUID]]:
+        """Selected summary of the vfiles with loaded summaries, and the ids of the others"""
+        selected: dict[uuid.UUID, Summary | None] = {}
+        unloaded = []
+        for vf in vfiles:
+            if "summaries" in inspect(vf).unloaded:
+                unloaded.append(vf.id)
+            else:
+                selected[vf.id] = vf.summary(summary_variant)
+        return selected, unloaded
+
+    @staticmethod
+    def summaries_query(q: Select[Summary], vfile_ids: list[uuid.UUID], summary_variant: str = "default"):
+        q = q.where(Summary.vfile_id.in_(vfile_ids))
+        if summary_variant != "default":
+            q = q.where(Summary.variant_name == summary_variant)
+        return q.order_by(Summary.variant_name, Summary.created_at)
+
+    @staticmethod
+    def pick_summaries(
+        vfile_ids: list[uuid.UUID], summaries: Iterable[Summary], summary_variant: str = "default"
+    ) -> dict[uuid.UUID, Summary | None]:
+        by_vfile: dict[uuid.UUID, list[Summary]] = defaultdict(list)
+        for s in summaries:
+            by_vfile[s.vfile_id].append(s)
+        return {vfile_id: VFile.pick_summary(by_vfile[vfile_id], summary_variant) for vfile_id in vfile_ids}
+
+    def get_summaries(
+        self, vfiles: Sequence[VFile], summary_variant: str = "default", session=None
+    ) -> dict[uuid.UUID, Summary | None]:
+        """Selected summary of each vfile; the ones without loaded summaries are fetched in a single query"""
+        selected, unloaded = self.loaded_summaries(vfiles, summary_variant)
+        if unloaded:
+            q = self.summaries_query(Summary.select(session), unloaded, summary_variant)
+            with self.read_session(session) as sess:
+                selected.update(self.pick_summaries(unloaded, sess.execute(q).scalars(), summary_variant))
+        return selected
+
+    @staticmethod
+    def _content_target(
+        record: VFile | SearchRecord, chunks: dict[uuid.UUID, Embedding]
+    ) -> tuple[Any, Embedding | None]:
+        """(vfile id, chunk) a result points to"""
+        if isinstance(record, VFile):
+            return record.id, None
+        emb = chunks.get(uuid.UUID(str(record.chunk_id))) if record.chunk_id is not None else None
+        if emb is not None:
+            return emb.vfile_id, emb
+        return (uuid.UUID(str(record.vfile_id)) if record.vfile_id is not None else None), None
+
+    @staticmethod
+    def needs_summary(with_content: WithContentMode, keys: set[str] | None) -> bool:
+        return with_content == WithContentMode.SUMMARY or keys is None or bool(keys & SUMMARY_KEYS)
+
+    @classmethod
+    def load_options(cls, with_content: WithContentMode, keys: set[str] | None = None) -> list[Any]:
+        """Loader options of a VFile page: the deferred pages only for full content, summaries only when used"""
+        options: list[Any] = []
+        if with_content == WithContentMode.FULL:
+            options.append(undefer(VFile.pages))
+        if cls.needs_summary(with_content, keys):
+            options.append(selectinload(VFile.summaries))
+        return options
+
+    def get_contents(
+        self,
+        records: Sequence[VFile | SearchRecord],
+        with_content: WithContentMode,
+        *,
+        metadata: Sequence[dict[str, Any]] | None = None,
+        keys: set[str] | None = None,
+        summary_variant: str = "default",
+        session=None,
+    ) -> list[Content | None]:
+        """Bulk `get_content` for a page of results, in at most three queries (chunks, vfiles, summaries).
+
+        Entries whose vfile can't be found are None.
+        """
+        keys = keys if keys is not None else set()
+
+        with self.read_session(session) as sess:
+            chunks: dict[uuid.UUID, Embedding] = {}
+            chunk_ids = self.chunk_ids(records)
+            if chunk_ids:
+                q = self.chunks_query(Embedding.select(sess), chunk_ids, with_content)
+                chunks = {emb.id: emb for emb in sess.execute(q).scalars()}
+
+            vfiles: dict[Any, VFile] = {r.id: r for r in records if isinstance(r, VFile)}
+            targets = [self._content_target(r, chunks) for r in records]
+
+            missing = {vfile_id for vfile_id, _ in targets if vfile_id is not None and vfile_id not in vfiles}
+            if missing:
+                q = self.vfiles_query(VFile.select(sess), missing, with_content)
+                vfiles.update({vf.id: vf for vf in sess.execute(q).scalars()})
+
+            summaries: dict[uuid.UUID, Summary | None] = {}
+            if self.needs_summary(with_content, keys):
+                summaries = self.get_summaries(list(vfiles.values()), summary_variant, session=sess)
+
+            return self.build_contents(
+                targets, vfiles, summaries, with_content, metadata=metadata, keys=keys, summary_variant=summary_variant
+            )
+
+    @staticmethod
+    def chunk_ids(records: Sequence[VFile | SearchRecord]) -> dict[uuid.UUID, uuid.UUID | None]:
+        """vfile_id of each chunk of the records, None when a record doesn't carry it"""
+        return {
+            uuid.UUID(str(r.chunk_id)): uuid.UUID(str(r.vfile_id)) if r.vfile_id is not None else None
+            for r in records
+            if isinstance(r, SearchRecord) and r.chunk_id is not None
+        }
+
+    @staticmethod
+    def chunks_query(q: Select[Embedding], chunk_ids: dict[uuid.UUID, uuid.UUID | None], with_content: WithContentMode):
+        q = q.where(Embedding.id.in_(list(chunk_ids)))
+        vfile_ids = set(chunk_ids.values())
+        if None not in vfile_ids:
+            # prunes the scan to the partitions of the documents
+            q = q.where(Embedding.vfile_id.in_(vfile_ids))
+        if with_content == WithContentMode.CHUNK:
+            q = q.options(undefer(Embedding.content))
+        return q
+
+    @staticmethod
+    def vfiles_query(q: Select[VFile], vfile_ids: set[Any], with_content: WithContentMode):
+        q = q.where(VFile.id.in_(vfile_ids))
+        if with_content == WithContentMode.FULL:
+            q = q.options(undefer(VFile.pages))
+        return q
+
+    def build_contents(
+        self,
+        targets: Sequence[tuple[Any, Embedding | None]],
+        vfiles: dict[Any, VFile],
+        summaries: dict[uuid.UUID, Summary | None],
+        with_content: WithContentMode,
+        *,
+        metadata: Sequence[dict[str, Any]] | None = None,
+        keys: set[str],
+        summary_variant: str = "default",
+    ) -> list[Content | None]:
+        """Content of each (vfile id, chunk) target, from rows already loaded"""
+        metadata = metadata if metadata is not None else [{} for _ in targets]
+        res: list[Content | None] = []
+        for (vfile_id, emb), meta in zip(targets, metadata, strict=True):
+            vfile = vfiles.get(vfile_id)
+            if vfile is None:
+                logger.warning(f"VFile {vfile_id} not found")
+                res.append(None)
+                continue
+            content = Content(mode=with_content, metadata=meta)
+            if with_content == WithContentMode.FULL:
+                content.verbatim = vfile.content(summary=False)
+            elif with_content == WithContentMode.CHUNK and emb is not None:
+                content.chunk = emb.content
+            self._populate_content_from_summary(
+                content, summaries.get(vfile.id), keys, with_content, vfile.id, summary_variant
+            )
+            res.append(content)
+        return res
+
+    @staticmethod
+    def _equals_spec(filter_spec) -> dict[str, Any] | None:
+        """The key/values of an equality spec, None for the other operators"""
+        if FILTER_OPERATORS & filter_spec.keys():
+            return None
+        return filter_spec.get("equals", filter_spec)
+
+    @staticmethod
+    def _contains(column, kv: dict[str, Any], hot_keys: Container[str]):
+        clause = column.contains(kv)
+        # hot keys also get the `->>` form, so their expression index can be used instead of the GIN one
+        hot = [
+            column.op("->>", return_type=Text)(literal(key, Text, literal_execute=True)) == value
+            for key, value in kv.items()
+            if key in hot_keys and isinstance(value, str)
+        ]
+        return and_(clause, *hot) if hot else clause
+
+    def _build_and(self, column, specs, hot_keys: Container[str]):
+        """Merge equalities into a single `@>` and existence checks into a single `?&`"""
+        merged: dict[str, Any] = {}
+        exists: list[str] = []
+        clauses = []
+        for spec in specs:
+            kv = self._equals_spec(spec)
+            if kv is not None and not merged.keys() & kv.keys():
+                merged.update(kv)
+            elif spec.keys() == {"exists"}:
+                exists.append(spec["exists"])
+            else:
+                clauses.append(self.build_jsonb_filter(column, spec, hot_keys))
+        if merged:
+            clauses.insert(0, self._contains(column, merged, hot_keys))
+        if len(exists) > 1:
+            clauses.append(column.has_all(array(exists)))
+        elif exists:
+            clauses.append(column.has_key(exists[0]))
+        return and_(*clauses)
+
     # pylint: disable=too-return-statements
-    def build_jsonb_filter(self, column, filter_spec):
+    def build_jsonb_filter(self, column, filter_spec, hot_keys: Container[str] = ()):
         """
         Recursively build filters for JSONB column from provided filter spec.
 
+        Only the GIN-indexable forms are emitted: `@>` for equalities and `?`, `?&`, `?|` for keys.
+
         :param column: SQLAlchemy JSONB column
         :param filter_spec: Dictionary specifying filters
+        :param hot_keys: Top-level keys with an `info ->> key` expression index
         :return: SQLAlchemy filter
         """
         if "and" in filter_spec:
-            clause = and_(*[self.build_jsonb_filter(column, f) for f in filter_spec["and"]])
+            clause = self._build_and(column, filter_spec["and"], hot_keys)
         elif "or" in filter_spec:
-            clause = or_(*[self.build_jsonb_filter(column, f) for f in filter_spec["or"]])
+            specs = filter_spec["or"]
+            if specs and all(spec.keys() == {"exists"} for spec in specs):
+                clause = column.has_any(array([spec["exists"] for spec in specs]))
+            else:
+                clause = or_(*[self.build_jsonb_filter(column, f, hot_keys) for f in specs])
         elif "not" in filter_spec:
-            clause = not_(self.build_jsonb_filter(column, filter_spec["not"]))
+            clause = not_(self.build_jsonb_filter(column, filter_spec["not"], hot_keys))
         elif "exists" in filter_spec:
             key = filter_spec["exists"]
             clause = column.has_key(key)
@@ -270,13 +651,35 @@ class DB:
             key = filter_spec["not_exists"]
             clause = not_(column.has_key(key))
         else:
-            kv = filter_spec.get("equals", filter_spec)
-            clause = column.contains(kv)
+            clause = self._contains(column, filter_spec.get("equals", filter_spec), hot_keys)
 
         return clause
 
+    @staticmethod
+    def info_index_name(key: str) -> str:
+        slug = re.sub(r"[^a-z0-9]+", "_", key.lower()).strip("_")[:32]
+        digest = hashlib.sha256(key.encode()).hexdigest()[:8]
+        return f"vfile_info_{slug}_{digest}_idx"
+
+    def ensure_info_indexes(self, keys: Sequence[str] | None = None, session=None) -> list[str]:
+        """Create the `info ->> key` expression indexes of the configured hot keys"""
+        if keys is None:
+            keys = config().antbed.info_index_keys
+        names = []
+        with self.write_session(session) as sess:
+            for key in keys:
+                name = self.info_index_name(key)
+                quoted = key.replace("'", "''")
+                sess.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON vfile ((info ->> '{quoted}'))"))
+                names.append(name)
+            sess.commit()
+        return names
+
     def prep_query(self, query: DocsQuery, session=None) -> Select[VFile]:
-        q = VFile.select(session)
+        return self.filter_query(VFile.select(session), query)
+
+    def filter_query(self, q: Select[VFile], query: DocsQuery) -> Select[VFile]:
+        """Apply the filters, loader options, cursor and order of a scroll `query`"""
         # if query.direction is not None and query.direction != "both":
         #     q = q.where(VFile.info["direction"] == query.direction)
         if query.date_gt is not None:
@@ -289,8 +692,8 @@ class DB:
             tup = tuple_(VFile.subject_type, VFile.subject_id)
             q = q.where(tup.in_(query.ids))
         if query.filters:
-            q = q.where(self.build_jsonb_filter(VFile.info, query.filters))
-        q = q.options(joinedload(VFile.summaries))
+            q = q.where(self.build_jsonb_filter(VFile.info, query.filters, config().antbed.info_index_keys))
+        q = q.options(*self.load_options(query.mode, {name for _, name in query.keys} if query.keys else None))
         if query.collection_name or query.collection_id:
             q = q.join(
                 Collection,
@@ -300,16 +703,214 @@ class DB:
                 VFileCollection,
                 and_(VFile.id == VFileCollection.vfile_id, VFileCollection.collection_id == Collection.id),
             )
-        if query.order is not None and query.order == "desc":
-            q = q.order_by(VFile.source_created_at.desc())
+        desc = query.order is not None and query.order == "desc"
+        if query.cursor:
+            q = q.where(self.keyset_filter(ScrollCursor.decode(query.cursor), desc))
+        # id breaks ties so keyset pages neither skip nor repeat documents; NULL dates come last (asc) or first (desc)
+        if desc:
+            q = q.order_by(VFile.source_created_at.desc(), VFile.id.desc())
         else:
-            q = q.order_by(VFile.source_created_at.asc())
+            q = q.order_by(VFile.source_created_at.asc(), VFile.id.asc())
         return q
 
+    @staticmethod
+    def keyset_filter(cursor: ScrollCursor, desc: bool = False):
+        """Rows after `cursor` in the (source_created_at, id) order, Postgres' default NULLS placement"""
+        key = tuple_(VFile.source_created_at, VFile.id)
+        if cursor.created_at is None:
+            if desc:
+                return or_(VFile.source_created_at.is_not(None), VFile.id < cursor.id)
+            return and_(VFile.source_created_at.is_(None), VFile.id > cursor.id)
+        if desc:
+            return key < tuple_(cursor.created_at, cursor.id)
+        return or_(key > tuple_(cursor.created_at, cursor.id), VFile.source_created_at.is_(None))
+
+    @staticmethod
+    def next_cursor(query: DocsQuery, page: Sequence[VFile]) -> str | None:
+        if not page or not query.limit or len(page) < query.limit:
+            return None
+        return ScrollCursor(created_at=page[-1].source_created_at, id=page[-1].id).encode()
+
     def scroll(self, query: DocsQuery, session=None) -> list[VFile]:
         q = self.prep_query(query, session=session)
-        session = VFile.new_session(session)
-        return session.execute(q).unique().scalars().all()
+        # the documents come detached from a session opened here, with what the query mode loads
+        with self.read_session(session) as sess:
+            return sess.execute(q).unique().scalars().all()
+
+    def scroll_iter(self, query: DocsQuery, batch_size: int = 500, session=None) -> Iterator[list[VFile]]:
+        """Scroll through a server-side cursor, yielding the documents `batch_size` at a time"""
+        q = self.prep_query(query, session=session).execution_options(yield_per=batch_size)
+        with self.read_session(session) as sess:
+            for part in sess.execute(q).scalars().partitions():
+                yield list(part)
+
+
+class AsyncDB:
+    """The read path of the API on an AsyncEngine: scroll, content hydration and search lookups.
+
+    Queries are built by the same `DB` helpers as the synchronous path and only awaited here,
+    so endpoints don't hold a threadpool thread during database I/O. Rows are loaded eagerly
+    (undefer, selectinload or one extra query), an async session can't lazy load.
+    `async_driver` is psycopg, whose asyncio support SQLAlchemy selects on an AsyncEngine.
+    """
+
+    def __init__(self, db: DB | None = None) -> None:
+        self.db = db or antbeddb()
+        self.engine = create_async_engine(self.url(config().antbed.postgresql), pool_pre_ping=True)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.replicas = [create_async_engine(self.url(conf), pool_pre_ping=True) for conf in config().antbed.replicas]
+        self.replica_factories = [async_sessionmaker(engine, expire_on_commit=False) for engine in self.replicas]
+
+    @staticmethod
+    def url(conf: PostgreSQLConfigSchema) -> URL:
+        """The configured database, through `async_driver` instead of `driver`"""
+        return URL.create(
+            f"postgresql+{conf.async_driver}",
+            username=conf.user,
+            password=conf.password,
+            host=conf.host,
+            port=conf.port,
+            database=conf.db,
+            query={key: str(value) for key, value in (conf.params or {}).items()},
+        )
+
+    def new_session(self, session: AsyncSession | None = None, readonly: bool = True) -> AsyncSession:
+        """A session on a random replica, on the primary without replicas or with `readonly=False`"""
+        if session is not None:
+            return session
+        if readonly and self.replica_factories:
+            return random.choice(self.replica_factories)()
+        return self.session_factory()
+
+    @asynccontextmanager
+    async def read_session(self, session: AsyncSession | None = None) -> AsyncIterator[AsyncSession]:
+        """A `new_session`, closed on exit unless it's the given `session`, see `DB.read_session`"""
+        sess = self.new_session(session)
+        try:
+            yield sess
+        finally:
+            if sess is not session:
+                await sess.close()
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+        for engine in self.replicas:
+            await engine.dispose()
+
+    async def get_vector_by_name(
+        self, name: str, external_provider: str | None = None, session: AsyncSession | None = None
+    ) -> Vector | None:
+        q = select(Vector).where(Vector.external_id == name)
+        if external_provider is not None:
+            q = q.where(Vector.external_provider == external_provider)
+        async with self.read_session(session) as sess:
+            return (await sess.execute(q.order_by(Vector.created_at.desc()).limit(1))).scalars().first()
+
+    async def get_vector_split(self, vector_id: uuid.UUID, session: AsyncSession | None = None) -> VFileSplit | None:
+        """See `DB.get_vector_split`"""
+        q = (
+            select(VFileSplit)
+            .join(VectorVFile, VectorVFile.vsplit_id == VFileSplit.id)
+            .where(VectorVFile.vector_id == vector_id)
+            .order_by(VectorVFile.updated_at.desc())
+            .limit(1)
+        )
+        async with self.read_session(session) as sess:
+            return (await sess.execute(q)).scalars().first()
+
+    async def scroll(self, query: DocsQuery, session: AsyncSession | None = None) -> list[VFile]:
+        q = self.db.filter_query(select(VFile), query)
+        async with self.read_session(session) as sess:
+            return list((await sess.execute(q)).unique().scalars().all())
+
+    async def scroll_iter(
+        self, query: DocsQuery, batch_size: int = 500, session: AsyncSession | None = None
+    ) -> AsyncIterator[list[VFile]]:
+        """Scroll through a server-side cursor, yielding the documents `batch_size` at a time"""
+        q = self.db.filter_query(select(VFile), query).execution_options(yield_per=batch_size)
+        async with self.read_session(session) as sess:
+            result = await sess.stream(q)
+            async for part in result.scalars().partitions():
+                yield list(part)
+
+    async def get_summaries(
+        self, vfiles: Sequence[VFile], summary_variant: str = "default", session: AsyncSession | None = None
+    ) -> dict[uuid.UUID, Summary | None]:
+        selected, unloaded = self.db.loaded_summaries(vfiles, summary_variant)
+        if unloaded:
+            q = self.db.summaries_query(select(Summary), unloaded, summary_variant)
+            async with self.read_session(session) as sess:
+                rows = (await sess.execute(q)).scalars().all()
+            selected.update(self.db.pick_summaries(unloaded, rows, summary_variant))
+        return selected
+
+    async def get_contents(
+        self,
+        records: Sequence[VFile | SearchRecord],
+        with_content: WithContentMode,
+        *,
+        metadata: Sequence[dict[str, Any]] | None = None,
+        keys: set[str] | None = None,
+        summary_variant: str = "default",
+        session: AsyncSession | None = None,
+    ) -> list[Content | None]:
+        """See `DB.get_contents`"""
+        keys = keys if keys is not None else set()
+        async with self.read_session(session) as sess:
+            chunks: dict[uuid.UUID, Embedding] = {}
+            chunk_ids = self.db.chunk_ids(records)
+            if chunk_ids:
+                q = self.db.chunks_query(select(Embedding), chunk_ids, with_content)
+                chunks = {emb.id: emb for emb in (await sess.execute(q)).scalars()}
+
+            vfiles: dict[Any, VFile] = {r.id: r for r in records if isinstance(r, VFile)}
+            targets = [self.db._content_target(r, chunks) for r in records]
+
+            missing = {vfile_id for vfile_id, _ in targets if vfile_id is not None and vfile_id not in vfiles}
+            if missing:
+                q = self.db.vfiles_query(select(VFile), missing, with_content)
+                vfiles.update({vf.id: vf for vf in (await sess.execute(q)).scalars()})
+
+            summaries: dict[uuid.UUID, Summary | None] = {}
+            if self.db.needs_summary(with_content, keys):
+                summaries = await self.get_summaries(list(vfiles.values()), summary_variant, session=sess)
+
+            return self.db.build_contents(
+                targets, vfiles, summaries, with_content, metadata=metadata, keys=keys, summary_variant=summary_variant
+            )
+
+    async def get_content(
+        self,
+        with_content: WithContentMode,
+        *,
+        vfile_id: uuid.UUID | str | None = None,
+        vfile: VFile | None = None,
+        chunk_id: uuid.UUID | str | None = None,
+        metadata: dict[str, Any] | None = None,
+        keys: set[str] | None = None,
+        summary_variant: str = "default",
+        session: AsyncSession | None = None,
+    ) -> Content:
+        """See `DB.get_content`"""
+        if vfile is not None:
+            record: VFile | SearchRecord = vfile
+            if chunk_id is not None:
+                record = SearchRecord(id=str(vfile.id), vfile_id=vfile.id, chunk_id=chunk_id)
+        elif vfile_id is not None or chunk_id is not None:
+            record = SearchRecord(vfile_id=vfile_id, chunk_id=chunk_id)
+        else:
+            raise ValueError("vfile_id or vfile is required when chunk_id is not provided")
+        contents = await self.get_contents(
+            [record],
+            with_content,
+            metadata=[metadata if metadata is not None else {}],
+            keys=keys,
+            summary_variant=summary_variant,
+            session=session,
+        )
+        if contents[0] is None:
+            raise ValueError(f"No content for vfile {vfile_id} chunk {chunk_id}")
+        return contents[0]
 
 
 @cache
@@ -321,3 +922,9 @@ def antbeddb() -> DB:
     db = cached_db()
     db.check()
     return db
+
+
+@cache
+def antbeddb_async() -> AsyncDB:
+    """Process-wide AsyncDB, its pool is bound to the event loop of the first request"""
+    return AsyncDB()
@@ -11,12 +11,16 @@ if TYPE_CHECKING:
     pass
 
 # from antbed.agents.rag_summary import SummaryAgent, SummaryInput
-from antbed.db.models import Collection, Embedding, Vector, VFile
-from antbed.embedding import VFileEmbedding
-from antbed.models import EmbeddingRequest, UploadRequest, UploadRequestIDs
-from antbed.splitdoc import Splitter
+from antbed.db.models import Collection, Vector, VFile
+from antbed.models import (
+    EmbeddingBatchRequest,
+    EmbeddingBatchResponse,
+    EmbeddingRequest,
+    UploadRequest,
+    UploadRequestIDs,
+)
+from antbed.registry import get_embedder, get_vector_manager
 from antbed.store import antbeddb
-from antbed.vectordb.manager import VectorManager
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +61,7 @@ def get_or_create_file(data: UploadRequest) -> UploadRequestIDs:
     activity.heartbeat()
     activity.logger.info("Creating file")
     antbeddb().check()
-    splitter = Splitter(data.config)
-    vm = VectorManager(splitter, manager=data.manager)
+    vm = get_vector_manager(data.config, manager=data.manager)
     with antbeddb().new_session() as session:
         vf = vm.get_or_create_file(data.doc.to_model(VFile), session=session)
         urir = UploadRequestIDs(
@@ -81,8 +84,7 @@ def get_or_create_split(data: UploadRequestIDs) -> UploadRequestIDs:
     activity.heartbeat()
     activity.logger.info("Creating split and embedding(%s): %s", data.skip_embedding, data.vfile_id)
     antbeddb().check()
-    splitter = Splitter(data.config)
-    vm = VectorManager(splitter, manager=data.manager)
+    vm = get_vector_manager(data.config, manager=data.manager)
     if data.vfile_id is None:
         raise ValueError("VFile ID is required")
     with antbeddb().new_session() as session:
@@ -112,14 +114,41 @@ def embedding(data: EmbeddingRequest) -> EmbeddingRequest:
     activity.heartbeat()
     activity.logger.info("Embedding")
     antbeddb().check()
-    with antbeddb().new_session() as session:
-        embedder = VFileEmbedding()
-        emb = Embedding.find(data.embedding_id, session=session)
-        if emb is None:
-            raise ValueError("Embedding not found")
+    db = antbeddb()
+    with db.new_session() as session:
+        embedder = get_embedder(data.config, provider=data.embedding_provider)
+        emb = db.find_embedding(data.embedding_id, data.vfile_id, session=session)
         emb = embedder.embedding(emb, session=session)
         activity.heartbeat()
-        return EmbeddingRequest(embedding_id=emb.id, status=emb.status)
+        return EmbeddingRequest(embedding_id=emb.id, vfile_id=emb.vfile_id, status=emb.status)
+
+
+@activity.defn
+def embedding_batch(data: EmbeddingBatchRequest) -> EmbeddingBatchResponse:
+    activity.heartbeat()
+    activity.logger.info("Embedding batch of split %s", data.vfile_split_id)
+    db = antbeddb()
+    db.check()
+    with db.new_session() as session:
+        embs = list(
+            db.get_embeddings(
+                data.vfile_split_id,
+                vfile_id=data.vfile_id,
+                ids=data.embedding_ids,
+                part_start=data.part_start,
+                part_stop=data.part_stop,
+                session=session,
+            )
+        )
+        if not embs:
+            raise ValueError("Embeddings not found")
+        embedder = get_embedder(provider=data.embedding_provider)
+        embedder.embedding_many(embs, embs[0].split.model or None, session=session)
+        activity.heartbeat()
+        return EmbeddingBatchResponse(
+            vfile_split_id=data.vfile_split_id,
+            embeddings=[EmbeddingRequest(embedding_id=emb.id, status=emb.status) for emb in embs],
+        )
 
 
 @activity.defn
@@ -139,9 +168,8 @@ def add_vfile_to_collection(data: UploadRequestIDs) -> UploadRequestIDs:
     activity.heartbeat()
     activity.logger.info("Adding vfile to collection")
     antbeddb().check()
-    splitter = Splitter(data.config)
     with antbeddb().new_session() as session:
-        vm = VectorManager(splitter, manager=data.manager)
+        vm = get_vector_manager(data.config, manager=data.manager)
         if data.vfile_id is None:
             raise ValueError("VFile ID is required")
         vf = VFile.find(data.vfile_id, session=session)
@@ -169,9 +197,8 @@ def add_vfile_to_vector(data: UploadRequestIDs) -> UploadRequestIDs:
     activity.heartbeat()
     activity.logger.info("Adding vfile to vector")
     antbeddb().check()
-    splitter = Splitter(data.config)
     with antbeddb().new_session() as session:
-        vm = VectorManager(splitter, manager=data.manager)
+        vm = get_vector_manager(data.config, manager=data.manager)
         if data.vfile_id is None:
             raise ValueError("VFile ID is required")
         vf = VFile.find(data.vfile_id, session=session)
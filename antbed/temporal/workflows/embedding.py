@@ -5,8 +5,14 @@ from temporalio.exceptions import ActivityError
 from temporalloop.utils import as_completed_with_concurrency
 
 with workflow.unsafe.imports_passed_through():
-    from antbed.models import EmbeddingRequest, EmbeddingWorkflowInput, UploadRequest, UploadRequestIDs
-    from antbed.temporal.activities import embedding, get_or_create_split, get_vfile_id
+    from antbed.models import (
+        EmbeddingBatchRequest,
+        EmbeddingRequest,
+        EmbeddingWorkflowInput,
+        UploadRequest,
+        UploadRequestIDs,
+    )
+    from antbed.temporal.activities import embedding, embedding_batch, get_or_create_split, get_vfile_id
 
 MAX_CONCURRENT = 10
 
@@ -53,11 +59,20 @@ class EmbeddingWorkflow:
         #         )
         #     )
 
+        if data.batch_size > 0 and workflow.patched("embedding-batch"):
+            await self.run_batches(data)
+            return self.embeddings
+
         for embedding_id in self.urir.embedding_ids:
             embeddings_activities.append(
                 workflow.start_activity(
                     embedding,
-                    EmbeddingRequest(embedding_id=embedding_id),
+                    EmbeddingRequest(
+                        embedding_id=embedding_id,
+                        vfile_id=self.urir.vfile_id,
+                        embedding_provider=data.config.embedding_provider,
+                        config=data.config,
+                    ),
                     start_to_close_timeout=timedelta(minutes=120),
                     schedule_to_close_timeout=timedelta(hours=24),
                 )
@@ -71,6 +86,35 @@ class EmbeddingWorkflow:
                 workflow.logger.error(f"ActivityFailure: {e}, continue...")
         return self.embeddings
 
+    async def run_batches(self, data: EmbeddingWorkflowInput) -> None:
+        """Fan out one activity per range of `batch_size` parts instead of one per chunk"""
+        if self.urir.vfile_split_id is None:
+            raise ValueError("VFileSplit ID is required")
+        parts = len(self.urir.embedding_ids)
+        batch_activities = []
+        for start in range(0, parts, data.batch_size):
+            batch_activities.append(
+                workflow.start_activity(
+                    embedding_batch,
+                    EmbeddingBatchRequest(
+                        vfile_split_id=self.urir.vfile_split_id,
+                        vfile_id=self.urir.vfile_id,
+                        part_start=start,
+                        part_stop=min(start + data.batch_size, parts),
+                        embedding_provider=data.config.embedding_provider,
+                    ),
+                    start_to_close_timeout=timedelta(minutes=120),
+                    schedule_to_close_timeout=timedelta(hours=24),
+                )
+            )
+
+        workflow.logger.info(f"Start embedding batch activities: {len(batch_activities)} for {parts} parts...")
+        async for res in as_completed_with_concurrency(MAX_CONCURRENT, workflow, *batch_activities):
+            try:
+                self.embeddings.extend((await res).embeddings)
+            except ActivityError as e:
+                workflow.logger.error(f"ActivityFailure: {e}, continue...")
+
     @workflow.query
     def query_urir(self) -> UploadRequestIDs:
         return self.urir
@@ -0,0 +1,43 @@
+from enum import StrEnum
+
+import numpy as np
+
+INT8_MAX = 127
+
+
+class VectorEncodingEnum(StrEnum):
+    """How an embedding vector is stored in Postgres"""
+
+    ARRAY = "float8"  # legacy float8[] column
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
+    INT8 = "int8"  # symmetric quantization, with the scale stored next to the blob
+
+
+DTYPES: dict[VectorEncodingEnum, np.dtype] = {
+    VectorEncodingEnum.FLOAT32: np.dtype("<f4"),
+    VectorEncodingEnum.FLOAT16: np.dtype("<f2"),
+    VectorEncodingEnum.INT8: np.dtype("i1"),
+}
+
+
+def encode_vector(vector: list[float] | np.ndarray, encoding: VectorEncodingEnum) -> tuple[bytes, float | None]:
+    """Pack a vector into bytes; returns the blob and, for int8, the scale needed to decode it"""
+    if encoding == VectorEncodingEnum.ARRAY:
+        raise ValueError("float8 vectors are stored as an array, not a blob")
+    arr = np.asarray(vector, dtype=np.float32)
+    if encoding == VectorEncodingEnum.INT8:
+        peak = float(np.abs(arr).max()) if arr.size else 0.0
+        scale = peak / INT8_MAX if peak else 1.0
+        return np.round(arr / scale).astype(DTYPES[encoding]).tobytes(), scale
+    return arr.astype(DTYPES[encoding]).tobytes(), None
+
+
+def decode_vector(blob: bytes, encoding: VectorEncodingEnum, scale: float | None = None) -> np.ndarray:
+    """Unpack a blob into a float32 array; float32 blobs are read without copying"""
+    arr = np.frombuffer(blob, dtype=DTYPES[VectorEncodingEnum(encoding)])
+    if encoding == VectorEncodingEnum.INT8:
+        return arr.astype(np.float32) * np.float32(scale or 1.0)
+    if encoding == VectorEncodingEnum.FLOAT16:
+        return arr.astype(np.float32)
+    return arr
@@ -1,6 +1,9 @@
+import asyncio
 import logging
+from typing import Any
 
-from antbed.db.models import Vector, VFile, VFileSplit, VFileUpload
+from antbed.db.models import Embedding, Vector, VFile, VFileSplit, VFileUpload
+from antbed.models import SearchRecord
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +34,37 @@ class VectorDB:
         _ = vfile
         raise NotImplementedError("add_points")
 
+    def upsert_points(self, vector: Vector, vsplit: VFileSplit, vfile: VFile, embs: list[Embedding]) -> None:
+        """Upsert chunks of a split while it's being embedded, `add_points` still syncs the split once done"""
+        _ = vector, vsplit, vfile, embs
+
+    def search(
+        self,
+        vector: Vector,
+        query: list[float],
+        *,
+        model: str,
+        limit: int = 10,
+        filters: dict[str, Any] | None = None,
+        session=None,
+    ) -> list[SearchRecord]:
+        _ = vector, query, model, limit, filters, session
+        raise NotImplementedError(f"search is not supported by {type(self).__name__}")
+
+    async def asearch(
+        self,
+        vector: Vector,
+        query: list[float],
+        *,
+        model: str,
+        limit: int = 10,
+        filters: dict[str, Any] | None = None,
+        session=None,
+    ) -> list[SearchRecord]:
+        """`search` for async endpoints, in a worker thread unless the store has a native async path"""
+        _ = session
+        return await asyncio.to_thread(self.search, vector, query, model=model, limit=limit, filters=filters)
+
 
 class NoopVectorDB(VectorDB):
     @property
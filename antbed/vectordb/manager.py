@@ -1,4 +1,6 @@
 import logging
+import uuid
+from collections.abc import Iterable
 
 import qdrant_client
 from openai import OpenAI
@@ -11,6 +13,7 @@ from antbed.splitdoc import Splitter
 from antbed.store import antbeddb
 from antbed.vectordb.base import VectorDB
 from antbed.vectordb.openaistore import VectorOpenAI
+from antbed.vectordb.pgvector import VectorPgvector
 from antbed.vectordb.qdrant import VectorQdrant
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,7 @@ class VectorManager:
         client: qdrant_client.QdrantClient | OpenAI | None = None,
         manager: ManagerEnum = ManagerEnum.NONE,
         embedding_provider: str | None = None,
+        embedder: VFileEmbedding | None = None,
     ) -> None:
         if splitter is None:
             self.splitter = Splitter()
@@ -30,7 +34,8 @@ class VectorManager:
             self.splitter = splitter
         self.manager_name: ManagerEnum = manager
         self.manager = self._init_manager(client, manager)
-        self.embedder = VFileEmbedding(self.splitter, provider=embedding_provider)
+        self.managers: dict[str, VectorDB] = {manager: self.manager}
+        self.embedder = embedder or VFileEmbedding(self.splitter, provider=embedding_provider)
         self.db = antbeddb()
 
     def _init_manager(self, client: qdrant_client.QdrantClient | OpenAI | None, manager: ManagerEnum) -> VectorDB:
@@ -42,10 +47,12 @@ class VectorManager:
             if client is not None and not isinstance(client, OpenAI):
                 raise ValueError("OpenAI client is required with manager openai")
             return VectorOpenAI(client)
+        elif manager == "pgvector":
+            return VectorPgvector()
         elif manager == "none":
             return VectorDB()
         else:
-            raise ValueError("Manager should be either openai or qdrant")
+            raise ValueError("Manager should be either openai, qdrant or pgvector")
 
     def get_or_create_vector(
         self,
@@ -69,7 +76,9 @@ class VectorManager:
                 vector_type=vector_type,
                 external_provider=self.manager_name,
             )
-            vector = self.manager.create_vector(vector, expires_days=expires_days, session=session)
+            vector = self.manager.create_vector(
+                vector, expires_days=expires_days, dim=self.embedder.vector_size(), session=session
+            )
             vector = self.db.add_vector(vector, session=session)
         return vector
 
@@ -122,8 +131,18 @@ class VectorManager:
                     logger.info(f"Reindexing {vfile.id} to vector {vector.id}")
                 if self.manager_name != "openai" and skip:
                     raise ValueError("Skip is only supported with openai")
-                vsplit = self.embedder.embedding_vfile(vfile, skip, session=session)
+                if not skip and self.embedder.should_stream(vfile):
+                    # upsert the chunks as they're embedded, then sync the points of the whole split
+                    vsplit = self.embedder.embedding_stream(
+                        vfile,
+                        lambda split, embs, vfile=vfile: self.manager.upsert_points(vector, split, vfile, embs),
+                        session=session,
+                        vector_id=vector.id,
+                    )
+                else:
+                    vsplit = self.embedder.embedding_vfile(vfile, skip, session=session, vector_id=vector.id)
                 eid = self.manager.add_points(vector, vsplit, vfile)
+                self.refresh_splits(vsplit.released_splits, session=session)
                 vvfile = VectorVFile(
                     vector_id=vector.id,
                     vfile_id=vfile.id,
@@ -141,6 +160,39 @@ class VectorManager:
         logger.info(f"Vector {vector.id} has {len(vector.vfiles)}")  # pylint: disable=logging-fstring-interpolation
         return vector
 
+    def vectordb(self, vector: Vector) -> VectorDB:
+        """The store of `vector`, which may not be this manager's"""
+        name = vector.external_provider or self.manager_name
+        if name not in self.managers:
+            self.managers[name] = self._init_manager(None, ManagerEnum(name))
+        return self.managers[name]
+
+    def refresh_splits(self, split_ids: Iterable[uuid.UUID], session=None) -> list[VFileSplit]:
+        """Embed the chunks of other documents made pending by `Embedding.release_duplicates`, and upsert them.
+
+        They stood in for a near-duplicate that a re-split or a deleted document removed; each split
+        is embedded, linking its chunks to other near-duplicates of its vectors, and synced into them.
+        """
+        splits = []
+        for split_id in sorted(split_ids):
+            vsplit = VFileSplit.find(split_id, session=session)
+            if vsplit is None:
+                continue
+            vector_vfiles = list(vsplit.vector_vfile)
+            if not vector_vfiles:
+                vsplit = self.embedder.gen_vector(vsplit, session=session)
+            for vvfile in vector_vfiles:
+                vsplit = self.embedder.gen_vector(vsplit, session=session, vector_id=vvfile.vector_id)
+                self.vectordb(vvfile.vector).add_points(vvfile.vector, vsplit, vsplit.vfile)
+            logger.info(f"Re-embedded the released duplicates of split {vsplit.id}")
+            splits.append(vsplit)
+        return splits
+
+    def delete_vfile(self, vfile: VFile, session=None) -> list[VFileSplit]:
+        """Delete a document, re-embedding the chunks of other documents that were its duplicates"""
+        released = self.db.delete_vfile(vfile, session=session)
+        return self.refresh_splits(released, session=session)
+
     def add_vfiles_to_collection(self, collection: Collection, vfiles: list[VFile], session=None) -> Collection:
         # pylint: disable=logging-fstring-interpolation
         collection = self.get_or_create_collection(collection_name=collection.collection_name, session=session)
@@ -153,21 +205,36 @@ class VectorManager:
 
     def get_or_create_embedding(self, ifile: VFile, skip: bool = True, session=None) -> VFileSplit:
         vfile = self.get_or_create_file(ifile, session=session)
-        return self.embedder.embedding_vfile(vfile, skip, session=session)
+        vsplit = self.embedder.embedding_vfile(vfile, skip, session=session)
+        self.refresh_splits(vsplit.released_splits, session=session)
+        return vsplit
 
     def get_or_create_split(self, ifile: VFile, skip: bool = True, session=None) -> VFileSplit:
         vfile = self.get_or_create_file(ifile, session=session)
-        return self.embedder.prepare(vfile, skip=skip, session=session)
+        vsplit = self.embedder.prepare(vfile, skip=skip, session=session)
+        self.refresh_splits(vsplit.released_splits, session=session)
+        return vsplit
 
     def get_or_create_file(self, ifile: VFile, session=None) -> VFile:
         vfile = self.db.get_vfile(subject_id=ifile.subject_id, subject_type=ifile.subject_type, session=session)
+        if ifile.pages and ifile.content_hash is None:
+            ifile.content_hash = VFile.pages_hash(ifile.pages)
         if vfile is None:
-            vfile = self.db.add_vfile(ifile, session=session)
+            return self.db.add_vfile(ifile, session=session)
+        changed = False
+        # new content, the splits are re-cut by the next embedding
+        if ifile.pages and vfile.content_hash != ifile.content_hash:
+            logger.info(f"Content of {vfile.id} changed ({vfile.content_hash} -> {ifile.content_hash})")
+            vfile.pages = ifile.pages
+            vfile.content_hash = ifile.content_hash
+            changed = True
         # update metadata
-        elif vfile.info is None and ifile.info is not None:
+        if vfile.info is None and ifile.info is not None:
             vfile.info = ifile.info
-            vfile = self.db.add_vfile(vfile, session=session)
+            changed = True
         elif vfile.info is not None and ifile.info is not None and vfile.info != ifile.info:
             vfile.info.update(ifile.info)
+            changed = True
+        if changed:
             vfile = self.db.add_vfile(vfile, session=session)
         return vfile
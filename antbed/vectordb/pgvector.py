@@ -0,0 +1,337 @@
+import hashlib
+import logging
+import re
+from typing import Any
+
+from sqlalchemy import (
+    Float,
+    Integer,
+    Text,
+    bindparam,
+    cast,
+    column,
+    delete,
+    literal,
+    literal_column,
+    select,
+    table,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import UserDefinedType
+
+from antbed.config import config
+from antbed.db.models import Embedding, Vector, VFile, VFileSplit, load_deferred
+from antbed.embedding import DUPLICATE_STATUS
+from antbed.models import SearchRecord
+from antbed.store import DB, antbeddb, antbeddb_async
+from antbed.vectordb.base import VectorDB
+
+logger = logging.getLogger(__name__)
+
+# pgvector indexes `vector` up to 2000 dimensions, `halfvec` up to 4000
+VECTOR_MAX_DIM = 2000
+HALFVEC_MAX_DIM = 4000
+# (model, dimensions) pairs whose index this process has seen built, so the catalog is checked once
+INDEXED: set[tuple[str, int]] = set()
+
+INDEX_VALID = text("""
+    SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name
+""")
+
+
+class PgVectorType(UserDefinedType):
+    """`vector(n)` / `halfvec(n)`, only used to render casts"""
+
+    cache_ok = True
+
+    def __init__(self, name: str = "vector", dim: int | None = None) -> None:
+        self.name = name
+        self.dim = dim
+
+    def get_col_spec(self, **kw) -> str:
+        _ = kw
+        return f"{self.name}({self.dim})" if self.dim else self.name
+
+
+POINTS = table(
+    "pgvector_point",
+    column("vector_id"),
+    column("vfile_id"),
+    column("vfile_split_id"),
+    column("embedding_id"),
+    column("model", Text),
+    column("dimensions", Integer),
+    column("payload", JSONB),
+    column("embedding", PgVectorType()),
+)
+
+UPSERT_POINTS = text("""
+    INSERT INTO pgvector_point
+        (vector_id, vfile_id, vfile_split_id, embedding_id, model, dimensions, payload, embedding)
+    VALUES (
+        :vector_id, :vfile_id, :vfile_split_id, :embedding_id, :model, :dimensions, :payload,
+        CAST(:embedding AS vector)
+    )
+    ON CONFLICT (vector_id, embedding_id) DO UPDATE SET
+        vfile_split_id = EXCLUDED.vfile_split_id,
+        model = EXCLUDED.model,
+        dimensions = EXCLUDED.dimensions,
+        payload = EXCLUDED.payload,
+        embedding = EXCLUDED.embedding
+""").bindparams(bindparam("payload", type_=JSONB))
+
+
+class VectorPgvector(VectorDB):
+    """Vectors stored in Postgres next to the metadata, searched with pgvector's inner product.
+
+    All points live in `pgvector_point`, created by the opt-in `make migrate-pgvector`; each
+    (model, dimensions) pair gets its own partial expression index, and searches repeat the
+    same expression and predicate to use it.
+    """
+
+    def __init__(self, client: DB | None = None):
+        if client is None:
+            client = antbeddb()
+        self.client = client
+        self.conf = config().pgvector
+
+    @property
+    def manager_name(self) -> str:
+        return "pgvector"
+
+    @staticmethod
+    def column_type(dim: int) -> str:
+        if dim <= VECTOR_MAX_DIM:
+            return "vector"
+        if dim <= HALFVEC_MAX_DIM:
+            return "halfvec"
+        raise ValueError(f"pgvector can't index {dim} dimensions (max {HALFVEC_MAX_DIM})")
+
+    @staticmethod
+    def index_name(model: str, dim: int) -> str:
+        slug = re.sub(r"[^a-z0-9]+", "_", model.lower()).strip("_")[:24]
+        digest = hashlib.sha256(model.encode()).hexdigest()[:8]
+        return f"pgvector_point_{slug}_{digest}_{dim}_idx"
+
+    @staticmethod
+    def to_literal(vector: list[float]) -> str:
+        # 9 significant digits round-trip float32, which is all pgvector stores
+        return "[" + ",".join(f"{x:.9g}" for x in vector) + "]"
+
+    def ensure_index(self, model: str, dim: int) -> str:
+        """Create the ANN index of a (model, dimensions) pair if missing.
+
+        The index is built CONCURRENTLY, outside a transaction, so writes to the other pairs go on
+        meanwhile; an index left invalid by a failed build is dropped and built again.
+        """
+        name = self.index_name(model, dim)
+        if (model, dim) in INDEXED:
+            return name
+        ctype = self.column_type(dim)
+        if self.conf.index == "ivfflat":
+            method, params = "ivfflat", f"lists = {self.conf.ivfflat_lists}"
+        else:
+            method, params = "hnsw", f"m = {self.conf.hnsw_m}, ef_construction = {self.conf.hnsw_ef_construction}"
+        quoted_model = model.replace("'", "''")
+        ddl = (
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON pgvector_point "
+            f"USING {method} ((embedding::{ctype}({dim})) {ctype}_ip_ops) WITH ({params}) "
+            f"WHERE model = '{quoted_model}' AND dimensions = {dim}"
+        )
+        with self.client.autocommit_connection() as conn:
+            valid = conn.execute(INDEX_VALID, {"name": name}).scalar()
+            if valid is False:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            if not valid:
+                conn.execute(text(ddl))
+        INDEXED.add((model, dim))
+        return name
+
+    def create_vector(self, vector: Vector, **kwargs):
+        _ = kwargs
+        vector.external_provider = self.manager_name
+        vector.external_id = self.vector_id(vector.subject_id, vector.subject_type, vector.vector_type)
+        return vector
+
+    def payload(self, vector: Vector, vfile: VFile, emb: Embedding) -> dict[str, Any]:
+        created_at = vfile.source_created_at.isoformat() if vfile.source_created_at else None
+        return {
+            "subject_id": vfile.subject_id,
+            "subject_type": vfile.subject_type,
+            "vector_type": vector.vector_type,
+            "created_at": created_at,
+            "source": vfile.source,
+            "content_type": vfile.source_content_type,
+            "filename": vfile.source_filename,
+            "metadata": vfile.info,
+            "part": emb.part_number,
+            "char_start": emb.char_start,
+            "char_end": emb.char_end,
+        }
+
+    def point_rows(
+        self, vector: Vector, vsplit: VFileSplit, vfile: VFile, embs: list[Embedding]
+    ) -> list[dict[str, Any]]:
+        """UPSERT_POINTS parameters of the chunks with a vector, their ANN indexes are created if missing"""
+        model = vsplit.model or config().embeddings.get_provider().default_model
+        rows = []
+        load_deferred(embs, Embedding.embedding_vector, Embedding.embedding_blob)
+        for emb in embs:
+            values = emb.vector.tolist()
+            if not values:
+                continue
+            rows.append(
+                {
+                    "vector_id": vector.id,
+                    "vfile_id": vfile.id,
+                    "vfile_split_id": vsplit.id,
+                    "embedding_id": emb.id,
+                    "model": model,
+                    "dimensions": len(values),
+                    "payload": self.payload(vector, vfile, emb),
+                    "embedding": self.to_literal(values),
+                }
+            )
+        for dim in {row["dimensions"] for row in rows}:
+            self.ensure_index(model, dim)
+        return rows
+
+    def upsert_points(self, vector: Vector, vsplit: VFileSplit, vfile: VFile, embs: list[Embedding]) -> None:
+        rows = self.point_rows(vector, vsplit, vfile, embs)
+        if not rows:
+            return
+        with self.client.new_session() as session:
+            session.execute(UPSERT_POINTS, rows)
+            session.commit()
+
+    def add_points(self, vector: Vector, vsplit: VFileSplit, vfile: VFile) -> str:
+        """Sync the points of a vfile with its split, see `VectorQdrant.add_points`"""
+        current = (POINTS.c.vector_id == vector.id) & (POINTS.c.vfile_id == vfile.id)
+        with self.client.new_session() as session:
+            existing = {
+                row.embedding_id: row.payload
+                for row in session.execute(select(POINTS.c.embedding_id, POINTS.c.payload).where(current))
+            }
+        # near-duplicates are left out, their representative's point stands for them
+        embs = [emb for emb in vsplit.embeddings if emb.status != DUPLICATE_STATUS]
+        missing = [emb for emb in embs if emb.id not in existing]
+        moved = [
+            {"embedding_id": emb.id, "payload": self.payload(vector, vfile, emb)}
+            for emb in embs
+            if emb.id in existing and existing[emb.id] != self.payload(vector, vfile, emb)
+        ]
+        stale = existing.keys() - {emb.id for emb in embs}
+        rows = self.point_rows(vector, vsplit, vfile, missing)
+        with self.client.new_session() as session:
+            if rows:
+                session.execute(UPSERT_POINTS, rows)
+            for row in moved:
+                session.execute(
+                    update(POINTS)
+                    .where(current, POINTS.c.embedding_id == row["embedding_id"])
+                    .values(vfile_split_id=vsplit.id, payload=row["payload"])
+                )
+            if stale:
+                session.execute(delete(POINTS).where(current, POINTS.c.embedding_id.in_(list(stale))))
+            session.commit()
+        logger.info(
+            f"Synced {vfile.id} into pgvector {vector.id}: {len(rows)} upserted, {len(moved)} updated, "
+            f"{len(stale)} deleted"
+        )
+        return str(vector.id)
+
+    def reindex(self, vector: Vector, session=None) -> str:
+        vector = self.create_vector(vector)
+        vector.save(commit=True, session=session)
+        for vf in vector.vfiles:
+            split = self.client.get_split(vf.id, None, session=session)
+            if split is not None:
+                self.add_points(vector, vsplit=split, vfile=vf)
+        return str(vector.id)
+
+    def search(
+        self,
+        vector: Vector,
+        query: list[float],
+        *,
+        model: str,
+        limit: int = 10,
+        filters: dict[str, Any] | None = None,
+        session=None,
+    ) -> list[SearchRecord]:
+        """Nearest points by inner product, optionally restricted by a JSONB filter spec on the vfile metadata"""
+        q = self.search_query(vector, query, model=model, limit=limit, filters=filters)
+        # SET LOCAL lasts for the transaction: a caller's session is left open, as is its transaction
+        sess = self.client.new_session(session)
+        try:
+            sess.execute(self.search_setting())
+            rows = sess.execute(q).all()
+        finally:
+            if session is None:
+                sess.close()
+        return self.search_records(rows)
+
+    async def asearch(
+        self,
+        vector: Vector,
+        query: list[float],
+        *,
+        model: str,
+        limit: int = 10,
+        filters: dict[str, Any] | None = None,
+        session=None,
+    ) -> list[SearchRecord]:
+        """`search` on the AsyncEngine, `session` is an AsyncSession"""
+        q = self.search_query(vector, query, model=model, limit=limit, filters=filters)
+        sess = antbeddb_async().new_session(session)
+        try:
+            await sess.execute(self.search_setting())
+            rows = (await sess.execute(q)).all()
+        finally:
+            if session is None:
+                await sess.close()
+        return self.search_records(rows)
+
+    def search_setting(self):
+        if self.conf.index == "ivfflat":
+            return text(f"SET LOCAL ivfflat.probes = {int(self.conf.ivfflat_probes)}")
+        return text(f"SET LOCAL hnsw.ef_search = {int(self.conf.hnsw_ef_search)}")
+
+    def search_query(
+        self, vector: Vector, query: list[float], *, model: str, limit: int, filters: dict[str, Any] | None
+    ):
+        dim = len(query)
+        vtype = PgVectorType(self.column_type(dim), dim)
+        # `<#>` is the negative inner product; the score follows Qdrant's DOT convention
+        distance = cast(POINTS.c.embedding, vtype).op("<#>", return_type=Float)(
+            cast(literal(self.to_literal(query)), vtype)
+        )
+        q = (
+            select(POINTS.c.embedding_id, POINTS.c.vfile_id, POINTS.c.payload, (distance * -1).label("score"))
+            .where(
+                POINTS.c.vector_id == vector.id,
+                # inlined so the planner, even with a generic plan, can match the partial index predicate
+                POINTS.c.model == literal(model, Text, literal_execute=True),
+                POINTS.c.dimensions == literal_column(str(dim)),
+            )
+            .order_by(distance)
+            .limit(limit)
+        )
+        if filters:
+            q = q.where(self.client.build_jsonb_filter(POINTS.c.payload["metadata"], filters))
+        return q
+
+    @staticmethod
+    def search_records(rows) -> list[SearchRecord]:
+        return [
+            SearchRecord(
+                id=str(row.embedding_id),
+                vfile_id=str(row.vfile_id),
+                chunk_id=str(row.embedding_id),
+                score=row.score,
+                payload=row.payload or {},
+            )
+            for row in rows
+        ]
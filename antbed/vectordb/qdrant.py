@@ -2,14 +2,31 @@ import logging
 from typing import Any
 
 import qdrant_client as qc
-from qdrant_client.models import Distance, PointStruct, VectorParams
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    IsEmptyCondition,
+    MatchValue,
+    PayloadField,
+    PointIdsList,
+    PointStruct,
+    SetPayload,
+    SetPayloadOperation,
+    VectorParams,
+)
 
 from antbed.clients.llm import qdrant_client
-from antbed.db.models import Embedding, Vector, VFile, VFileSplit
+from antbed.db.models import Embedding, Vector, VFile, VFileSplit, load_deferred
+from antbed.embedding import DUPLICATE_STATUS, PENDING_STATUS, VFileEmbedding
+from antbed.models import SearchRecord
 from antbed.vectordb.base import VectorDB
 
 logger = logging.getLogger(__name__)
 
+# payload keys that can change without the chunk's text, and its vector, changing
+SYNCED_PAYLOAD_KEYS = ("part", "char_start", "char_end", "vfile_split_id", "metadata", "parts")
+
 
 class VectorQdrant(VectorDB):
     def __init__(self, qdrant: qc.QdrantClient | None):
@@ -34,7 +51,7 @@ class VectorQdrant(VectorDB):
         subject_type, subject_id, vector_type = vector.subject_type, vector.subject_id, vector.vector_type
         vname = self.vector_id(subject_id, subject_type, vector_type)
         # metadata = {"subject_id": str(subject_id), "subject_type": subject_type, "type": vector_type}
-        self.create_collection(vname)
+        self.create_collection(vname, dim=kwargs.get("dim") or 3072)
         vector.external_provider = "qdrant"
         vector.external_id = vname
         return vector
@@ -74,26 +91,138 @@ class VectorQdrant(VectorDB):
             payload["char_end"] = emb.char_end
         return payload
 
+    def existing_points(self, collection: str, vfile: VFile) -> dict[str, dict[str, Any]]:
+        """Synced payload of the points of a vfile, by point id"""
+        existing: dict[str, dict[str, Any]] = {}
+        flt = Filter(must=[FieldCondition(key="vfile_id", match=MatchValue(value=str(vfile.id)))])
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection,
+                scroll_filter=flt,
+                limit=1000,
+                offset=offset,
+                with_payload=list(SYNCED_PAYLOAD_KEYS),
+                with_vectors=False,
+            )
+            existing.update({str(point.id): point.payload or {} for point in points})
+            if offset is None:
+                return existing
+
+    def points(self, vector: Vector, vsplit: VFileSplit, vfile: VFile, embs: list[Embedding]) -> list[PointStruct]:
+        # near-duplicates have no vector of their own, their representative's point stands for them
+        embs = [emb for emb in embs if emb.status != DUPLICATE_STATUS]
+        load_deferred(embs, Embedding.embedding_vector, Embedding.embedding_blob)
+        return [
+            PointStruct(id=str(emb.id), vector=emb.vector.tolist(), payload=self.payload(vector, vsplit, vfile, emb))
+            for emb in embs
+        ]
+
+    def upsert_points(self, vector: Vector, vsplit: VFileSplit, vfile: VFile, embs: list[Embedding]) -> None:
+        self.client.upsert(collection_name=str(vector.external_id), points=self.points(vector, vsplit, vfile, embs))
+
     def add_points(self, vector: Vector, vsplit: VFileSplit, vfile: VFile) -> str:
-        points = []
+        """Sync the points of a vfile with its split.
+
+        Points are keyed by embedding id, and a re-split keeps the id of unchanged chunks, so
+        only new chunks are upserted with their vector, moved chunks get their payload
+        updated, and points of chunks no longer in the split, or now near-duplicates, are deleted.
+        """
+        collection = str(vector.external_id)
         self.add_metacollection(vector, vsplit, vfile)
-        for emb in vsplit.embeddings:
+        existing = self.existing_points(collection, vfile)
+        embs = [emb for emb in vsplit.embeddings if emb.status != DUPLICATE_STATUS]
+        points = self.points(vector, vsplit, vfile, [emb for emb in embs if str(emb.id) not in existing])
+        updates = []
+        for emb in embs:
+            current = existing.get(str(emb.id))
+            if current is None:
+                continue
             payload = self.payload(vector, vsplit, vfile, emb)
-            point = PointStruct(id=str(emb.id), vector=emb.embedding_vector, payload=payload)
-            points.append(point)
-        self.client.upsert(collection_name=str(vector.external_id), points=points)
+            if any(current.get(key) != payload[key] for key in SYNCED_PAYLOAD_KEYS):
+                updates.append(SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[str(emb.id)])))
+        stale = list(existing.keys() - {str(emb.id) for emb in embs})
+        if points:
+            self.client.upsert(collection_name=collection, points=points)
+        if updates:
+            self.client.batch_update_points(collection_name=collection, update_operations=updates)
+        if stale:
+            self.client.delete(collection_name=collection, points_selector=PointIdsList(points=stale))
+        logger.info(
+            f"Synced {vfile.id} into {collection}: {len(points)} upserted, {len(updates)} updated, {len(stale)} deleted"
+        )
         return str(vector.id)
 
-    def reindex(self, vector: Vector, session=None) -> str:
+    @classmethod
+    def build_filter(cls, filter_spec: dict[str, Any], prefix: str = "metadata") -> Filter:
+        """Translate the JSONB filter spec of `DB.build_jsonb_filter` into a Qdrant filter on the vfile metadata"""
+        if "and" in filter_spec:
+            return Filter(must=[cls.build_filter(f, prefix) for f in filter_spec["and"]])
+        if "or" in filter_spec:
+            return Filter(should=[cls.build_filter(f, prefix) for f in filter_spec["or"]])
+        if "not" in filter_spec:
+            return Filter(must_not=[cls.build_filter(filter_spec["not"], prefix)])
+        if "exists" in filter_spec:
+            return Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key=f"{prefix}.{filter_spec['exists']}"))])
+        if "not_exists" in filter_spec:
+            return Filter(must=[IsEmptyCondition(is_empty=PayloadField(key=f"{prefix}.{filter_spec['not_exists']}"))])
+        return Filter(must=cls._contains(filter_spec.get("equals", filter_spec), prefix))
+
+    @classmethod
+    def _contains(cls, value: Any, key: str) -> list[Any]:
+        # JSONB containment: nested objects match key by key, every listed element must be present
+        if isinstance(value, dict):
+            return [cond for k, v in value.items() for cond in cls._contains(v, f"{key}.{k}")]
+        if isinstance(value, list):
+            return [cond for v in value for cond in cls._contains(v, key)]
+        return [FieldCondition(key=key, match=MatchValue(value=value))]
+
+    def search(
+        self,
+        vector: Vector,
+        query: list[float],
+        *,
+        model: str,
+        limit: int = 10,
+        filters: dict[str, Any] | None = None,
+        session=None,
+    ) -> list[SearchRecord]:
+        _ = model, session
+        res = self.client.query_points(
+            collection_name=str(vector.external_id),
+            query=query,
+            query_filter=self.build_filter(filters) if filters else None,
+            limit=limit,
+            with_payload=True,
+        )
+        return [
+            SearchRecord(
+                id=str(point.id),
+                vfile_id=(point.payload or {}).get("vfile_id"),
+                chunk_id=(point.payload or {}).get("part_id"),
+                score=point.score,
+                payload=point.payload or {},
+            )
+            for point in res.points
+        ]
+
+    def reindex(self, vector: Vector, embedder: VFileEmbedding | None = None, session=None) -> str:
         vector = self.create_vector(vector)
         vector.save(commit=True)
         for vf in vector.vfiles:
             split = (
                 VFileSplit.where(VFileSplit.vfile_id == vf.id, session=session)
                 .order_by(VFileSplit.created_at.desc())
+                .limit(1)
                 .scalars()
-                .one()
+                .first()
             )
+            if split is None:
+                continue
+            # Chunks without a vector go through the embedding cache instead of being upserted empty
+            if any(emb.status in PENDING_STATUS for emb in split.embeddings):
+                embedder = embedder or VFileEmbedding()
+                split = embedder.gen_vector(split, session=session)
             self.add_points(vector, vsplit=split, vfile=vf)
 
         return str(vector.id)
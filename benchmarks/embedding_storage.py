@@ -0,0 +1,74 @@
+"""Compare table size and load time of embedding vectors per storage encoding.
+
+Each encoding gets a scratch temporary table filled with the same random
+vectors; the float8 layout is the legacy `float[]` column, the others are the
+`bytea` blobs decoded with numpy. Needs the configured PostgreSQL. Run with:
+
+    uv run python -m benchmarks.embedding_storage --rows 5000 --dim 3072
+"""
+
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+from sqlalchemy import text
+
+from antbed.db.models import Embedding
+from antbed.store import antbeddb
+from antbed.vector_codec import VectorEncodingEnum, decode_vector, encode_vector
+
+app = typer.Typer()
+
+
+def fill(session, table: str, encoding: VectorEncodingEnum, vectors: np.ndarray, batch: int = 500) -> None:
+    column = "float8[]" if encoding == VectorEncodingEnum.ARRAY else "bytea"
+    session.execute(text(f"CREATE TEMP TABLE {table} (id serial PRIMARY KEY, v {column}, scale real)"))
+    for start in range(0, len(vectors), batch):
+        rows = []
+        for vector in vectors[start : start + batch]:
+            if encoding == VectorEncodingEnum.ARRAY:
+                rows.append({"v": vector.astype(np.float64).tolist(), "scale": None})
+            else:
+                blob, scale = encode_vector(vector, encoding)
+                rows.append({"v": blob, "scale": scale})
+        session.execute(text(f"INSERT INTO {table} (v, scale) VALUES (:v, :scale)"), rows)
+    session.execute(text(f"ANALYZE {table}"))
+
+
+def load(session, table: str, encoding: VectorEncodingEnum) -> float:
+    start = time.perf_counter()
+    rows = session.execute(text(f"SELECT v, scale FROM {table}")).all()
+    if encoding == VectorEncodingEnum.ARRAY:
+        matrix = np.asarray([row.v for row in rows], dtype=np.float32)
+    else:
+        matrix = np.stack([decode_vector(bytes(row.v), encoding, row.scale) for row in rows])
+    elapsed = time.perf_counter() - start
+    assert matrix.shape[0] == len(rows)
+    return elapsed
+
+
+@app.command()
+def main(
+    rows: Annotated[int, typer.Option(help="Number of vectors per table")] = 5000,
+    dim: Annotated[int, typer.Option(help="Vector dimensions")] = 3072,
+    repeat: Annotated[int, typer.Option(help="Load passes, the best one is reported")] = 3,
+) -> None:
+    db = antbeddb()
+    vectors = np.random.default_rng(0).standard_normal((rows, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    typer.echo(f"{rows} vectors x {dim} dims, {Embedding.__tablename__}.embedding_vector layouts")
+    typer.echo(f"{'encoding':<10} {'table size':>12} {'bytes/row':>10} {'load s':>8} {'rows/s':>10}")
+    with db.new_session() as session:
+        for encoding in VectorEncodingEnum:
+            table = f"bench_embedding_{encoding.value}"
+            fill(session, table, encoding, vectors)
+            size = session.execute(text(f"SELECT pg_total_relation_size('{table}')")).scalar_one()
+            best = min(load(session, table, encoding) for _ in range(repeat))
+            mb = size / 2**20
+            typer.echo(f"{encoding.value:<10} {mb:>10.1f}MB {size // rows:>10} {best:>8.2f} {rows / best:>10.0f}")
+        session.rollback()
+
+
+if __name__ == "__main__":
+    app()
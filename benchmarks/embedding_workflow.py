@@ -0,0 +1,108 @@
+"""Compare EmbeddingWorkflow history size and wall-clock time, per-chunk vs batched activities.
+
+Activities are stubs that sleep to simulate the provider round-trip, so the
+numbers isolate the orchestration cost. Run with:
+
+    uv run python -m benchmarks.embedding_workflow --parts 2000 --batch-size 128
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Annotated
+
+import typer
+from temporalio import activity
+from temporalio.client import Client
+from temporalio.testing import WorkflowEnvironment
+from temporalio.worker import Worker
+from temporalloop.converters.pydantic import pydantic_data_converter
+
+from antbed.models import (
+    EmbeddingBatchRequest,
+    EmbeddingBatchResponse,
+    EmbeddingRequest,
+    EmbeddingWorkflowInput,
+    UploadRequestIDs,
+)
+from antbed.temporal.workflows.embedding import EmbeddingWorkflow
+
+app = typer.Typer()
+
+
+class Stubs:
+    def __init__(self, parts: int, request_latency: float, chunk_latency: float) -> None:
+        self.split_id = uuid.uuid4()
+        self.embedding_ids = [uuid.uuid4() for _ in range(parts)]
+        self.request_latency = request_latency
+        self.chunk_latency = chunk_latency
+
+    def activities(self) -> list:
+        @activity.defn(name="get_or_create_split")
+        async def get_or_create_split(data: UploadRequestIDs) -> UploadRequestIDs:
+            data.vfile_split_id = self.split_id
+            data.embedding_ids = self.embedding_ids
+            return data
+
+        @activity.defn(name="embedding")
+        async def embedding(data: EmbeddingRequest) -> EmbeddingRequest:
+            await asyncio.sleep(self.request_latency + self.chunk_latency)
+            return EmbeddingRequest(embedding_id=data.embedding_id, status="complete")
+
+        @activity.defn(name="embedding_batch")
+        async def embedding_batch(data: EmbeddingBatchRequest) -> EmbeddingBatchResponse:
+            ids = self.embedding_ids[data.part_start : data.part_stop]
+            await asyncio.sleep(self.request_latency + self.chunk_latency * len(ids))
+            return EmbeddingBatchResponse(
+                vfile_split_id=data.vfile_split_id,
+                embeddings=[EmbeddingRequest(embedding_id=eid, status="complete") for eid in ids],
+            )
+
+        return [get_or_create_split, embedding, embedding_batch]
+
+
+async def run_once(client: Client, stubs: Stubs, batch_size: int) -> dict[str, float]:
+    task_queue = f"bench-embedding-{uuid.uuid4()}"
+    async with Worker(client, task_queue=task_queue, workflows=[EmbeddingWorkflow], activities=stubs.activities()):
+        start = time.perf_counter()
+        handle = await client.start_workflow(
+            EmbeddingWorkflow.run,
+            EmbeddingWorkflowInput(vfile_id=uuid.uuid4(), batch_size=batch_size),
+            id=f"bench-embedding-{uuid.uuid4()}",
+            task_queue=task_queue,
+        )
+        await handle.result()
+        elapsed = time.perf_counter() - start
+        history = await handle.fetch_history()
+        return {
+            "events": len(history.events),
+            "history_kb": len(history.to_json().encode()) / 1024,
+            "seconds": elapsed,
+        }
+
+
+async def bench(parts: int, batch_size: int, request_latency: float, chunk_latency: float) -> None:
+    env = await WorkflowEnvironment.start_local(data_converter=pydantic_data_converter)
+    try:
+        stubs = Stubs(parts, request_latency, chunk_latency)
+        for name, size in (("per-chunk", 0), (f"batched({batch_size})", batch_size)):
+            res = await run_once(env.client, stubs, size)
+            typer.echo(
+                f"{name:>16}: {res['events']:>6} events  {res['history_kb']:>9.1f} KiB  {res['seconds']:>7.2f} s"
+            )
+    finally:
+        await env.shutdown()
+
+
+@app.command()
+def main(
+    parts: Annotated[int, typer.Option(help="Number of chunks in the split")] = 2000,
+    batch_size: Annotated[int, typer.Option(help="Chunks per embedding_batch activity")] = 128,
+    request_latency: Annotated[float, typer.Option(help="Simulated seconds per provider request")] = 0.15,
+    chunk_latency: Annotated[float, typer.Option(help="Simulated extra seconds per chunk")] = 0.001,
+) -> None:
+    asyncio.run(bench(parts, batch_size, request_latency, chunk_latency))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,96 @@
+"""Time the split -> embed -> Qdrant -> search pipeline without network access.
+
+Vectors come from the local `hashing` provider and points go to an in-memory
+Qdrant with the payload layout of `VectorQdrant.add_points`, so a CPU profiler
+sees the same code paths as a real ingest. Run with:
+
+    uv run python -m benchmarks.ingest_pipeline --docs 20 --dim 1024
+    uv run python -m cProfile -s cumtime -m benchmarks.ingest_pipeline --docs 5
+"""
+
+import time
+import uuid
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from antbed.clients.embeddings import HashingEmbeddingClient
+from antbed.db.models import Vector
+from antbed.models import SplitterConfig
+from antbed.splitdoc import Splitter
+from antbed.vectordb.qdrant import VectorQdrant
+
+app = typer.Typer()
+
+# each document is a copy of the sample text
+SAMPLE = Path(__file__).parent.parent / "tests" / "data" / "englisch_bgb.txt"
+
+
+@app.command()
+def main(
+    docs: Annotated[int, typer.Option(help="Number of documents ingested")] = 20,
+    dim: Annotated[int, typer.Option(help="Vector dimensions")] = 1024,
+    chunk_size: Annotated[int, typer.Option(help="Splitter chunk size")] = 800,
+    batch_size: Annotated[int, typer.Option(help="Chunks per embeddings call")] = 512,
+    queries: Annotated[int, typer.Option(help="Number of timed queries")] = 100,
+) -> None:
+    text = SAMPLE.read_text()
+    splitter = Splitter(SplitterConfig(chunk_size=chunk_size))
+    embedder = HashingEmbeddingClient(dimensions=dim)
+    vectordb = VectorQdrant(QdrantClient(":memory:"))
+    vector = Vector(subject_id="bench", subject_type="benchmark", vector_type="all")
+    vector.id = uuid.uuid4()
+    vector = vectordb.create_vector(vector)
+    collection = str(vector.external_id)
+    vectordb.client.delete_collection(collection)
+    vectordb.create_collection(collection, dim=dim)
+
+    timings = {"split": 0.0, "embed": 0.0, "upsert": 0.0}
+    chunks = 0
+    for doc in range(docs):
+        start = time.perf_counter()
+        parts = splitter.split(text)
+        timings["split"] += time.perf_counter() - start
+        for offset in range(0, len(parts), batch_size):
+            batch = parts[offset : offset + batch_size]
+            start = time.perf_counter()
+            vectors = embedder.embed([part.content for part in batch], "hashing")
+            timings["embed"] += time.perf_counter() - start
+            start = time.perf_counter()
+            vectordb.client.upsert(
+                collection_name=collection,
+                points=[
+                    PointStruct(
+                        id=str(uuid.uuid4()),
+                        vector=values,
+                        payload={
+                            "vfile_id": str(uuid.uuid4()),
+                            "part": offset + i,
+                            "char_start": part.start,
+                            "char_end": part.stop,
+                            "metadata": {"doc": doc},
+                        },
+                    )
+                    for i, (part, values) in enumerate(zip(batch, vectors, strict=True))
+                ],
+            )
+            timings["upsert"] += time.perf_counter() - start
+        chunks += len(parts)
+    typer.echo(f"{docs} docs, {chunks} chunks x {dim} dims")
+    for stage, elapsed in timings.items():
+        typer.echo(f"{stage:<8} {elapsed:>8.2f}s {chunks / elapsed if elapsed else 0:>10.0f} chunks/s")
+
+    words = text.split()
+    start = time.perf_counter()
+    for i in range(queries):
+        query = " ".join(words[(i * 37) % len(words) :][:12])
+        vectordb.search(vector, embedder.embed([query], "hashing")[0], model="hashing", limit=10)
+    elapsed = time.perf_counter() - start
+    typer.echo(f"search   {elapsed:>8.2f}s {1000 * elapsed / queries:>8.1f}ms/query")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,84 @@
+"""Measure search latency against a local in-memory Qdrant.
+
+Points carry the same payload layout as `VectorQdrant.add_points`, and queries go
+through `VectorQdrant.search`, including the metadata filter translation. The
+query embedding is a random vector, so the provider round-trip is excluded. Run with:
+
+    uv run python -m benchmarks.search_latency --points 50000 --dim 1536 --queries 200
+"""
+
+import time
+import uuid
+from typing import Annotated
+
+import numpy as np
+import typer
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from antbed.db.models import Vector
+from antbed.vectordb.qdrant import VectorQdrant
+
+app = typer.Typer()
+
+TENANTS = ["alpha", "beta", "gamma", "delta"]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    return float(np.percentile(np.asarray(samples) * 1000, pct))
+
+
+@app.command()
+def main(
+    points: Annotated[int, typer.Option(help="Number of chunks indexed")] = 50_000,
+    dim: Annotated[int, typer.Option(help="Vector dimensions")] = 1536,
+    queries: Annotated[int, typer.Option(help="Number of timed queries")] = 200,
+    limit: Annotated[int, typer.Option(help="Hits per query")] = 40,
+    filtered: Annotated[bool, typer.Option(help="Restrict queries with a metadata filter")] = True,
+) -> None:
+    rng = np.random.default_rng(0)
+    vectordb = VectorQdrant(QdrantClient(":memory:"))
+    vector = Vector(subject_id="bench", subject_type="benchmark", vector_type="all")
+    vector.id = uuid.uuid4()
+    vector = vectordb.create_vector(vector)
+    vectordb.create_collection(str(vector.external_id), dim=dim)
+
+    start = time.perf_counter()
+    for offset in range(0, points, 1000):
+        batch = rng.standard_normal((min(1000, points - offset), dim), dtype=np.float32)
+        batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+        vectordb.client.upsert(
+            collection_name=str(vector.external_id),
+            points=[
+                PointStruct(
+                    id=str(uuid.uuid4()),
+                    vector=values.tolist(),
+                    payload={
+                        "vfile_id": str(uuid.uuid4()),
+                        "part_id": str(uuid.uuid4()),
+                        "part": i,
+                        "metadata": {"tenant": TENANTS[(offset + i) % len(TENANTS)]},
+                    },
+                )
+                for i, values in enumerate(batch)
+            ],
+        )
+    typer.echo(f"Indexed {points} points x {dim} dims in {time.perf_counter() - start:.1f}s")
+
+    filters = {"tenant": "alpha"} if filtered else None
+    samples = []
+    for _ in range(queries):
+        query = rng.standard_normal(dim, dtype=np.float32)
+        query /= np.linalg.norm(query)
+        start = time.perf_counter()
+        hits = vectordb.search(vector, query.tolist(), model="bench", limit=limit, filters=filters)
+        samples.append(time.perf_counter() - start)
+        assert len(hits) == limit
+    typer.echo(
+        f"{queries} queries, limit {limit}, filtered={filtered}: "
+        f"p50 {percentile(samples, 50):.1f}ms p95 {percentile(samples, 95):.1f}ms p99 {percentile(samples, 99):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,70 @@
+"""Compare writing the chunk rows of a split one ORM object at a time vs in bulk.
+
+The document is split once; each pass then writes all its chunks inside a
+savepoint that is rolled back, either through `Embedding.add` per chunk and a
+flush (the former `VFileEmbedding.prepare`) or with `VFileEmbedding.insert_embeddings`.
+Needs the configured PostgreSQL. Run with:
+
+    uv run python -m benchmarks.split_insert --chunk-size 200 --repeat 5
+"""
+
+import time
+import uuid
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from antbed.db.models import Embedding, VFile, VFileSplit
+from antbed.embedding import VFileEmbedding
+from antbed.models import SplitterConfig
+from antbed.splitdoc import Splitter
+from antbed.store import antbeddb
+
+app = typer.Typer()
+
+DEFAULT_DOC = Path(__file__).parent.parent / "tests" / "data" / "englisch_bgb.txt"
+
+
+def orm_insert(split: VFileSplit, vfile: VFile, docs, session) -> None:
+    for i, doc in enumerate(docs):
+        Embedding.add(VFileEmbedding.new_embedding(split, vfile, doc, i, "new"), commit=False, session=session)
+    session.flush()
+
+
+def bulk_insert(split: VFileSplit, vfile: VFile, docs, session) -> None:
+    embs = [VFileEmbedding.new_embedding(split, vfile, doc, i, "new") for i, doc in enumerate(docs)]
+    VFileEmbedding.insert_embeddings(embs, session)
+
+
+@app.command()
+def main(
+    path: Annotated[Path, typer.Option(help="Document to split")] = DEFAULT_DOC,
+    chunk_size: Annotated[int, typer.Option(help="Splitter chunk size")] = 200,
+    repeat: Annotated[int, typer.Option(help="Passes per method, the best one is reported")] = 5,
+) -> None:
+    text = path.read_text()
+    docs = Splitter(SplitterConfig(chunk_size=chunk_size)).split(text)
+    typer.echo(f"{path.name}: {len(text)} chars, {len(docs)} chunks of {chunk_size}")
+    with antbeddb().new_session() as session:
+        vfile = VFile(subject_id=f"bench-{uuid.uuid4()}", subject_type="benchmark", pages=[text])
+        vfile.id = uuid.uuid4()
+        split = VFileSplit(id=uuid.uuid4(), vfile_id=vfile.id, parts=len(docs))
+        VFile.add(vfile, commit=False, session=session)
+        VFileSplit.add(split, commit=False, session=session)
+        session.flush()
+        for name, method in (("orm", orm_insert), ("bulk", bulk_insert)):
+            samples = []
+            for _ in range(repeat):
+                savepoint = session.begin_nested()
+                start = time.perf_counter()
+                method(split, vfile, docs, session)
+                samples.append(time.perf_counter() - start)
+                savepoint.rollback()
+            best = min(samples)
+            typer.echo(f"{name:<5} {best * 1000:>8.1f}ms {len(docs) / best:>10.0f} rows/s")
+        session.rollback()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,86 @@
+"""Compare langchain's splitters with the native SpanSplitter on a large document.
+
+For the recursive and character types, in character and token mode, the document is
+split by `create_documents(..., add_start_index=True)` and by `SpanSplitter.split`. The
+chunk texts must match; offsets only differ where langchain's search lands on another
+occurrence of the chunk, or on none (-1), and those chunks are counted. The last line
+compares the serial split with `Splitter.split_parallel` across the process pool. Run with:
+
+    uv run python -m benchmarks.splitters --scale 4 --chunk-size 800
+"""
+
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from antbed.models import SplitDocument, SplitterConfig, SplitterType
+from antbed.splitdoc import Splitter, split_pool
+
+app = typer.Typer()
+
+DEFAULT_DOC = Path(__file__).parent.parent / "tests" / "data" / "englisch_bgb.txt"
+
+
+def langchain_split(splitter: Splitter, text: str) -> list[SplitDocument]:
+    docs = splitter.text_splitter.create_documents([text])
+    return [
+        SplitDocument(
+            start=doc.metadata["start_index"],
+            stop=doc.metadata["start_index"] + len(doc.page_content),
+            content=doc.page_content,
+        )
+        for doc in docs
+    ]
+
+
+@app.command()
+def main(
+    path: Annotated[Path, typer.Option(help="Document to split")] = DEFAULT_DOC,
+    scale: Annotated[int, typer.Option(help="Repeat the document this many times")] = 4,
+    chunk_size: Annotated[int, typer.Option(help="Splitter chunk size")] = 800,
+    overlap: Annotated[int, typer.Option(help="Chunk overlap, in percent")] = 50,
+) -> None:
+    text = path.read_text() * scale
+    typer.echo(f"{path.name} x{scale}: {len(text)} chars, chunk size {chunk_size}, overlap {overlap}%")
+    typer.echo(f"{'splitter':<16} {'chunks':>7} {'langchain s':>12} {'native s':>9} {'speedup':>8} {'offsets':>8}")
+    for splitter_type in (SplitterType.RECURSIVE, SplitterType.CHAR):
+        for token_splitter in (False, True):
+            splitter = Splitter(
+                SplitterConfig(
+                    chunk_size=chunk_size,
+                    chunk_overlap_perc=overlap,
+                    splitter_type=splitter_type,
+                    token_splitter=token_splitter,
+                )
+            )
+            assert splitter.span_splitter is not None
+            start = time.perf_counter()
+            expected = langchain_split(splitter, text)
+            langchain = time.perf_counter() - start
+            start = time.perf_counter()
+            docs = splitter.span_splitter.split(text)
+            native = time.perf_counter() - start
+            assert [doc.content for doc in docs] == [doc.content for doc in expected]
+            moved = sum(a.start != b.start for a, b in zip(docs, expected, strict=True))
+            name = f"{splitter_type.value}{'/tokens' if token_splitter else ''}"
+            typer.echo(
+                f"{name:<16} {len(docs):>7} {langchain:>12.2f} {native:>9.2f} {langchain / native:>7.1f}x {moved:>8}"
+            )
+
+    # native serial split vs partitions split across the process pool; the pool is started first
+    splitter = Splitter(SplitterConfig(chunk_size=chunk_size, chunk_overlap_perc=overlap))
+    split_pool().submit(int).result()
+    start = time.perf_counter()
+    expected = splitter.split_serial(text)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    docs = splitter.split_parallel(text)
+    parallel = time.perf_counter() - start
+    assert docs == expected
+    typer.echo(f"parallel: {len(docs)} chunks, serial {serial:.2f}s, pool {parallel:.2f}s, {serial / parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    app()
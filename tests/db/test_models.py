@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import inspect
+
+from antbed.db.models import Embedding, Summary, VFile, token_counts
+from antbed.encoders import count_tokens, count_tokens_batch
+
+
+@pytest.fixture(autouse=True)
+def clear_token_counts():
+    token_counts().clear()
+    yield
+    token_counts().clear()
+
+
+def test_update_tokens_encodes_once():
+    vfile = VFile(subject_id="doc1", pages=["hello world", "second page"])
+    with patch("antbed.db.models.count_tokens", wraps=count_tokens) as counter:
+        vfile.update_tokens()
+        vfile.update_tokens()
+    assert counter.call_count == 1
+    assert vfile.tokens == count_tokens("hello world\nsecond page")
+    assert vfile.tokens_hash == VFile.pages_hash(vfile.pages)
+
+    # same content in another row: counted from the memo
+    other = VFile(subject_id="doc2", pages=["hello world", "second page"])
+    with patch("antbed.db.models.count_tokens") as counter:
+        other.update_tokens()
+    counter.assert_not_called()
+    assert other.tokens == vfile.tokens
+
+
+def test_update_tokens_content_changed():
+    summary = Summary(summary="a short summary")
+    summary.update_tokens()
+    first = summary.tokens
+    summary.summary = "a short summary, now with a few more words"
+    summary.update_tokens()
+    assert summary.tokens is not None and first is not None
+    assert summary.tokens > first
+
+
+def test_update_tokens_many_batches():
+    vfiles = [VFile(subject_id=f"doc{i}", pages=[f"page {i % 2}"]) for i in range(4)]
+    with patch("antbed.db.models.count_tokens_batch", wraps=count_tokens_batch) as batch:
+        VFile.update_tokens_many(vfiles)
+        VFile.update_tokens_many(vfiles)
+    # one batch of the two distinct texts, nothing left to count the second time
+    batch.assert_called_once()
+    assert sorted(batch.call_args.args[0]) == ["page 0", "page 1"]
+    assert all(vfile.tokens == count_tokens(vfile.pages[0]) for vfile in vfiles)
+
+
+def test_embedding_primary_key_has_partition_key():
+    # like the partitioned table, so the unit of work's UPDATE and DELETE filter on the partition key
+    assert {col.name for col in inspect(Embedding).primary_key} == {"id", Embedding.partition_key}
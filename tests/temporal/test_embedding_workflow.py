@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+from temporalio import activity
+from temporalio.client import Client
+from temporalio.worker import Worker
+
+from antbed.models import (
+    EmbeddingBatchRequest,
+    EmbeddingBatchResponse,
+    EmbeddingRequest,
+    EmbeddingWorkflowInput,
+    UploadRequestIDs,
+)
+from antbed.temporal.workflows.embedding import EmbeddingWorkflow
+
+PARTS = 40
+SPLIT_ID = uuid.uuid4()
+EMBEDDING_IDS = [uuid.uuid4() for _ in range(PARTS)]
+
+
+@activity.defn(name="get_or_create_split")
+async def get_or_create_split_mock(data: UploadRequestIDs) -> UploadRequestIDs:
+    data.vfile_split_id = SPLIT_ID
+    data.embedding_ids = EMBEDDING_IDS
+    return data
+
+
+@activity.defn(name="embedding")
+async def embedding_mock(data: EmbeddingRequest) -> EmbeddingRequest:
+    # embedded with the split's provider and config, like the batches
+    assert data.config is not None
+    assert data.embedding_provider == data.config.embedding_provider
+    return EmbeddingRequest(embedding_id=data.embedding_id, status="complete")
+
+
+@activity.defn(name="embedding_batch")
+async def embedding_batch_mock(data: EmbeddingBatchRequest) -> EmbeddingBatchResponse:
+    ids = EMBEDDING_IDS[data.part_start : data.part_stop]
+    return EmbeddingBatchResponse(
+        vfile_split_id=data.vfile_split_id,
+        embeddings=[EmbeddingRequest(embedding_id=eid, status="complete") for eid in ids],
+    )
+
+
+async def run_embedding_workflow(client: Client, batch_size: int) -> tuple[list[EmbeddingRequest], int]:
+    task_queue = f"test-embedding-{uuid.uuid4()}"
+    async with Worker(
+        client,
+        task_queue=task_queue,
+        workflows=[EmbeddingWorkflow],
+        activities=[get_or_create_split_mock, embedding_mock, embedding_batch_mock],
+    ):
+        handle = await client.start_workflow(
+            EmbeddingWorkflow.run,
+            EmbeddingWorkflowInput(vfile_id=uuid.uuid4(), batch_size=batch_size),
+            id=f"embedding-{uuid.uuid4()}",
+            task_queue=task_queue,
+        )
+        result = await handle.result()
+        history = await handle.fetch_history()
+        return result, len(history.events)
+
+
+@pytest.mark.asyncio
+async def test_embedding_workflow_batches(client: Client):
+    per_chunk, per_chunk_events = await run_embedding_workflow(client, batch_size=0)
+    batched, batched_events = await run_embedding_workflow(client, batch_size=16)
+
+    assert sorted(e.embedding_id for e in batched) == sorted(EMBEDDING_IDS)
+    assert sorted(e.embedding_id for e in per_chunk) == sorted(EMBEDDING_IDS)
+    assert all(e.status == "complete" for e in batched)
+    # 3 batch activities instead of 40 chunk activities
+    assert batched_events * 4 < per_chunk_events
@@ -0,0 +1,39 @@
+import uuid
+
+import pytest
+
+from antbed.dedup import LSHIndex, MinHashLSH
+
+TEXT = (
+    "The seller is obliged to deliver the thing to the buyer free from material defects and defects of title. "
+    "The buyer is obliged to pay the seller the agreed purchase price and to accept delivery of the thing."
+)
+
+
+def test_minhash_similarity():
+    lsh = MinHashLSH()
+    quoted = TEXT.replace("agreed", "agreed upon")
+    other = "Pages of an unrelated thread about the schedule of the next release and its open questions."
+
+    assert lsh.similarity(lsh.signature(TEXT), lsh.signature(TEXT.upper())) == 1.0
+    assert lsh.similarity(lsh.signature(TEXT), lsh.signature(quoted)) > 0.7
+    assert lsh.similarity(lsh.signature(TEXT), lsh.signature(other)) < 0.1
+    assert len(lsh.band_keys(lsh.signature(TEXT))) == lsh.bands
+    # fewer words than a shingle still get a signature
+    assert lsh.signature("two words").shape == (lsh.num_perm,)
+
+
+def test_minhash_bands_divide_permutations():
+    with pytest.raises(ValueError):
+        MinHashLSH(num_perm=100, bands=16)
+
+
+def test_lsh_index_query():
+    lsh = MinHashLSH(threshold=0.8)
+    index = LSHIndex(lsh)
+    first, second = uuid.uuid4(), uuid.uuid4()
+    index.add(first, lsh.signature(TEXT))
+    index.add(second, lsh.signature(TEXT + " The risk passes on delivery."))
+
+    assert index.query(lsh.signature(TEXT + " ")) == first
+    assert index.query(lsh.signature("Something else entirely, with enough words to shingle.")) is None
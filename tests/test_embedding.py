@@ -1,7 +1,20 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+import numpy as np
+import pytest
+
+from antbed.clients.embeddings import AsyncEmbeddingClient, HashingEmbeddingClient, embedding_client
+from antbed.config import EmbeddingProviderConfig, config
 from antbed.db.models import Embedding, VFile, VFileSplit
-from antbed.embedding import VFileEmbedding
+from antbed.dedup import MinHashLSH
+from antbed.embedding import DUPLICATE_STATUS, VFileEmbedding, streaming_hash
+from antbed.models import SplitDocument, SplitterConfig
+from antbed.splitdoc import Splitter
 
 
 @patch("antbed.embedding.embedding_client")
@@ -26,7 +39,7 @@ def test_vfile_embedding_embedding(mock_embedding_client_factory):
 
         assert result_emb.status == "complete"
         assert result_emb.embedding_vector == [0.1, 0.2, 0.3]
-        mock_embedding_client.embed.assert_called_once_with(["some text"], "text-embedding-3-large")
+        mock_embedding_client.embed.assert_called_once_with(["some text"], "text-embedding-3-large", dimensions=None)
         mock_add.assert_called_once()
 
 
@@ -43,7 +56,7 @@ def test_embedding_vfile(mock_gen_vector, mock_prepare):
     # Test without skipping
     result = embedder.embedding_vfile(vfile, skip=False)
     mock_prepare.assert_called_with(vfile, skip=False, session=None)
-    mock_gen_vector.assert_called_with(mock_vsplit, session=None)
+    mock_gen_vector.assert_called_with(mock_vsplit, session=None, vector_id=None)
     assert result == mock_vsplit
 
     # Test with skipping
@@ -52,3 +65,333 @@ def test_embedding_vfile(mock_gen_vector, mock_prepare):
     mock_prepare.assert_called_with(vfile, skip=True, session=None)
     mock_gen_vector.assert_not_called()
     assert result_skipped == mock_vsplit
+
+
+@patch("antbed.embedding.embedding_client")
+def test_gen_vector_batches(mock_embedding_client_factory):
+    mock_embedding_client = MagicMock()
+    mock_embedding_client.embed.side_effect = lambda texts, model, dimensions: [[float(len(t))] for t in texts]
+    mock_embedding_client_factory.return_value = mock_embedding_client
+
+    vsplit = VFileSplit(model="text-embedding-3-large", info={"splitter": {"dimensions": 256}})
+    vsplit.embeddings = [
+        Embedding(content="x" * (i + 1), status="complete" if i == 2 else "new", part_number=i) for i in range(5)
+    ]
+
+    embedder = VFileEmbedding()
+    embedder.provider_conf.max_batch_size = 2
+
+    with patch("antbed.db.models.Embedding.add") as mock_add, patch("antbed.db.models.Embedding.new_session"):
+        embedder.gen_vector(vsplit)
+
+    # 4 pending chunks, at most 2 per request
+    assert mock_embedding_client.embed.call_count == 2
+    mock_embedding_client.embed.assert_any_call(["x", "xx"], "text-embedding-3-large", dimensions=256)
+    mock_embedding_client.embed.assert_any_call(["xxxx", "xxxxx"], "text-embedding-3-large", dimensions=256)
+    assert mock_add.call_count == 4
+    assert [emb.embedding_vector for emb in vsplit.embeddings] == [[1.0], [2.0], [], [4.0], [5.0]]
+    assert all(emb.status == "complete" for emb in vsplit.embeddings)
+
+
+@patch("antbed.embedding.embedding_client")
+def test_iter_batches_token_limit(mock_embedding_client_factory):
+    mock_embedding_client_factory.return_value = MagicMock()
+    embedder = VFileEmbedding()
+    embedder.provider_conf.max_batch_tokens = 10
+    embs = [Embedding(content="hello " * 4, part_number=i) for i in range(5)]
+
+    with patch.object(VFileEmbedding, "count_tokens", side_effect=lambda texts, model: [5] * len(texts)):
+        batches = list(embedder.iter_batches(embs))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [emb for batch in batches for emb in batch] == embs
+
+
+def test_async_embedding_client_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def create(input, model):  # pylint: disable=redefined-builtin
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+    client = AsyncEmbeddingClient(SimpleNamespace(embeddings=SimpleNamespace(create=create)), max_concurrency=2)
+    vectors = client.embed_many([["a"], ["bb", "c"], ["ddd"], ["eeee"]], "text-embedding-3-large")
+
+    assert vectors == [[[1.0]], [[2.0], [1.0]], [[3.0]], [[4.0]]]
+    assert peak == 2
+    assert client.embed(["xy"], "text-embedding-3-large") == [[2.0]]
+
+
+@patch("antbed.embedding.embedding_client")
+def test_gen_vector_async_client(mock_embedding_client_factory):
+    mock_embedding_client = MagicMock(spec=AsyncEmbeddingClient)
+    mock_embedding_client.embed_many.side_effect = lambda batches, model, dimensions: [
+        [[float(len(t))] for t in texts] for texts in batches
+    ]
+    mock_embedding_client_factory.return_value = mock_embedding_client
+
+    vsplit = VFileSplit(model="text-embedding-3-large")
+    vsplit.embeddings = [Embedding(content="x" * (i + 1), status="new", part_number=i) for i in range(3)]
+
+    embedder = VFileEmbedding()
+    embedder.cache = None
+    embedder.provider_conf.max_batch_size = 2
+
+    with patch("antbed.db.models.Embedding.add"), patch("antbed.db.models.Embedding.new_session"):
+        embedder.gen_vector(vsplit)
+
+    mock_embedding_client.embed_many.assert_called_once_with(
+        [["x", "xx"], ["xxx"]], "text-embedding-3-large", dimensions=None
+    )
+    mock_embedding_client.embed.assert_not_called()
+    assert [emb.embedding_vector for emb in vsplit.embeddings] == [[1.0], [2.0], [3.0]]
+
+
+def test_hashing_embedding_client():
+    client = HashingEmbeddingClient(dimensions=256)
+    vectors = client.embed(["the quick brown fox", "the quick brown fox", "the quick brown dog", ""], "any")
+
+    assert len(vectors[0]) == 256
+    assert vectors[0] == vectors[1]
+    assert np.linalg.norm(vectors[0]) == pytest.approx(1.0)
+    assert vectors[3] == [0.0] * 256
+    # shared words score higher than unrelated text
+    unrelated = client.embed(["lorem ipsum dolor sit"], "any")[0]
+    assert np.dot(vectors[0], vectors[2]) > np.dot(vectors[0], unrelated)
+
+
+def test_embedding_client_hashing_provider():
+    providers = config().embeddings.providers
+    providers["local"] = EmbeddingProviderConfig(name="hashing", dimensions=64)
+    try:
+        client = embedding_client("local")
+        assert isinstance(client, HashingEmbeddingClient)
+        assert len(client.embed(["hello"], "hashing")[0]) == 64
+    finally:
+        del providers["local"]
+        embedding_client.cache_clear()
+
+
+@patch("antbed.embedding.embedding_client")
+def test_resplit_reuses_unchanged_chunks(mock_embedding_client_factory):
+    _ = mock_embedding_client_factory
+    vfile = VFile(subject_id="doc", subject_type="test", pages=["x a c"])
+    vfile.content_hash = VFile.pages_hash(vfile.pages)
+    vsplit = VFileSplit(model="text-embedding-3-small", parts=3, content_hash="old")
+    old = [
+        Embedding(id=f"e{i}", content=text, status="complete", embedding_vector=[float(i)], part_number=i)
+        for i, text in enumerate(["a", "b", "c"])
+    ]
+    vsplit.embeddings = list(old)
+    docs = [SplitDocument(start=2 * i, stop=2 * i + 1, content=text) for i, text in enumerate(["x", "a", "c"])]
+
+    with patch("antbed.db.models.VFileSplit.add"):
+        VFileEmbedding().resplit(vsplit, vfile, docs, "new", MagicMock())
+
+    by_part = sorted(vsplit.embeddings, key=lambda emb: emb.part_number)
+    assert [emb.content for emb in by_part] == ["x", "a", "c"]
+    assert [emb.id for emb in by_part[1:]] == ["e0", "e2"]
+    assert [emb.status for emb in by_part] == ["new", "complete", "complete"]
+    assert by_part[1].embedding_vector == [0.0]
+    assert (by_part[1].char_start, by_part[1].char_end) == (2, 3)
+    assert vsplit.parts == 3
+    assert vsplit.content_hash == vfile.content_hash
+
+
+QUOTED = (
+    "Thanks, the contract is attached. The seller delivers the goods by the end of the month and the buyer "
+    "pays the agreed price within thirty days of the invoice."
+)
+
+
+@patch("antbed.embedding.embedding_client")
+def test_mark_duplicates(mock_embedding_client_factory):
+    _ = mock_embedding_client_factory
+    embedder = VFileEmbedding()
+    embedder.dedup = MinHashLSH(threshold=0.8)
+    texts = [QUOTED, "An unrelated reply about the meeting on Tuesday.", "> " + QUOTED, QUOTED + " Regards"]
+    embs = [Embedding(id=uuid.uuid4(), content=text, status="new", part_number=i) for i, text in enumerate(texts)]
+
+    assert embedder.mark_duplicates(embs) == 2
+
+    assert [emb.status for emb in embs] == ["new", "new", DUPLICATE_STATUS, DUPLICATE_STATUS]
+    assert [emb.duplicate_of for emb in embs] == [None, None, embs[0].id, embs[0].id]
+    assert all(len(emb.minhash_bands) == embedder.dedup.bands for emb in embs)
+
+    # a chunk that already has a vector stays the representative of a re-split
+    embs[3].status, embs[3].duplicate_of = "complete", None
+    embedder.mark_duplicates(embs)
+    assert [emb.duplicate_of for emb in embs] == [embs[3].id, None, embs[3].id, None]
+
+
+@patch("antbed.embedding.embedding_client")
+def test_gen_vector_links_vector_duplicates(mock_embedding_client_factory):
+    mock_embedding_client = MagicMock()
+    mock_embedding_client.embed.side_effect = lambda texts, model, dimensions: [[0.5]] * len(texts)
+    mock_embedding_client_factory.return_value = mock_embedding_client
+    embedder = VFileEmbedding()
+    embedder.cache = None
+    embedder.dedup = MinHashLSH(threshold=0.8)
+    vsplit = VFileSplit(model="text-embedding-3-large")
+    vsplit.id = uuid.uuid4()
+    embs = [
+        Embedding(id=uuid.uuid4(), content=text, status="new", part_number=i)
+        for i, text in enumerate([QUOTED + " Best", "An unrelated reply about the meeting on Tuesday."])
+    ]
+    vsplit.embeddings = list(embs)
+    # a chunk of another document of the vector
+    other = SimpleNamespace(id=uuid.uuid4(), content=QUOTED, minhash_bands=None)
+    session = MagicMock()
+    session.execute.return_value = [other]
+
+    with patch("antbed.db.models.Embedding.add"), patch("antbed.db.models.Embedding.new_session", return_value=session):
+        embedder.gen_vector(vsplit, session=session, vector_id=uuid.uuid4())
+
+    assert (embs[0].status, embs[0].duplicate_of) == (DUPLICATE_STATUS, other.id)
+    assert embs[1].status == "complete"
+    mock_embedding_client.embed.assert_called_once_with([embs[1].content], "text-embedding-3-large", dimensions=None)
+
+
+def test_insert_embeddings_bulk():
+    vfile = VFile(subject_id="doc", subject_type="test")
+    vfile.id = uuid.uuid4()
+    vsplit = VFileSplit(model="text-embedding-3-small")
+    vsplit.id = uuid.uuid4()
+    docs = [SplitDocument(start=i, stop=i + 1, content=text) for i, text in enumerate("abc")]
+    embs = [VFileEmbedding.new_embedding(vsplit, vfile, doc, i, "new") for i, doc in enumerate(docs)]
+    session = MagicMock()
+    session.execute.return_value.scalars.return_value = iter([emb.id for emb in embs])
+
+    assert VFileEmbedding.insert_embeddings(embs, session) == [emb.id for emb in embs]
+
+    # one statement for all the rows, after the split is flushed
+    session.flush.assert_called_once()
+    session.execute.assert_called_once()
+    stmt, rows = session.execute.call_args.args
+    assert stmt.is_insert
+    assert [row["part_number"] for row in rows] == [0, 1, 2]
+    assert {row["vfile_split_id"] for row in rows} == {vsplit.id}
+    assert rows[1]["content"] == "b"
+    assert rows[1]["status"] == "new"
+    assert "created_at" not in rows[1]
+
+
+@patch("antbed.embedding.embedding_client")
+def test_embedding_stream(mock_embedding_client_factory):
+    mock_embedding_client = MagicMock()
+    mock_embedding_client.embed.side_effect = lambda texts, model, dimensions=None: [[0.5]] * len(texts)
+    mock_embedding_client_factory.return_value = mock_embedding_client
+    embedder = VFileEmbedding()
+    embedder.cache = None
+    embedder.provider_conf = embedder.provider_conf.model_copy(update={"max_batch_size": 2})
+    embedder.splitter = MagicMock()
+    embedder.splitter.split_iter.return_value = iter(
+        [SplitDocument(start=i, stop=i + 1, content=text) for i, text in enumerate("abcde")]
+    )
+    vfile = VFile(subject_id="doc", subject_type="test", pages=["abcde"])
+    vfile.id = uuid.uuid4()
+    session = MagicMock()
+    batches = []
+
+    with (
+        patch.object(VFileEmbedding, "find_split", return_value=None),
+        patch.object(VFileEmbedding, "new_split", return_value=VFileSplit(model="m", parts=0)),
+        patch.object(VFileEmbedding, "insert_embeddings") as mock_insert,
+        patch("antbed.db.models.VFileSplit.add"),
+        patch("antbed.db.models.VFile.add"),
+    ):
+        split = embedder.embedding_stream(vfile, lambda _, embs: batches.append(embs), session=session)
+
+    # each batch is embedded and written before the next one is split
+    assert [[emb.content for emb in embs] for embs in batches] == [["a", "b"], ["c", "d"], ["e"]]
+    assert [call.args[0] for call in mock_insert.call_args_list] == batches
+    assert all(emb.status == "complete" for embs in batches for emb in embs)
+    assert [emb.part_number for embs in batches for emb in embs] == [0, 1, 2, 3, 4]
+    assert split.parts == 5
+
+
+@patch("antbed.embedding.embedding_client")
+def test_embedding_stream_interrupted(mock_embedding_client_factory):
+    mock_embedding_client = MagicMock()
+    mock_embedding_client.embed.side_effect = lambda texts, model, dimensions=None: [[0.5]] * len(texts)
+    mock_embedding_client_factory.return_value = mock_embedding_client
+    embedder = VFileEmbedding()
+    embedder.cache = None
+    embedder.provider_conf = embedder.provider_conf.model_copy(update={"max_batch_size": 2})
+    embedder.splitter = MagicMock()
+    embedder.splitter.split_iter.side_effect = lambda _: iter(
+        [SplitDocument(start=i, stop=i + 1, content=text) for i, text in enumerate("abcde")]
+    )
+    vfile = VFile(subject_id="doc", subject_type="test", pages=["abcde"])
+    vfile.id = uuid.uuid4()
+    vfile.content_hash = "hash"
+    split = VFileSplit(id=uuid.uuid4(), vfile_id=vfile.id, model="m", parts=0)
+    session = MagicMock()
+    batches = []
+
+    def on_batch(_, embs):
+        if embs[0].content == "c":
+            raise RuntimeError("vector store down")
+        batches.append(embs)
+
+    with (
+        patch.object(VFileEmbedding, "find_split", return_value=None),
+        patch.object(VFileEmbedding, "new_split", return_value=split),
+        patch.object(VFileEmbedding, "insert_embeddings"),
+        patch("antbed.db.models.VFileSplit.add"),
+        patch("antbed.db.models.VFile.add"),
+        pytest.raises(RuntimeError),
+    ):
+        embedder.embedding_stream(vfile, on_batch, session=session)
+
+    # the first two batches are stored, but the split isn't taken as complete
+    assert split.parts == 4
+    assert split.content_hash == streaming_hash("hash")
+    session.execute.return_value.scalar.return_value = 3
+
+    with (
+        patch.object(VFileEmbedding, "find_split", return_value=split),
+        patch.object(VFileEmbedding, "insert_embeddings") as mock_insert,
+        patch("antbed.db.models.VFileSplit.add"),
+        patch.object(VFileEmbedding, "embedding_vfile") as mock_embedding_vfile,
+    ):
+        embedder.embedding_stream(vfile, lambda _, embs: batches.append(embs), session=session)
+
+    # the retry resumes after the last stored part and then marks the split complete
+    mock_embedding_vfile.assert_not_called()
+    assert [emb.content for emb in mock_insert.call_args.args[0]] == ["e"]
+    assert [emb.part_number for embs in batches for emb in embs] == [0, 1, 4]
+    assert split.parts == 5
+    assert split.content_hash == "hash"
+
+
+@patch("antbed.embedding.embedding_client")
+def test_prepare_splits_large_documents_in_parallel(mock_embedding_client_factory):
+    _ = mock_embedding_client_factory
+    pages = Path("tests/data/englisch_bgb.txt").read_text()[:300_000].split("\n")
+    splitter = Splitter(SplitterConfig(chunk_size=300, parallel_threshold=100_000))
+    embedder = VFileEmbedding(splitter)
+    embedder.dedup = None
+    vfile = VFile(subject_id="doc", subject_type="test", pages=pages)
+    vfile.id = uuid.uuid4()
+
+    with (
+        patch("antbed.splitdoc.os.cpu_count", return_value=4),
+        patch("antbed.splitdoc.split_pool", return_value=ThreadPoolExecutor(2)) as split_pool,
+        patch.object(VFileEmbedding, "find_split", return_value=None),
+        patch.object(VFileEmbedding, "insert_embeddings") as mock_insert,
+        patch("antbed.db.models.VFileSplit.add"),
+        patch("antbed.db.models.VFile.add"),
+    ):
+        split = embedder.prepare(vfile, session=MagicMock())
+
+    # past parallel_threshold the pages are split by the process pool, into the serial chunks
+    split_pool.assert_called_once()
+    embs = mock_insert.call_args.args[0]
+    assert [emb.content for emb in embs] == [doc.content for doc in splitter.split_serial("\n".join(pages))]
+    assert split.parts == len(embs)
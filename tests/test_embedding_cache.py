@@ -0,0 +1,106 @@
+from unittest.mock import MagicMock, patch
+
+from antbed.config import EmbeddingCacheConfigSchema
+from antbed.db.models import CachedEmbedding
+from antbed.embedding import VFileEmbedding
+from antbed.embedding_cache import EmbeddingCache, embedding_cache
+from antbed.lru import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru: LRUCache[str, int] = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert "b" not in lru
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert len(lru) == 2
+
+
+def test_embedding_cache_dedup_and_hits():
+    embed_fn = MagicMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+    cache = EmbeddingCache(lru_size=16, persist=False)
+
+    vectors = cache.embed(["a", "bb", "a"], "text-embedding-3-small", embed_fn, provider="openai")
+    assert vectors == [[1.0], [2.0], [1.0]]
+    embed_fn.assert_called_once_with(["a", "bb"])
+    assert cache.stats.misses == 2
+
+    vectors = cache.embed(["bb", "a"], "text-embedding-3-small", embed_fn, provider="openai")
+    assert vectors == [[2.0], [1.0]]
+    assert embed_fn.call_count == 1
+    assert cache.stats.memory_hits == 2
+    assert cache.stats.requests_saved == 1
+
+
+def test_embedding_cache_keyed_by_model_and_dimensions():
+    embed_fn = MagicMock(side_effect=lambda texts: [[0.5] for _ in texts])
+    cache = EmbeddingCache(lru_size=16, persist=False)
+
+    cache.embed(["text"], "model-a", embed_fn, provider="openai")
+    cache.embed(["text"], "model-b", embed_fn, provider="openai")
+    cache.embed(["text"], "model-a", embed_fn, dimensions=256, provider="openai")
+    assert embed_fn.call_count == 3
+    assert cache.get_many(["text", "other"], "model-a", provider="openai") == [[0.5], None]
+
+
+@patch("antbed.embedding.embedding_client")
+def test_embedding_cache_keyed_by_provider(mock_embedding_client_factory):
+    _ = mock_embedding_client_factory
+    cache = EmbeddingCache(lru_size=16, persist=False)
+    embedders = {}
+    for name, value in (("openai", 1.0), ("hashing", 2.0)):
+        embedder = VFileEmbedding()
+        embedder.provider_conf = embedder.provider_conf.model_copy(update={"name": name})
+        embedder.embedding_client = MagicMock()
+        embedder.embedding_client.embed.side_effect = lambda texts, model, dimensions=None, v=value: [[v]] * len(texts)
+        embedder.cache = cache
+        embedders[name] = embedder
+
+    # the same text and model name from two providers, each gets its own vector
+    assert embedders["openai"].get_embedding("text", "text-embedding-3-small") == [1.0]
+    assert embedders["hashing"].get_embedding("text", "text-embedding-3-small") == [2.0]
+    assert embedders["openai"].get_embedding("text", "text-embedding-3-small") == [1.0]
+    assert [embedder.embedding_client.embed.call_count for embedder in embedders.values()] == [1, 1]
+
+
+def test_embedding_cache_embed_many_keeps_batches():
+    embed_many_fn = MagicMock(side_effect=lambda groups: [[[float(len(t))] for t in group] for group in groups])
+    cache = EmbeddingCache(lru_size=16, persist=False)
+    cache.embed(["a"], "text-embedding-3-small", lambda texts: [[1.0] for _ in texts], provider="openai")
+
+    vectors = cache.embed_many(
+        [["a", "bb"], ["bb", "ccc"], ["dddd"]], "text-embedding-3-small", embed_many_fn, provider="openai"
+    )
+    assert vectors == [[[1.0], [2.0]], [[2.0], [3.0]], [[4.0]]]
+    # cached and repeated texts are only requested once, in their first batch
+    embed_many_fn.assert_called_once_with([["bb"], ["ccc"], ["dddd"]])
+
+
+def test_embedding_cache_default_config():
+    conf = EmbeddingCacheConfigSchema()
+    assert conf.enabled
+    assert not conf.persist
+    embed_fn = MagicMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+
+    embedding_cache.cache_clear()
+    with (
+        patch("antbed.embedding_cache.config") as mock_config,
+        patch.object(CachedEmbedding, "new_session") as new_session,
+    ):
+        mock_config.return_value.embeddings.cache = conf
+        cache = embedding_cache()
+        assert cache.embed(["a", "bb", "a"], "text-embedding-3-small", embed_fn, provider="openai") == [
+            [1.0],
+            [2.0],
+            [1.0],
+        ]
+        assert cache.embed(["bb"], "text-embedding-3-small", embed_fn, provider="openai") == [[2.0]]
+    embedding_cache.cache_clear()
+
+    # served by the in-process LRU alone, vectors aren't copied to the embedding_cache table
+    embed_fn.assert_called_once_with(["a", "bb"])
+    assert cache.stats.memory_hits == 1
+    new_session.assert_not_called()
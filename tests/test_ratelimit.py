@@ -0,0 +1,70 @@
+import httpx
+import pytest
+
+from antbed.ratelimit import RateLimiter, parse_duration
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1h2m3.5s", 3723.5), ("7", 7.0)],
+)
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == pytest.approx(expected)
+
+
+def test_parse_duration_invalid():
+    assert parse_duration("") is None
+    assert parse_duration(None) is None
+    assert parse_duration("soon") is None
+
+
+def test_rate_limiter_requests_per_minute():
+    limiter = RateLimiter("test", rpm=60)
+    for _ in range(60):
+        assert limiter.reserve() == 0
+    # one request per second refills
+    assert 0 < limiter.reserve() <= 1.0
+
+
+def test_rate_limiter_tokens_per_minute():
+    limiter = RateLimiter("test", tpm=6000)
+    assert limiter.reserve(tokens=5000) == 0
+    wait = limiter.reserve(tokens=2000)
+    assert wait == pytest.approx(10.0, abs=0.1)
+    # nothing was taken by the refused request
+    assert limiter.tokens.level == pytest.approx(1000, abs=10)
+    # larger than the bucket: only waits for a full one
+    assert limiter.reserve(tokens=10_000) == pytest.approx(50.0, abs=0.1)
+
+
+def test_rate_limiter_follows_headers():
+    limiter = RateLimiter("test")
+    assert limiter.requests is None
+    limiter.update(
+        httpx.Headers(
+            {
+                "x-ratelimit-limit-requests": "600",
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-limit-tokens": "100000",
+                "x-ratelimit-remaining-tokens": "99000",
+            }
+        )
+    )
+    assert limiter.requests.capacity == 600
+    assert limiter.tokens.level == pytest.approx(99000, abs=10)
+    assert limiter.reserve() > 0
+
+
+def test_rate_limiter_pauses_on_429():
+    limiter = RateLimiter("test", rpm=1000)
+    limiter.update(httpx.Headers({"x-ratelimit-reset-requests": "2s"}), status_code=429)
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.1)
+
+
+def test_rate_limiter_http_hooks():
+    limiter = RateLimiter("test", rpm=1)
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, headers={"x-ratelimit-limit-tokens": "50"}))
+    with httpx.Client(transport=transport, event_hooks=limiter.http_hooks()) as client:
+        client.post("https://api.example.com/v1/embeddings", json={"input": ["a"]})
+    assert limiter.reserve() > 0
+    assert limiter.tokens.capacity == 50
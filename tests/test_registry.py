@@ -0,0 +1,37 @@
+from unittest.mock import patch
+
+import tiktoken
+
+from antbed.encoders import encoder
+from antbed.models import ManagerEnum, SplitterConfig
+from antbed.registry import clear_registry, get_embedder, get_splitter, get_vector_manager
+
+
+def test_encoder_cached():
+    assert encoder("gpt-4o") is encoder("gpt-4o")
+    assert encoder("not-a-model").name == "cl100k_base"
+    assert encoder("text-embedding-3-large").name == tiktoken.encoding_for_model("text-embedding-3-large").name
+
+
+def test_get_splitter_by_config():
+    clear_registry()
+    splitter = get_splitter(SplitterConfig(chunk_size=300))
+    assert get_splitter(SplitterConfig(chunk_size=300)) is splitter
+    assert get_splitter(SplitterConfig(chunk_size=400)) is not splitter
+    # same hash, but splits differently
+    assert get_splitter(SplitterConfig(chunk_size=300, parallel_threshold=1000)) is not splitter
+    assert get_splitter() is get_splitter(SplitterConfig())
+
+
+@patch("antbed.embedding.embedding_client")
+def test_get_vector_manager_shares_instances(mock_embedding_client_factory):
+    _ = mock_embedding_client_factory
+    clear_registry()
+    conf = SplitterConfig(chunk_size=300)
+    vm = get_vector_manager(conf, manager=ManagerEnum.NONE)
+
+    assert get_vector_manager(SplitterConfig(chunk_size=300), manager=ManagerEnum.NONE) is vm
+    assert vm.embedder is get_embedder(conf)
+    assert vm.splitter is get_splitter(conf)
+    clear_registry()
+    assert get_vector_manager(conf, manager=ManagerEnum.NONE) is not vm
@@ -1,7 +1,10 @@
-from unittest.mock import MagicMock
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from antbed.db.models import Summary, VFile
-from antbed.models import Content, SearchRecord, WithContentMode
+import pytest
+
+from antbed.db.models import Summary, Vector, VFile, VFileSplit
+from antbed.models import Content, ManagerEnum, SearchRecord, WithContentMode
 from antbed.search import SearchManager
 
 
@@ -100,3 +103,98 @@ def test_hits_to_markdown():
     assert "- short: Test Description" in markdown
     assert "## Content" in markdown
     assert "Full verbatim content." in markdown
+
+
+@patch("antbed.search.embedding_client")
+@patch("antbed.search.antbeddb")
+def test_search(mock_antbeddb, mock_embedding_client):
+    vector = Vector(subject_id="coll", subject_type="test", vector_type="all", external_id="v-test_coll_all")
+    vector.id = uuid.uuid4()
+    vector.external_provider = "qdrant"
+    split = VFileSplit(
+        model="text-embedding-3-small", info={"splitter": {"embedding_provider": "openai", "dimensions": 512}}
+    )
+    mock_antbeddb.return_value.get_vector_by_name.return_value = vector
+    mock_antbeddb.return_value.get_vector_split.return_value = split
+    mock_embedding_client.return_value.embed.return_value = [[0.1, 0.2]]
+    hits = [SearchRecord(id="p1", vfile_id="f1", chunk_id="e1", score=0.5)]
+
+    sm = SearchManager()
+    manager = MagicMock()
+    manager.search.return_value = hits
+    sm.managers[ManagerEnum.QDRANT] = manager
+
+    records = sm.search("v-test_coll_all", "what is it?", filters={"k": "v"}, limit=3)
+
+    assert records == hits
+    mock_embedding_client.assert_called_once_with("openai")
+    mock_embedding_client.return_value.embed.assert_called_once_with(
+        ["what is it?"], "text-embedding-3-small", dimensions=512
+    )
+    manager.search.assert_called_once_with(
+        vector, [0.1, 0.2], model="text-embedding-3-small", limit=3, filters={"k": "v"}, session=None
+    )
+
+
+@patch("antbed.search.antbeddb")
+def test_hits_to_model_search_records(mock_antbeddb):
+    mock_antbeddb.return_value.get_contents.return_value = [Content(mode=WithContentMode.CHUNK, chunk="a chunk")]
+    sm = SearchManager()
+    records = [SearchRecord(id="p1", vfile_id="f1", chunk_id="e1", score=0.5, payload={"subject_id": "doc1"})]
+
+    contents = sm.hits_to_model(records, with_content=WithContentMode.CHUNK)
+
+    assert contents[0].chunk == "a chunk"
+    assert contents[0].metadata == {"id": "doc1", "score": 0.5}
+    mock_antbeddb.return_value.get_contents.assert_called_once()
+    assert mock_antbeddb.return_value.get_contents.call_args.args == (records, WithContentMode.CHUNK)
+
+
+@pytest.mark.asyncio
+@patch("antbed.search.embedding_client")
+@patch("antbed.search.antbeddb_async")
+async def test_asearch(mock_antbeddb_async, mock_embedding_client):
+    vector = Vector(subject_id="coll", subject_type="test", vector_type="all", external_id="v-test_coll_all")
+    vector.id = uuid.uuid4()
+    vector.external_provider = "pgvector"
+    split = VFileSplit(model="text-embedding-3-small", info={"splitter": {"embedding_provider": "openai"}})
+    adb = mock_antbeddb_async.return_value
+    adb.new_session.return_value = AsyncMock()
+    adb.get_vector_by_name = AsyncMock(return_value=vector)
+    adb.get_vector_split = AsyncMock(return_value=split)
+    mock_embedding_client.return_value.embed.return_value = [[0.3, 0.4]]
+    hits = [SearchRecord(id="p1", vfile_id="f1", chunk_id="e1", score=0.5)]
+
+    sm = SearchManager()
+    manager = MagicMock()
+    manager.asearch = AsyncMock(return_value=hits)
+    sm.managers[ManagerEnum.PGVECTOR] = manager
+
+    records = await sm.asearch("v-test_coll_all", "async query", limit=3)
+
+    assert records == hits
+    adb.get_vector_by_name.assert_awaited_once()
+    manager.asearch.assert_awaited_once_with(vector, [0.3, 0.4], model="text-embedding-3-small", limit=3, filters=None)
+    manager.search.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("antbed.search.antbeddb_async")
+async def test_ahits_to_model(mock_antbeddb_async):
+    mock_antbeddb_async.return_value.get_contents = AsyncMock(
+        return_value=[Content(mode=WithContentMode.CHUNK, chunk="a chunk"), None]
+    )
+    sm = SearchManager()
+    records = [
+        SearchRecord(id="p1", vfile_id="f1", chunk_id="e1", score=0.5, payload={"subject_id": "doc1"}),
+        SearchRecord(id="p2", vfile_id="f2", chunk_id="e2", score=0.4),
+    ]
+
+    contents = await sm.ahits_to_model(records, with_content=WithContentMode.CHUNK)
+
+    # the hit without content is dropped, like in hits_to_model
+    assert len(contents) == 1
+    assert contents[0].metadata == {"id": "doc1", "score": 0.5}
+    markdown = sm.render_markdown(contents)
+    assert "- id: doc1" in markdown
+    assert "a chunk" in markdown
@@ -1,7 +1,15 @@
 import contextlib
+import hashlib
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
 
 from antbed.models import SplitterConfig, SplitterType
-from antbed.splitdoc import Splitter
+from antbed.splitdoc import Splitter, partition_bounds
 
 
 def test_splitter_default_config():
@@ -58,3 +66,160 @@ def test_splitter_types():
     # Spacy might need model download, just check if it instantiates
     with contextlib.suppress(ImportError):  # spacy not installed in test env, which is fine
         assert Splitter.new_splitter(config_spacy)
+
+
+def test_splitter_config_dimensions_hash():
+    config = SplitterConfig()
+    # unset dimensions keep the hash of the splits stored before the field existed
+    legacy = config.model_dump(exclude={"dimensions", "parallel_threshold"})
+    assert config.config_hash() == hashlib.sha256(json.dumps(legacy, sort_keys=True).encode()).hexdigest()
+    # splitting in parallel cuts the same chunks, so it keeps the hash too
+    assert SplitterConfig(parallel_threshold=1000).config_hash() == config.config_hash()
+
+    short = SplitterConfig(dimensions=256)
+    assert short.config_hash() != config.config_hash()
+    assert short.name().endswith("_d256")
+
+
+def random_text(seed: int, size: int, *, paragraphs: bool = True) -> str:
+    """Words of a few lengths, some longer than a chunk, between runs of spaces and newlines"""
+    rng = random.Random(seed)
+    words = ["a", "bb", "ccc", "dddd", "eeeeeeeeeee", "f" * 90]
+    separators = [" ", " ", " ", "  ", "\n", " \n"]
+    if paragraphs:
+        separators += ["\n\n", "\n\n\n", "\n\n\n\n", " \n\n "]
+    parts = []
+    while size > 0:
+        parts.append(rng.choice(words) + rng.choice(separators))
+        size -= len(parts[-1])
+    return "".join(parts)
+
+
+SPLIT_CONFIGS = [
+    (splitter_type, chunk_size, overlap)
+    for splitter_type in [SplitterType.RECURSIVE, SplitterType.CHAR]
+    for chunk_size, overlap in [(40, 0), (80, 25), (200, 10), (800, 20)]
+]
+
+
+@pytest.mark.parametrize(("splitter_type", "chunk_size", "overlap"), SPLIT_CONFIGS)
+def test_split_iter_offsets(splitter_type, chunk_size, overlap):
+    pages = Path("tests/data/englisch_bgb.txt").read_text().split("\n")[:400]
+    text = "\n".join(pages)
+    config = SplitterConfig(chunk_size=chunk_size, chunk_overlap_perc=overlap, splitter_type=splitter_type)
+    splitter = Splitter(config)
+
+    docs = list(splitter.split_iter(pages, window=5000))
+
+    assert len(docs) > 10
+    for doc in docs:
+        assert doc.start == -1 or text[doc.start : doc.stop] == doc.content
+    assert docs[-1].stop == len(text.rstrip())
+    # merging each window's unfinished chunk again with the next one cuts the same chunks as a single split
+    assert docs == splitter.split(text)
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize(("splitter_type", "chunk_size", "overlap"), SPLIT_CONFIGS)
+def test_split_iter_random(seed, splitter_type, chunk_size, overlap):
+    config = SplitterConfig(chunk_size=chunk_size, chunk_overlap_perc=overlap, splitter_type=splitter_type)
+    splitter = Splitter(config)
+    # without paragraph breaks the recursive splitter can't cut before the end
+    text = random_text(seed, 20_000, paragraphs=seed % 3 != 0)
+    pages = text.split("\n")
+    expected = splitter.split_serial(text)
+
+    for window in [1, 97, 1000, 50_000]:
+        assert list(splitter.split_iter(pages, window=window)) == expected
+
+
+@pytest.mark.parametrize("splitter_type", [SplitterType.RECURSIVE, SplitterType.CHAR])
+@pytest.mark.parametrize("parts", [2, 5])
+def test_split_parallel_stitches_seams(splitter_type, parts):
+    text = Path("tests/data/englisch_bgb.txt").read_text()[:200_000]
+    splitter = Splitter(SplitterConfig(chunk_size=200, chunk_overlap_perc=20, splitter_type=splitter_type))
+
+    with ThreadPoolExecutor(2) as executor:
+        docs = splitter.split_parallel(text, executor, parts=parts)
+
+    assert len(partition_bounds(text, parts)) == parts + 1
+    for doc in docs:
+        assert text[doc.start : doc.stop] == doc.content
+    # chunks across the seams overlap like the serial split's
+    assert docs == splitter.split_serial(text)
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize(("splitter_type", "chunk_size", "overlap"), SPLIT_CONFIGS)
+def test_split_parallel_random(seed, splitter_type, chunk_size, overlap):
+    config = SplitterConfig(chunk_size=chunk_size, chunk_overlap_perc=overlap, splitter_type=splitter_type)
+    splitter = Splitter(config)
+    text = random_text(seed, 20_000, paragraphs=seed % 3 != 0)
+    expected = splitter.split_serial(text)
+
+    with ThreadPoolExecutor(2) as executor:
+        for parts in [2, 3, 7, 40]:
+            assert splitter.split_parallel(text, executor, parts=parts) == expected
+
+
+def test_split_parallel_threshold():
+    text = Path("tests/data/englisch_bgb.txt").read_text()[:300_000]
+    splitter = Splitter(SplitterConfig(chunk_size=300, parallel_threshold=100_000))
+
+    # below the threshold, or too small for two partitions: split serially, without a pool
+    with patch("antbed.splitdoc.split_pool") as split_pool:
+        assert splitter.split(text[:50_000]) == splitter.split_serial(text[:50_000])
+        assert splitter.split(text[:120_000]) == splitter.split_serial(text[:120_000])
+    split_pool.assert_not_called()
+
+    with (
+        patch("antbed.splitdoc.os.cpu_count", return_value=4),
+        patch("antbed.splitdoc.split_pool", return_value=ThreadPoolExecutor(2)) as split_pool,
+    ):
+        assert splitter.split(text) == splitter.split_serial(text)
+    split_pool.assert_called_once()
+
+
+def test_split_iter_parallel_threshold():
+    pages = Path("tests/data/englisch_bgb.txt").read_text()[:300_000].split("\n")
+    splitter = Splitter(SplitterConfig(chunk_size=300, parallel_threshold=100_000))
+
+    with (
+        patch("antbed.splitdoc.os.cpu_count", return_value=4),
+        patch("antbed.splitdoc.split_pool", return_value=ThreadPoolExecutor(2)) as split_pool,
+    ):
+        # pages of unknown length are streamed, a list past the threshold goes to the pool
+        assert list(splitter.split_iter(iter(pages))) == list(splitter.split_iter(pages))
+    split_pool.assert_called_once()
+
+
+@pytest.mark.parametrize("splitter_type", [SplitterType.RECURSIVE, SplitterType.CHAR])
+@pytest.mark.parametrize("token_splitter", [False, True])
+def test_span_splitter_matches_langchain(splitter_type, token_splitter):
+    text = Path("tests/data/englisch_bgb.txt").read_text()[:100_000]
+    config = SplitterConfig(
+        chunk_size=200, chunk_overlap_perc=20, splitter_type=splitter_type, token_splitter=token_splitter
+    )
+    splitter = Splitter(config)
+    assert splitter.span_splitter is not None
+
+    docs = splitter.split(text)
+    expected = splitter.text_splitter.create_documents([text])
+
+    assert [doc.content for doc in docs] == [doc.page_content for doc in expected]
+    for doc, lc_doc in zip(docs, expected, strict=True):
+        assert text[doc.start : doc.stop] == doc.content
+        if lc_doc.metadata["start_index"] != doc.start:
+            # langchain searches the chunk again, and can land on another occurrence or none
+            assert lc_doc.metadata["start_index"] == -1 or text.count(doc.content) > 1
+
+
+def test_span_splitter_char_dropped_pieces():
+    text = "aaaa\n\n\n\nbbbb\n\ncccc"
+    splitter = Splitter(SplitterConfig(chunk_size=10, chunk_overlap_perc=0, splitter_type=SplitterType.CHAR))
+
+    docs = splitter.split(text)
+
+    # the empty piece between the two separators is dropped, so the chunk isn't a slice of the text
+    assert [doc.content for doc in docs] == ["aaaa\n\nbbbb", "cccc"]
+    assert [doc.start for doc in docs] == [-1, 14]
@@ -0,0 +1,243 @@
+import datetime
+import json
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, column, create_engine, insert, select, table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import sessionmaker
+
+from antbed.db.models import Embedding
+from antbed.models import DocsQuery, ScrollCursor, SearchRecord, WithContentMode
+from antbed.store import DB, AsyncDB, RoutingSession, antbeddb
+
+INFO = table("vfile_explain", column("id"), column("info", JSONB))
+
+
+def compile_filter(spec, hot_keys=()):
+    clause = DB.build_jsonb_filter(DB.__new__(DB), INFO.c.info, spec, hot_keys)
+    return str(clause.compile(dialect=postgresql.dialect()))
+
+
+def test_needs_summary():
+    assert DB.needs_summary(WithContentMode.SUMMARY, set())
+    assert DB.needs_summary(WithContentMode.NONE, None)
+    assert DB.needs_summary(WithContentMode.NONE, {"id", "title"})
+    assert not DB.needs_summary(WithContentMode.NONE, {"id", "date"})
+    assert not DB.needs_summary(WithContentMode.FULL, {"id"})
+
+
+def test_load_options():
+    assert DB.load_options(WithContentMode.NONE, {"id"}) == []
+    assert len(DB.load_options(WithContentMode.SUMMARY, {"id"})) == 1
+    assert len(DB.load_options(WithContentMode.FULL, {"id", "title"})) == 2
+
+
+def test_async_db_url():
+    conf = MagicMock(
+        async_driver="psycopg", user="antbed", password="secret", host="db", port=5432, db="antbed", params={}
+    )
+    url = AsyncDB.url(conf)
+    assert url.drivername == "postgresql+psycopg"
+    assert url.render_as_string(hide_password=False) == "postgresql+psycopg://antbed:secret@db:5432/antbed"
+
+
+def test_routing_session_sticks_to_primary_after_write():
+    rows = Table("rows", MetaData(), Column("id", Integer, primary_key=True))
+    primary, replica = create_engine("sqlite://"), create_engine("sqlite://")
+    for engine in (primary, replica):
+        rows.metadata.create_all(engine)
+    with RoutingSession(replica, bind=primary) as session:
+        # neither a connection without a statement nor a read is a write
+        assert session.get_bind() is replica
+        assert session.get_bind(clause=select(rows)) is replica
+        assert not session.wrote
+        assert session.execute(select(rows)).all() == []
+        session.execute(insert(rows).values(id=1))
+        assert session.wrote
+        # the replica hasn't seen the insert, the session reads its own write from the primary
+        assert session.get_bind(clause=select(rows)) is primary
+        assert session.execute(select(rows.c.id)).scalars().all() == [1]
+
+
+def test_read_session_routes_and_closes():
+    primary, replica = create_engine("sqlite://"), create_engine("sqlite://")
+    db = DB.__new__(DB)
+    db.engine = MagicMock(session=MagicMock(return_value=(primary, sessionmaker(bind=primary, expire_on_commit=False))))
+    db.replicas = [MagicMock(session=MagicMock(return_value=(replica, sessionmaker(bind=replica))))]
+
+    with patch.object(RoutingSession, "close", autospec=True) as close:
+        with db.read_session() as session:
+            # built by activealchemy's factory, with its settings
+            assert isinstance(session, RoutingSession)
+            assert session.expire_on_commit is False
+            assert session.get_bind(clause=select(text("1"))) is replica
+        close.assert_called_once_with(session)
+
+        caller = MagicMock()
+        with db.read_session(caller) as session:
+            assert session is caller
+        caller.close.assert_not_called()
+
+
+def test_add_vfiles_keeps_caller_session():
+    db = DB.__new__(DB)
+    opened = MagicMock()
+    db.engine = MagicMock(session=MagicMock(return_value=(None, MagicMock(return_value=opened))))
+    vfiles = [MagicMock()]
+
+    with patch("antbed.store.VFile.update_tokens_many"):
+        db.add_vfiles(vfiles)
+        opened.close.assert_called_once()
+
+        # the caller's session is committed but stays open
+        caller = MagicMock()
+        db.add_vfiles(vfiles, session=caller)
+    caller.add_all.assert_called_once_with(vfiles)
+    caller.commit.assert_called_once()
+    caller.close.assert_not_called()
+    caller.__exit__.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_async_read_session_closes_own_session():
+    adb = AsyncDB.__new__(AsyncDB)
+    opened = AsyncMock()
+    opened.execute.return_value = MagicMock()
+    adb.session_factory = MagicMock(return_value=opened)
+    adb.replica_factories = []
+
+    await adb.get_vector_by_name("vector")
+    opened.close.assert_awaited_once()
+
+    # the caller's session stays open for its next queries
+    caller = AsyncMock()
+    caller.execute.return_value = MagicMock()
+    await adb.get_vector_by_name("vector", session=caller)
+    await adb.get_vector_split(uuid.uuid4(), session=caller)
+    assert caller.execute.await_count == 2
+    caller.close.assert_not_awaited()
+    adb.session_factory.assert_called_once()
+
+
+def test_chunks_query_prunes_partitions():
+    vfile_id, chunk_id = uuid.uuid4(), uuid.uuid4()
+    records = [SearchRecord(id="p1", vfile_id=str(vfile_id), chunk_id=str(chunk_id))]
+    chunk_ids = DB.chunk_ids(records)
+    assert chunk_ids == {chunk_id: vfile_id}
+    sql = str(DB.chunks_query(select(Embedding), chunk_ids, WithContentMode.CHUNK))
+    assert "embedding.vfile_id IN" in sql
+
+    # a record without its vfile can't be pruned, every partition is scanned
+    records.append(SearchRecord(id="p2", chunk_id=str(uuid.uuid4())))
+    sql = str(DB.chunks_query(select(Embedding), DB.chunk_ids(records), WithContentMode.CHUNK))
+    assert "embedding.vfile_id IN" not in sql
+
+
+def test_scroll_cursor_roundtrip():
+    cursor = ScrollCursor(created_at=datetime.datetime(2024, 5, 1, 12, 30), id=uuid.uuid4())
+    assert ScrollCursor.decode(cursor.encode()) == cursor
+    nodate = ScrollCursor(created_at=None, id=uuid.uuid4())
+    assert ScrollCursor.decode(nodate.encode()) == nodate
+
+
+@pytest.mark.parametrize("token", ["not-a-cursor", "e30", ""])
+def test_scroll_cursor_invalid(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        ScrollCursor.decode(token)
+
+
+@pytest.mark.parametrize(
+    ("created_at", "desc", "expected"),
+    [
+        (datetime.datetime(2024, 5, 1), False, "(vfile.source_created_at, vfile.id) >"),
+        (datetime.datetime(2024, 5, 1), True, "(vfile.source_created_at, vfile.id) <"),
+        (None, False, "vfile.source_created_at IS NULL AND vfile.id >"),
+        (None, True, "vfile.source_created_at IS NOT NULL OR vfile.id <"),
+    ],
+)
+def test_keyset_filter(created_at, desc, expected):
+    clause = DB.keyset_filter(ScrollCursor(created_at=created_at, id=uuid.uuid4()), desc)
+    assert expected in str(clause.compile(dialect=postgresql.dialect()))
+
+
+def test_next_cursor():
+    class Row:
+        def __init__(self):
+            self.id = uuid.uuid4()
+            self.source_created_at = datetime.datetime(2024, 5, 1)
+
+    page = [Row(), Row()]
+    assert DB.next_cursor(DocsQuery(limit=3), page) is None
+    assert DB.next_cursor(DocsQuery(limit=0), page) is None
+    cursor = ScrollCursor.decode(DB.next_cursor(DocsQuery(limit=2), page))
+    assert cursor.id == page[-1].id
+
+
+def test_jsonb_filter_merges_and():
+    sql = compile_filter({"and": [{"tenant": "a"}, {"equals": {"kind": "mail"}}, {"exists": "x"}, {"exists": "y"}]})
+    assert sql.count("@>") == 1
+    assert "?&" in sql
+    # same key twice can't be merged into one document
+    assert compile_filter({"and": [{"tenant": "a"}, {"tenant": "b"}]}).count("@>") == 2
+
+
+def test_jsonb_filter_or_exists():
+    assert "?|" in compile_filter({"or": [{"exists": "x"}, {"exists": "y"}]})
+    assert "?|" not in compile_filter({"or": [{"exists": "x"}, {"tenant": "a"}]})
+
+
+def test_jsonb_filter_hot_keys():
+    assert "->>" not in compile_filter({"tenant": "a"})
+    sql = compile_filter({"tenant": "a", "n": 1}, hot_keys={"tenant", "n"})
+    assert "@>" in sql
+    assert sql.count("->>") == 1
+
+
+def test_info_index_name():
+    name = DB.info_index_name("Tenant Id")
+    assert name.startswith("vfile_info_tenant_id_")
+    assert len(name) <= 63
+    assert name != DB.info_index_name("tenant_id")
+
+
+@pytest.fixture
+def pg_session():
+    try:
+        session = antbeddb().new_session()
+        session.execute(text("SELECT 1"))
+    except Exception as e:  # pylint: disable=broad-except
+        pytest.skip(f"PostgreSQL not available: {e}")
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.mark.parametrize(
+    ("spec", "index"),
+    [
+        ({"and": [{"tenant": "t7"}, {"kind": "mail"}]}, "vfile_explain_path_idx"),
+        ({"exists": "rare"}, "vfile_explain_keys_idx"),
+    ],
+)
+def test_jsonb_filter_explain_uses_gin(pg_session, spec, index):
+    pg_session.execute(text("CREATE TEMP TABLE vfile_explain (id serial PRIMARY KEY, info jsonb)"))
+    pg_session.execute(
+        text("""
+        INSERT INTO vfile_explain (info)
+        SELECT jsonb_build_object('tenant', 't' || (i % 500), 'kind', CASE WHEN i % 2 = 0 THEN 'mail' ELSE 'doc' END)
+            || CASE WHEN i % 1000 = 0 THEN '{"rare": true}'::jsonb ELSE '{}'::jsonb END
+        FROM generate_series(1, 20000) AS i
+    """)
+    )
+    pg_session.execute(text("CREATE INDEX vfile_explain_path_idx ON vfile_explain USING gin (info jsonb_path_ops)"))
+    pg_session.execute(text("CREATE INDEX vfile_explain_keys_idx ON vfile_explain USING gin (info)"))
+    pg_session.execute(text("ANALYZE vfile_explain"))
+    q = select(INFO.c.id).where(DB.build_jsonb_filter(DB.__new__(DB), INFO.c.info, spec))
+    compiled = q.compile(dialect=postgresql.dialect())
+    params = {k: json.dumps(v) if isinstance(v, dict) else v for k, v in compiled.params.items()}
+    rows = pg_session.connection().exec_driver_sql(f"EXPLAIN {compiled}", params)
+    plan = "\n".join(row[0] for row in rows)
+    assert index in plan
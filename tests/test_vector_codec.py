@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from antbed.db.models import Embedding
+from antbed.vector_codec import VectorEncodingEnum, decode_vector, encode_vector
+
+VECTOR = [0.5, -0.25, 0.125, -1.0, 0.0]
+
+
+@pytest.mark.parametrize(
+    ("encoding", "itemsize", "atol"),
+    [
+        (VectorEncodingEnum.FLOAT32, 4, 0.0),
+        (VectorEncodingEnum.FLOAT16, 2, 1e-3),
+        (VectorEncodingEnum.INT8, 1, 1.0 / 127),
+    ],
+)
+def test_encode_decode_roundtrip(encoding, itemsize, atol):
+    blob, scale = encode_vector(VECTOR, encoding)
+    assert len(blob) == len(VECTOR) * itemsize
+    decoded = decode_vector(blob, encoding, scale)
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, VECTOR, atol=atol)
+
+
+def test_encode_array_rejected():
+    with pytest.raises(ValueError):
+        encode_vector(VECTOR, VectorEncodingEnum.ARRAY)
+
+
+def test_embedding_set_vector():
+    emb = Embedding(content="text")
+    emb.set_vector(VECTOR, VectorEncodingEnum.FLOAT32)
+    assert emb.embedding_vector == []
+    assert emb.vector_encoding == "float32"
+    np.testing.assert_array_equal(emb.vector, np.asarray(VECTOR, dtype=np.float32))
+
+    emb.set_vector(emb.vector, VectorEncodingEnum.ARRAY)
+    assert emb.embedding_blob is None
+    assert emb.embedding_vector == VECTOR
+    assert emb.vector.tolist() == VECTOR
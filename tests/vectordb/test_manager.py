@@ -0,0 +1,90 @@
+import uuid
+from unittest.mock import MagicMock, patch
+
+from antbed.db.models import Embedding, Vector, VectorVFile, VFile, VFileSplit
+from antbed.embedding import DUPLICATE_STATUS, VFileEmbedding
+from antbed.models import ManagerEnum, SplitDocument
+from antbed.vectordb.manager import VectorManager
+
+
+def vector_split(vfile: VFile, embs: list[Embedding]) -> VFileSplit:
+    vsplit = VFileSplit(id=uuid.uuid4(), vfile_id=vfile.id, model="text-embedding-3-small", parts=len(embs))
+    vsplit.embeddings = embs
+    vsplit.vfile = vfile
+    return vsplit
+
+
+@patch("antbed.vectordb.manager.antbeddb")
+@patch("antbed.embedding.embedding_client")
+def test_resplit_reembeds_released_duplicates(mock_embedding_client_factory, mock_antbeddb):
+    mock_embedding_client = MagicMock()
+    mock_embedding_client.embed.side_effect = lambda texts, model, dimensions=None: [[0.5]] * len(texts)
+    mock_embedding_client_factory.return_value = mock_embedding_client
+    embedder = VFileEmbedding()
+    embedder.cache = None
+    embedder.dedup = None
+    vm = VectorManager(manager=ManagerEnum.NONE, embedder=embedder)
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all", external_provider="none")
+    vector.id = uuid.uuid4()
+    mock_antbeddb.return_value.get_vector.return_value = vector
+    mock_antbeddb.return_value.get_vector_vfile.return_value = None
+
+    # the canonical chunk of `vfile` stands for a near-duplicate chunk in `other`
+    vfile = VFile(subject_id="doc", subject_type="test", pages=["changed"])
+    vfile.id = uuid.uuid4()
+    vfile.content_hash = VFile.pages_hash(vfile.pages)
+    canonical = Embedding(id=uuid.uuid4(), content="quoted", status="complete", embedding_vector=[0.1])
+    vsplit = vector_split(vfile, [canonical])
+    vsplit.content_hash = "old"
+    other = VFile(subject_id="reply", subject_type="test", pages=["quoted"])
+    other.id = uuid.uuid4()
+    duplicate = Embedding(
+        id=uuid.uuid4(), vfile_id=other.id, content="quoted", status=DUPLICATE_STATUS, duplicate_of=canonical.id
+    )
+    other_split = vector_split(other, [duplicate])
+    vvfile = VectorVFile(vector_id=vector.id, vfile_id=other.id, vsplit_id=other_split.id)
+    vvfile.vector = vector
+    other_split.vector_vfile = [vvfile]
+
+    session = MagicMock()
+
+    def released(stmt):
+        # the database side of Embedding.release_duplicates
+        duplicate.status, duplicate.duplicate_of = "new", None
+        return MagicMock(scalars=MagicMock(return_value=[other_split.id]))
+
+    session.execute.side_effect = released
+    embedder.splitter = MagicMock()
+    embedder.splitter.split_iter.return_value = iter([SplitDocument(start=0, stop=7, content="changed")])
+
+    with (
+        patch.object(VFileEmbedding, "find_split", return_value=vsplit),
+        patch("antbed.db.models.VFileSplit.add"),
+        patch("antbed.db.models.VFileSplit.find", return_value=other_split) as mock_find,
+        patch("antbed.db.models.Embedding.add"),
+        patch("antbed.db.models.Embedding.new_session", return_value=session),
+        patch.object(vm.manager, "add_points", return_value=str(vector.id)) as mock_add_points,
+    ):
+        vm.add_vfiles_to_vector(vector, [vfile], session=session)
+
+    # the changed canonical chunk is gone, its duplicate gets a vector of its own and its point
+    assert [emb.content for emb in vsplit.embeddings] == ["changed"]
+    assert vsplit.released_splits == {other_split.id}
+    mock_find.assert_called_once_with(other_split.id, session=session)
+    assert (duplicate.status, duplicate.duplicate_of) == ("complete", None)
+    assert duplicate.embedding_vector == [0.5]
+    assert [call.args[1] for call in mock_add_points.call_args_list] == [vsplit, other_split]
+
+
+def test_delete_vfile_reembeds_released_duplicates():
+    with patch("antbed.vectordb.manager.antbeddb") as mock_antbeddb:
+        vm = VectorManager(manager=ManagerEnum.NONE, embedder=MagicMock())
+    split_id = uuid.uuid4()
+    mock_antbeddb.return_value.delete_vfile.return_value = {split_id}
+    vfile = VFile(subject_id="doc", subject_type="test")
+
+    with patch.object(VectorManager, "refresh_splits") as mock_refresh:
+        vm.delete_vfile(vfile, session="session")
+
+    mock_antbeddb.return_value.delete_vfile.assert_called_once_with(vfile, session="session")
+    mock_refresh.assert_called_once_with({split_id}, session="session")
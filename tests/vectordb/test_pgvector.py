@@ -0,0 +1,158 @@
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from antbed.db.models import Embedding, Vector, VFile, VFileSplit
+from antbed.vectordb.pgvector import INDEXED, VectorPgvector
+
+
+@pytest.fixture(autouse=True)
+def clear_indexed():
+    INDEXED.clear()
+    yield
+    INDEXED.clear()
+
+
+def test_vector_pgvector_create_vector():
+    vector_db = VectorPgvector(client=MagicMock())
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+
+    result_vector = vector_db.create_vector(vector)
+
+    assert result_vector.external_id == "v-test_type_test_id_all"
+    assert result_vector.external_provider == "pgvector"
+
+
+def test_vector_pgvector_column_type():
+    assert VectorPgvector.column_type(1536) == "vector"
+    assert VectorPgvector.column_type(3072) == "halfvec"
+    with pytest.raises(ValueError):
+        VectorPgvector.column_type(8192)
+
+
+def test_vector_pgvector_index_name():
+    name = VectorPgvector.index_name("text-embedding-3-large", 3072)
+    assert name.startswith("pgvector_point_text_embedding_3_large_")
+    assert name.endswith("_3072_idx")
+    assert len(name) <= 63
+    assert name != VectorPgvector.index_name("text-embedding-3-large", 256)
+
+
+def test_vector_pgvector_add_points():
+    mock_db = MagicMock()
+    session = mock_db.new_session.return_value.__enter__.return_value
+    conn = mock_db.autocommit_connection.return_value.__enter__.return_value
+    conn.execute.return_value.scalar.return_value = None
+    vector_db = VectorPgvector(client=mock_db)
+
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+    vector.id = uuid.uuid4()
+    vfile = VFile(subject_id="doc", subject_type="test")
+    vfile.id = uuid.uuid4()
+    vsplit = VFileSplit(model="text-embedding-3-small")
+    vsplit.id = uuid.uuid4()
+    vsplit.embeddings = [
+        Embedding(id=uuid.uuid4(), embedding_vector=[0.1, 0.2], part_number=0),
+        Embedding(id=uuid.uuid4(), embedding_vector=[], part_number=1),
+    ]
+
+    assert vector_db.add_points(vector, vsplit, vfile) == str(vector.id)
+
+    ddl = str(conn.execute.call_args_list[1].args[0])
+    assert ddl.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+    assert "USING hnsw ((embedding::vector(2)) vector_ip_ops)" in ddl
+    assert "WHERE model = 'text-embedding-3-small' AND dimensions = 2" in ddl
+    rows = session.execute.call_args_list[-1].args[1]
+    assert len(rows) == 1
+    assert [float(x) for x in rows[0]["embedding"].strip("[]").split(",")] == pytest.approx([0.1, 0.2])
+    assert rows[0]["payload"]["part"] == 0
+
+
+def test_vector_pgvector_ensure_index_once():
+    mock_db = MagicMock()
+    conn = mock_db.autocommit_connection.return_value.__enter__.return_value
+    conn.execute.return_value.scalar.return_value = True
+    vector_db = VectorPgvector(client=mock_db)
+
+    vector_db.ensure_index("text-embedding-3-small", 2)
+    vector_db.ensure_index("text-embedding-3-small", 2)
+
+    # a valid index is looked up once per process and no DDL runs
+    assert conn.execute.call_count == 1
+    mock_db.new_session.assert_not_called()
+
+    # an index left invalid by a failed concurrent build is rebuilt
+    conn.execute.return_value.scalar.return_value = False
+    vector_db.ensure_index("text-embedding-3-small", 4)
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list[2:]]
+    assert statements[0].startswith("DROP INDEX CONCURRENTLY")
+    assert statements[1].startswith("CREATE INDEX CONCURRENTLY")
+
+
+def test_vector_pgvector_add_points_sync():
+    mock_db = MagicMock()
+    session = mock_db.new_session.return_value.__enter__.return_value
+    vector_db = VectorPgvector(client=mock_db)
+
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+    vector.id = uuid.uuid4()
+    vfile = VFile(subject_id="doc", subject_type="test")
+    vfile.id = uuid.uuid4()
+    vsplit = VFileSplit(model="text-embedding-3-small")
+    vsplit.id = uuid.uuid4()
+    kept = Embedding(id=uuid.uuid4(), embedding_vector=[0.1, 0.2], part_number=0)
+    moved = Embedding(id=uuid.uuid4(), embedding_vector=[0.3, 0.4], part_number=1)
+    vsplit.embeddings = [kept, moved]
+    stale_id = uuid.uuid4()
+    moved_payload = vector_db.payload(vector, vfile, moved) | {"part": 3}
+    session.execute.side_effect = [
+        [
+            SimpleNamespace(embedding_id=kept.id, payload=vector_db.payload(vector, vfile, kept)),
+            SimpleNamespace(embedding_id=moved.id, payload=moved_payload),
+            SimpleNamespace(embedding_id=stale_id, payload={}),
+        ],
+        None,
+        None,
+    ]
+
+    vector_db.add_points(vector, vsplit, vfile)
+
+    # nothing to upsert: one payload update, one delete
+    statements = [call.args[0] for call in session.execute.call_args_list[1:]]
+    assert [stmt.__visit_name__ for stmt in statements] == ["update", "delete"]
+    assert statements[0].compile().params["payload"]["part"] == 1
+    assert [stale_id] in statements[1].compile().params.values()
+
+
+def test_vector_pgvector_search_session():
+    mock_db = MagicMock()
+    opened = MagicMock()
+    mock_db.new_session.side_effect = lambda session=None: session if session is not None else opened
+    vector_db = VectorPgvector(client=mock_db)
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+    vector.id = uuid.uuid4()
+
+    assert vector_db.search(vector, [0.1, 0.2], model="text-embedding-3-small") == []
+    opened.close.assert_called_once()
+
+    # the caller's session stays open, with the SET LOCAL in its transaction
+    caller = MagicMock()
+    vector_db.search(vector, [0.1, 0.2], model="text-embedding-3-small", session=caller)
+    assert str(caller.execute.call_args_list[0].args[0]).startswith("SET LOCAL")
+    caller.close.assert_not_called()
+    caller.__exit__.assert_not_called()
+
+
+def test_vector_pgvector_search_query_literals():
+    vector_db = VectorPgvector(client=MagicMock())
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+    vector.id = uuid.uuid4()
+
+    q = vector_db.search_query(vector, [0.1, 0.2], model="text-embedding-3-small", limit=5, filters=None)
+    sql = str(q.compile(dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True}))
+
+    # the partial index predicate, with the same literals
+    assert "pgvector_point.model = 'text-embedding-3-small' AND pgvector_point.dimensions = 2" in sql
@@ -1,6 +1,9 @@
+import uuid
 from unittest.mock import MagicMock
 
-from antbed.db.models import Vector
+from qdrant_client import QdrantClient
+
+from antbed.db.models import Embedding, Vector, VFile, VFileSplit
 from antbed.vectordb.qdrant import VectorQdrant
 
 
@@ -19,3 +22,95 @@ def test_vector_qdrant_create_vector():
     assert result_vector.external_provider == "qdrant"
     mock_qdrant_client.collection_exists.assert_called_with(collection_name=expected_vname)
     mock_qdrant_client.create_collection.assert_called_once()
+    assert mock_qdrant_client.create_collection.call_args.kwargs["vectors_config"].size == 3072
+
+
+def test_vector_qdrant_create_vector_dimensions():
+    mock_qdrant_client = MagicMock()
+    mock_qdrant_client.collection_exists.return_value = False
+
+    VectorQdrant(qdrant=mock_qdrant_client).create_vector(Vector(subject_id="s", subject_type="t"), dim=256)
+
+    assert mock_qdrant_client.create_collection.call_args.kwargs["vectors_config"].size == 256
+
+
+def test_vector_qdrant_build_filter():
+    flt = VectorQdrant.build_filter({"and": [{"tenant": "alpha"}, {"not_exists": "archived"}]})
+    equals, missing = flt.must
+    assert equals.must[0].key == "metadata.tenant"
+    assert equals.must[0].match.value == "alpha"
+    assert missing.must[0].is_empty.key == "metadata.archived"
+
+    flt = VectorQdrant.build_filter({"equals": {"tags": ["a", "b"], "owner": {"id": 1}}})
+    assert [(cond.key, cond.match.value) for cond in flt.must] == [
+        ("metadata.tags", "a"),
+        ("metadata.tags", "b"),
+        ("metadata.owner.id", 1),
+    ]
+
+
+def test_vector_qdrant_search():
+    mock_qdrant_client = MagicMock()
+    point = MagicMock(id="p1", score=0.9, payload={"vfile_id": "f1", "part_id": "e1"})
+    mock_qdrant_client.query_points.return_value.points = [point]
+
+    vector_db = VectorQdrant(qdrant=mock_qdrant_client)
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all", external_id="v-coll")
+
+    records = vector_db.search(vector, [0.1, 0.2], model="text-embedding-3-large", limit=5, filters={"k": "v"})
+
+    assert [(r.id, r.vfile_id, r.chunk_id, r.score) for r in records] == [("p1", "f1", "e1", 0.9)]
+    kwargs = mock_qdrant_client.query_points.call_args.kwargs
+    assert kwargs["collection_name"] == "v-coll"
+    assert kwargs["limit"] == 5
+    assert kwargs["query_filter"].must[0].key == "metadata.k"
+
+
+def test_vector_qdrant_add_points_sync():
+    vector_db = VectorQdrant(QdrantClient(":memory:"))
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+    vector.id = uuid.uuid4()
+    vector = vector_db.create_vector(vector, dim=2)
+    vfile = VFile(subject_id="doc", subject_type="test")
+    vfile.id = uuid.uuid4()
+    vsplit = VFileSplit(model="text-embedding-3-small", parts=3)
+    vsplit.id = uuid.uuid4()
+    embs = [Embedding(id=uuid.uuid4(), embedding_vector=[1.0, float(i)], part_number=i) for i in range(3)]
+    vsplit.embeddings = list(embs)
+    vector_db.add_points(vector, vsplit, vfile)
+
+    # the first chunk changed: a new embedding replaces it and the others move by one
+    new = Embedding(id=uuid.uuid4(), embedding_vector=[0.0, 1.0], part_number=0)
+    for emb in embs[1:]:
+        emb.part_number += 1
+    vsplit.embeddings = [new, embs[2], embs[1]]
+    vector_db.client.upsert = MagicMock(wraps=vector_db.client.upsert)
+    vector_db.add_points(vector, vsplit, vfile)
+
+    upserted = vector_db.client.upsert.call_args_list[-1].kwargs["points"]
+    assert [point.id for point in upserted] == [str(new.id)]
+    points, _ = vector_db.client.scroll(collection_name=str(vector.external_id), limit=10)
+    parts = {point.id: point.payload["part"] for point in points}
+    assert parts == {str(new.id): 0, str(embs[1].id): 1, str(embs[2].id): 2}
+
+
+def test_vector_qdrant_add_points_skips_duplicates():
+    vector_db = VectorQdrant(QdrantClient(":memory:"))
+    vector = Vector(subject_id="test_id", subject_type="test_type", vector_type="all")
+    vector.id = uuid.uuid4()
+    vector = vector_db.create_vector(vector, dim=2)
+    vfile = VFile(subject_id="doc", subject_type="test")
+    vfile.id = uuid.uuid4()
+    vsplit = VFileSplit(model="text-embedding-3-small", parts=2)
+    vsplit.id = uuid.uuid4()
+    rep = Embedding(id=uuid.uuid4(), embedding_vector=[1.0, 0.0], part_number=0, status="complete")
+    dup = Embedding(id=uuid.uuid4(), embedding_vector=[1.0, 1.0], part_number=1, status="complete")
+    vsplit.embeddings = [rep, dup]
+    vector_db.add_points(vector, vsplit, vfile)
+
+    # the second chunk became a near-duplicate of the first: its point goes
+    dup.status, dup.duplicate_of = "duplicate", rep.id
+    vector_db.add_points(vector, vsplit, vfile)
+
+    points, _ = vector_db.client.scroll(collection_name=str(vector.external_id), limit=10)
+    assert [point.id for point in points] == [str(rep.id)]